@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from crypto_core import BlockchainAnalyzer, analyze_transactions, iter_transaction_batches
+from crypto_http import HttpClient
+from crypto_render import LARGE_GRAPH_EDGES
+from crypto_stub import StubServer, SyntheticChain, add_source_arguments, source_from_args
+from crypto_tracker_v7 import GraphVisualizer
+
+# Client-side limits high enough that only the stub's own --rate-limit applies
+UNLIMITED = {'etherscan': 1e6, 'blockcypher': 1e6}
+# Cold-start commands timed in fresh interpreters: the headless core, the CLI and the Streamlit app module
+STARTUP = {
+    'core_import': ['-c', 'import crypto_core'],
+    'cli_help': ['crypto_tracker_v3.py', '--help'],
+    'app_import': ['-c', 'import crypto_tracker_v7'],
+}
+
+
+def _timed(fn, repeat):
+    """Run fn repeat times, returning (seconds per run, result of the last run)"""
+    runs, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - started)
+    return runs, result
+
+
+def _result(name, params, runs, **metrics):
+    return {
+        'name': name,
+        'params': params,
+        'seconds': statistics.median(runs),
+        'runs': runs,
+        'metrics': metrics,
+    }
+
+
+def _requests(server, before):
+    after = server.snapshot()
+    return {key: after.get(key, 0) - before.get(key, 0) for key in after}
+
+
+def bench_startup(repeat):
+    """Cold-start time of fresh interpreters, which dominates short fetch-only runs"""
+    results = []
+    root = os.path.dirname(os.path.abspath(__file__))
+    for name, command in STARTUP.items():
+        runs, _ = _timed(lambda: subprocess.run([sys.executable, *command], cwd=root, capture_output=True,
+                                                check=True), repeat)
+        results.append(_result('startup', {'command': name}, runs))
+        print(f"[+] startup {name}: {statistics.median(runs):.3f}s", file=sys.stderr)
+    return results
+
+
+def bench_crawl(server, root, depths, concurrency, repeat, chains=('eth', 'btc')):
+    """Crawl wall time by depth against the stub, with a fresh client per run"""
+    results = []
+    for chain in chains:
+        for depth in depths:
+            before = server.snapshot()
+
+            def crawl():
+                http = HttpClient(rates=UNLIMITED, urls=server.urls, pool_size=concurrency)
+                analyzer = BlockchainAnalyzer(chain, api_key='bench', http=http)
+                graph, _ = analyzer.get_transaction_graph(root, depth, concurrency=concurrency)
+                return graph
+
+            runs, graph = _timed(crawl, repeat)
+            traffic = _requests(server, before)
+            provider = 'etherscan' if chain == 'eth' else 'blockcypher'
+            results.append(_result('crawl', {'chain': chain, 'depth': depth, 'concurrency': concurrency}, runs,
+                                   nodes=len(graph), edges=graph.edge_count,
+                                   requests=traffic.get(f'{provider}_requests', 0) // repeat,
+                                   throttled=traffic.get(f'{provider}_throttled', 0) // repeat))
+            print(f"[+] crawl {chain} depth {depth}: {statistics.median(runs):.3f}s", file=sys.stderr)
+    return results
+
+
+def bench_analysis(server, histories, sizes, repeat):
+    """Full-history fetch through the stub and analysis throughput by history size
+
+    `histories` maps each size to an address the stub serves with that many transactions.
+    """
+    results = []
+    http = HttpClient(rates=UNLIMITED, urls=server.urls)
+    for size in sizes:
+        address = histories[size]
+        fetch_runs, txs = _timed(
+            lambda: [tx for batch in iter_transaction_batches(address, 'bench', http=http) for tx in batch], repeat)
+        runs, (df, exchange_txs, mixer_txs) = _timed(lambda: analyze_transactions(txs, address), repeat)
+        seconds = statistics.median(runs)
+        results.append(_result('fetch', {'transactions': size}, fetch_runs, transactions=len(txs),
+                               transactions_per_second=len(txs) / statistics.median(fetch_runs)))
+        results.append(_result('analysis', {'transactions': size}, runs, transactions=len(df),
+                               transactions_per_second=len(df) / seconds,
+                               exchange_hits=len(exchange_txs), mixer_hits=len(mixer_txs)))
+        print(f"[+] analysis {size}: {len(df) / seconds:,.0f} tx/s", file=sys.stderr)
+    return results
+
+
+def bench_render(source, histories, sizes, repeat, large_threshold=LARGE_GRAPH_EDGES):
+    """Graph build and HTML render time by graph size"""
+    results = []
+    for size in sizes:
+        address = histories[size]
+        txs = source.txlist(address)
+
+        def build():
+            return GraphVisualizer().create_transaction_graph(txs, address)
+
+        build_runs, (graph, legend) = _timed(build, repeat)
+        runs, html = _timed(lambda: GraphVisualizer().visualize_graph(graph, legend, large_threshold), repeat)
+        params = {'transactions': size}
+        results.append(_result('graph_build', params, build_runs, nodes=len(graph), edges=graph.edge_count))
+        results.append(_result('render', params, runs, nodes=len(graph), edges=graph.edge_count,
+                               large=graph.edge_count > large_threshold, html_bytes=len(html or '')))
+        print(f"[+] render {size}: {statistics.median(runs):.3f}s", file=sys.stderr)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline, max_regression):
+    """Print the change against a baseline run and return the regressed benchmarks"""
+    previous = {(r['name'], json.dumps(r['params'], sort_keys=True)): r['seconds'] for r in baseline['results']}
+    regressed = []
+    for r in results:
+        old = previous.get((r['name'], json.dumps(r['params'], sort_keys=True)))
+        if not old:
+            continue
+        ratio = r['seconds'] / old
+        flag = ' REGRESSION' if ratio > max_regression else ''
+        print(f"{r['name']:12} {json.dumps(r['params']):60} {old:9.4f}s -> {r['seconds']:9.4f}s "
+              f"({ratio:.2f}x){flag}", file=sys.stderr)
+        if flag:
+            regressed.append(r)
+    return regressed
+
+
+def main(argv=None):
+    """Benchmark entry point (`crypto_tracker_v3.py bench`)"""
+    parser = argparse.ArgumentParser(prog='crypto_tracker_v3.py bench',
+                                     description='Benchmark startup, crawling, analysis and rendering against the offline stub')
+    parser.add_argument('-o', '--output', default='-', help="JSON file for the results (default: stdout)")
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark; the median is reported')
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 2, 3], help='Crawl depths to time')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--root', help='Crawl root (default: the first synthetic address)')
+    parser.add_argument('--analysis-sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help='History sizes for the fetch and analysis benchmarks')
+    parser.add_argument('--render-sizes', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='History sizes for the graph build and render benchmarks')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds the stub adds to every response')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--quick', action='store_true', help='One run of the smallest sizes, for smoke testing')
+    parser.add_argument('--baseline', help='Earlier results to compare against')
+    parser.add_argument('--max-regression', type=float, default=1.25,
+                        help='Exit non-zero when a benchmark is this many times slower than the baseline')
+    add_source_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.repeat, args.depths = 1, args.depths[:2]
+        args.analysis_sizes, args.render_sizes = args.analysis_sizes[:1], args.render_sizes[:2]
+
+    # Dedicated synthetic addresses with exactly the requested history sizes
+    histories = {size: f'0x{size:040x}' for size in set(args.analysis_sizes) | set(args.render_sizes)}
+    source = source_from_args(args, sizes={address: size for size, address in histories.items()})
+    root = args.root or SyntheticChain(args.seed, 1).address(0)
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    server = StubServer(source, latency=args.latency, jitter=args.jitter).start()
+    try:
+        results = bench_startup(args.repeat)
+        results += bench_crawl(server, root, args.depths, args.concurrency, args.repeat)
+        results += bench_analysis(server, histories, args.analysis_sizes, args.repeat)
+        results += bench_render(source, histories, args.render_sizes, args.repeat)
+    finally:
+        server.stop()
+
+    report = {
+        'suite': 'crypto_tracker',
+        'started_at': started_at,
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"[+] Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            if compare(results, json.load(f), args.max_regression):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from crypto_metrics import get_metrics
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'crypto_tracker')
+
+
+class TransactionCache:
+    """SQLite-backed store of address histories with a per-address block cursor"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=7 * 24 * 3600, max_addresses=5000):
+        """Open (or create) the cache database inside cache_dir
+
+        Addresses not looked up for `ttl` seconds are dropped, and once more than
+        `max_addresses` are stored the least recently used ones are evicted.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'transactions.sqlite3')
+        self.ttl = ttl
+        self.max_addresses = max_addresses
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS addresses (
+                chain TEXT NOT NULL,
+                address TEXT NOT NULL,
+                last_block INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (chain, address)
+            );
+            CREATE INDEX IF NOT EXISTS addresses_accessed ON addresses (accessed_at);
+            CREATE TABLE IF NOT EXISTS transactions (
+                chain TEXT NOT NULL,
+                address TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                block INTEGER NOT NULL,
+                tx TEXT NOT NULL,
+                PRIMARY KEY (chain, address, hash)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS transactions_block ON transactions (chain, address, block);
+        """)
+        self._conn.commit()
+
+    def cursor(self, chain, address):
+        """Return the highest block stored for an address, or None if it is not cached"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT last_block, accessed_at FROM addresses WHERE chain = ? AND address = ?',
+                (chain, address)).fetchone()
+            if row is None:
+                get_metrics().count('cache_misses', chain=chain)
+                return None
+            if now - row[1] > self.ttl:
+                self._delete(chain, address)
+                self._conn.commit()
+                get_metrics().count('cache_misses', chain=chain)
+                return None
+            get_metrics().count('cache_hits', chain=chain)
+            self._conn.execute(
+                'UPDATE addresses SET accessed_at = ? WHERE chain = ? AND address = ?',
+                (now, chain, address))
+            self._conn.commit()
+            return row[0]
+
+    def load(self, chain, address, descending=False, limit=None):
+        """Return cached transactions for an address ordered by block"""
+        order = 'DESC' if descending else 'ASC'
+        query = f'SELECT tx FROM transactions WHERE chain = ? AND address = ? ORDER BY block {order}'
+        params = [chain, address]
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def addresses(self):
+        """Return every cached (chain, address) pair"""
+        with self._lock:
+            return self._conn.execute('SELECT chain, address FROM addresses ORDER BY chain, address').fetchall()
+
+    def iter_batches(self, chain, address, batch_size=1000):
+        """Yield cached transactions in block order without loading the whole history"""
+        block, tx_hash = -1, ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute("""
+                    SELECT block, hash, tx FROM transactions
+                    WHERE chain = ? AND address = ? AND (block > ? OR (block = ? AND hash > ?))
+                    ORDER BY block, hash LIMIT ?
+                """, (chain, address, block, block, tx_hash, batch_size)).fetchall()
+            if not rows:
+                return
+            yield [json.loads(row[2]) for row in rows]
+            block, tx_hash = rows[-1][0], rows[-1][1]
+
+    def merge(self, chain, address, txs, block_of, key_of=None):
+        """Store newly fetched transactions and advance the address cursor
+
+        `block_of` maps a transaction to its block number; transactions without a
+        confirmed block (negative or missing) are not stored so that they are
+        fetched again once mined. `key_of` gives the identity a row is stored
+        under (the hash by default), for rows such as token transfers that
+        share their transaction's hash.
+        """
+        now = time.time()
+        rows = []
+        last_block = -1
+        for tx in txs:
+            try:
+                block = int(block_of(tx))
+            except (TypeError, ValueError):
+                continue
+            if block < 0:
+                continue
+            last_block = max(last_block, block)
+            rows.append((chain, address, key_of(tx) if key_of else tx['hash'], block, json.dumps(tx)))
+        get_metrics().count('cache_rows_written', len(rows), chain=chain)
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO transactions (chain, address, hash, block, tx) VALUES (?, ?, ?, ?, ?)',
+                rows)
+            self._conn.execute("""
+                INSERT INTO addresses (chain, address, last_block, updated_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (chain, address) DO UPDATE SET
+                    last_block = MAX(last_block, excluded.last_block),
+                    updated_at = excluded.updated_at,
+                    accessed_at = excluded.accessed_at
+            """, (chain, address, last_block, now, now))
+            self._evict(now)
+            self._conn.commit()
+
+    def _delete(self, chain, address):
+        self._conn.execute('DELETE FROM transactions WHERE chain = ? AND address = ?', (chain, address))
+        self._conn.execute('DELETE FROM addresses WHERE chain = ? AND address = ?', (chain, address))
+
+    def _evict(self, now):
+        """Drop expired addresses, then the least recently used ones over the size limit"""
+        stale = self._conn.execute(
+            'SELECT chain, address FROM addresses WHERE accessed_at < ?', (now - self.ttl,)).fetchall()
+        overflow = self._conn.execute(
+            'SELECT chain, address FROM addresses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?',
+            (self.max_addresses,)).fetchall()
+        for chain, address in set(stale) | set(overflow):
+            self._delete(chain, address)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def add_cache_arguments(parser):
+    """Register the --cache-dir/--no-cache options shared by both entry points"""
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f'Directory for the local API response cache (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always download full histories instead of using the local cache')
+
+
+def cache_from_args(args):
+    """Build the cache selected on the command line, or None when disabled"""
+    if args.no_cache:
+        return None
+    return TransactionCache(args.cache_dir)
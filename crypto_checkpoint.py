@@ -0,0 +1,149 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+
+from crypto_metrics import get_metrics
+
+
+class CrawlCheckpoint:
+    """Progress of one crawl in a SQLite file, so an interrupted crawl can resume
+
+    Fetched responses are appended as each chunk of lookups completes; the
+    next frontier, the newly seen addresses and transactions and the pruning
+    counters are appended at every level boundary. Writes run on a background
+    thread and never grow with the size of the crawl, so they do not stall it.
+    Node IDs are assigned from the fetched responses once fetching ends, so a
+    resumed crawl numbers its graph exactly like an uninterrupted one.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS fetched (
+                address TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS seen (
+                address TEXT PRIMARY KEY
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS tx_hashes (
+                hash TEXT PRIMARY KEY
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS frontier (
+                level INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                address TEXT NOT NULL,
+                PRIMARY KEY (level, position)
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write, daemon=True)
+        self._writer.start()
+
+    def _meta(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def params(self):
+        """The crawl parameters recorded by start(), or None for a new checkpoint"""
+        return self._meta('params')
+
+    def start(self, params):
+        """Record the parameters of a new crawl; a checkpoint only ever holds one crawl"""
+        recorded = self.params()
+        if recorded is not None and recorded != params:
+            raise ValueError(f"{self.path} holds a crawl of {recorded['address']} at depth {recorded['depth']}")
+        self._queue.put(('meta', [('params', params)]))
+
+    def load(self):
+        """Return the saved crawl state, or None when no level was reached yet"""
+        level = self._meta('level')
+        if level is None:
+            return None
+        with self._lock:
+            fetched = {address: json.loads(data)
+                       for address, data in self._conn.execute('SELECT address, data FROM fetched')}
+            seen = {row[0] for row in self._conn.execute('SELECT address FROM seen')}
+            tx_hashes = {row[0] for row in self._conn.execute('SELECT hash FROM tx_hashes')}
+            frontier = [row[0] for row in self._conn.execute(
+                'SELECT address FROM frontier WHERE level = ? ORDER BY position', (level,))]
+        return {
+            'level': level,
+            'frontier': frontier,
+            'fetched': fetched,
+            'seen': seen,
+            'tx_hashes': tx_hashes,
+            'pruned': self._meta('pruned'),
+            'calls': self._meta('calls') or 0,
+        }
+
+    def record(self, info, calls):
+        """Queue the responses of a completed chunk of lookups; failed lookups are retried on resume"""
+        rows = [(address, json.dumps(data)) for address, data in info.items() if data is not None]
+        self._queue.put(('fetched', rows, calls))
+
+    def level(self, level, frontier, seen, tx_hashes, pruned, calls):
+        """Queue the start of a level: its frontier plus the addresses and transactions first seen before it"""
+        self._queue.put(('level', level, list(frontier), list(seen), list(tx_hashes), json.loads(json.dumps(pruned)),
+                         calls))
+
+    def _write(self):
+        metrics = get_metrics()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            with metrics.stage('checkpoint_write'), self._lock:
+                self._apply(item)
+                # Commit once the queue is drained so bursts share a transaction
+                if self._queue.empty():
+                    self._conn.commit()
+            metrics.count('checkpoint_writes')
+
+    def _apply(self, item):
+        execute = self._conn.execute
+        if item[0] == 'meta':
+            for key, value in item[1]:
+                execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+        elif item[0] == 'fetched':
+            _, rows, calls = item
+            self._conn.executemany('INSERT OR REPLACE INTO fetched (address, data) VALUES (?, ?)', rows)
+            execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('calls', ?)", (json.dumps(calls),))
+        else:
+            _, level, frontier, seen, tx_hashes, pruned, calls = item
+            self._conn.executemany('INSERT OR IGNORE INTO frontier (level, position, address) VALUES (?, ?, ?)',
+                                   [(level, position, address) for position, address in enumerate(frontier)])
+            self._conn.executemany('INSERT OR IGNORE INTO seen (address) VALUES (?)', [(a,) for a in seen])
+            self._conn.executemany('INSERT OR IGNORE INTO tx_hashes (hash) VALUES (?)', [(h,) for h in tx_hashes])
+            for key, value in (('pruned', pruned), ('calls', calls), ('level', level)):
+                execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def close(self):
+        """Flush pending writes and close the file"""
+        self._queue.put(None)
+        self._writer.join()
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+def add_checkpoint_arguments(parser):
+    """Register the crawl checkpoint options"""
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help='Save crawl progress to this file as it runs so an interrupted crawl can be resumed')
+    parser.add_argument('--resume', metavar='PATH',
+                        help='Continue the crawl saved in this checkpoint; its address, depth and crawl '
+                             'settings are reused')
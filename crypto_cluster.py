@@ -0,0 +1,258 @@
+import argparse
+import csv
+import sys
+import time
+from array import array
+from collections import defaultdict
+
+from crypto_graph import ROLE_ROOT, TRANSACTION, TransactionGraph
+from crypto_index import AddressIndex
+from crypto_labels import get_label_index
+from crypto_metrics import add_metrics_arguments, get_metrics, metrics_from_args, report_metrics
+
+
+class UnionFind:
+    """Disjoint sets over the integers 0..n-1 kept in two flat arrays
+
+    Union by size with path halving keeps every operation close to constant
+    time, and the arrays cost 16 bytes per element, so millions of addresses fit
+    comfortably in memory.
+    """
+
+    def __init__(self, size=0):
+        self.parent = array('Q', range(size))
+        self.size = array('Q', [1]) * size
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add(self):
+        """Append a singleton set and return its element"""
+        element = len(self.parent)
+        self.parent.append(element)
+        self.size.append(1)
+        return element
+
+    def find(self, element):
+        parent = self.parent
+        while parent[element] != element:
+            parent[element] = parent[parent[element]]
+            element = parent[element]
+        return element
+
+    def union(self, a, b):
+        """Merge the sets of a and b, returning False when they were already one set"""
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return False
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return True
+
+
+class AddressClusterer:
+    """Group addresses that are likely controlled by the same wallet
+
+    Common-input ownership joins every address spending in one transaction.
+    With `change` set, the one-time change heuristic also joins the inputs with
+    the single output address that has never been seen before, provided the
+    other outputs have and no output pays back to an input. "Seen" means seen
+    in the transactions added so far, so feed transactions in block order; on
+    a partial crawl the change heuristic is correspondingly weaker.
+    """
+
+    def __init__(self, change=False):
+        self.change = change
+        self.ids = {}
+        self.addresses = []
+        self.sets = UnionFind()
+        self.seen = bytearray()
+        self.input_links = self.change_links = 0
+
+    def _id(self, address):
+        element = self.ids.get(address)
+        if element is None:
+            element = self.ids[address] = self.sets.add()
+            self.addresses.append(address)
+            self.seen.append(0)
+        return element
+
+    def add(self, inputs, outputs):
+        """Apply the heuristics to one transaction given its input and output addresses"""
+        inputs = [self._id(address) for address in inputs]
+        outputs = [self._id(address) for address in outputs]
+        for other in inputs[1:]:
+            self.input_links += self.sets.union(inputs[0], other)
+        if self.change and inputs:
+            distinct = set(outputs)
+            fresh = [element for element in distinct if not self.seen[element]]
+            if len(distinct) >= 2 and len(fresh) == 1 and not distinct & set(inputs):
+                self.change_links += self.sets.union(inputs[0], fresh[0])
+        for element in inputs + outputs:
+            self.seen[element] = 1
+
+    def add_transaction(self, tx):
+        """Add a BlockCypher-style transaction; multisig inputs join all their addresses"""
+        self.add([address for inp in tx.get('inputs', []) for address in inp.get('addresses') or []],
+                 [address for out in tx.get('outputs', []) for address in out.get('addresses') or []])
+
+    def clusters(self):
+        """Map every address to a cluster number, numbered in order of first appearance"""
+        numbers = {}
+        mapping = {}
+        for element, address in enumerate(self.addresses):
+            root = self.sets.find(element)
+            mapping[address] = numbers.setdefault(root, len(numbers))
+        return mapping
+
+    def stats(self):
+        roots = [self.sets.find(element) for element in range(len(self.sets))]
+        sizes = defaultdict(int)
+        for root in roots:
+            sizes[root] += 1
+        return {
+            'addresses': len(self.addresses),
+            'clusters': len(sizes),
+            'largest': max(sizes.values(), default=0),
+            'input_links': self.input_links,
+            'change_links': self.change_links,
+        }
+
+
+def cluster_graph(graph, change=False):
+    """Cluster the addresses of a crawled TransactionGraph, returning the AddressClusterer"""
+    inputs, outputs = defaultdict(list), defaultdict(list)
+    for edge in range(graph.edge_count):
+        source, target = graph.sources[edge], graph.targets[edge]
+        if graph.kinds[source - 1] == TRANSACTION:
+            outputs[source].append(graph.keys[target - 1])
+        else:
+            inputs[target].append(graph.keys[source - 1])
+    clusterer = AddressClusterer(change)
+    transactions = [node_id for node_id in range(1, len(graph) + 1) if graph.kinds[node_id - 1] == TRANSACTION]
+    # Unconfirmed transactions come last
+    transactions.sort(key=lambda node_id: (graph.blocks[node_id - 1] < 0, graph.blocks[node_id - 1], node_id))
+    for node_id in transactions:
+        clusterer.add(inputs[node_id], outputs[node_id])
+    return clusterer
+
+
+def cluster_index(index, change=False, batch_size=10000):
+    """Cluster every transaction of an ingested AddressIndex, in block order"""
+    clusterer = AddressClusterer(change)
+    for batch in index.scan(batch_size):
+        for tx in batch:
+            clusterer.add_transaction(tx)
+    return clusterer
+
+
+def collapse_clusters(graph, clusters, labels=None):
+    """Copy a graph with the addresses of every multi-address cluster merged into one node
+
+    A merged node is keyed by the root address when the cluster holds it, else
+    by its first labeled member, else by its first member, so it keeps the
+    color that address would have had. Transaction nodes are kept, and parallel
+    edges to a merged node are summed when rendered.
+    """
+    labels = labels or get_label_index()
+    members = defaultdict(list)
+    for node_id in range(1, len(graph) + 1):
+        if graph.kinds[node_id - 1] != TRANSACTION:
+            cluster = clusters.get(graph.keys[node_id - 1])
+            if cluster is not None:
+                members[cluster].append(node_id)
+    representative = {}
+    for cluster, node_ids in members.items():
+        if len(node_ids) < 2:
+            continue
+        lead = next((node_id for node_id in node_ids if graph.roles[node_id - 1] == ROLE_ROOT), None) or \
+            next((node_id for node_id in node_ids if graph.keys[node_id - 1] in labels), node_ids[0])
+        for node_id in node_ids:
+            representative[node_id] = lead
+
+    collapsed = TransactionGraph(graph.currency, graph.decimals)
+    for currency, decimals in graph.assets[1:]:
+        collapsed.asset(currency, decimals)
+    new_ids = array('L', [0]) * (len(graph) + 1)
+    for node_id in range(1, len(graph) + 1):
+        index = node_id - 1
+        lead = representative.get(node_id, node_id)
+        new_id = collapsed.node_id(graph.keys[lead - 1], graph.kinds[index], graph.blocks[index],
+                                   graph.times[index], graph.node_assets[index])
+        collapsed.mark(new_id, graph.roles[index])
+        if node_id in representative:
+            collapsed.cluster_sizes[new_id] = collapsed.cluster_sizes.get(new_id, 0) + 1
+        new_ids[node_id] = new_id
+    for edge in range(graph.edge_count):
+        collapsed.add_edge(new_ids[graph.sources[edge]], new_ids[graph.targets[edge]], graph.value(edge),
+                           graph.edge_times[edge])
+    return collapsed
+
+
+def write_cluster_map(clusters, path):
+    """Write an address → cluster map as `address,cluster` CSV"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['address', 'cluster'])
+        writer.writerows(clusters.items())
+
+
+def read_cluster_map(path, addresses=None):
+    """Read a map written by write_cluster_map, keeping only `addresses` when given"""
+    clusters = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if addresses is None or row['address'] in addresses:
+                clusters[row['address']] = int(row['cluster'])
+    return clusters
+
+
+def add_cluster_arguments(parser):
+    """Register the options that collapse address clusters in the rendered graph"""
+    parser.add_argument('--cluster', action='store_true',
+                        help='Merge addresses that spend together (common-input ownership) into one node')
+    parser.add_argument('--cluster-change', action='store_true',
+                        help='With --cluster, also merge one-time change outputs with their inputs')
+    parser.add_argument('--cluster-map', metavar='PATH',
+                        help="Merge addresses using a map written by the 'cluster' subcommand")
+
+
+def clusters_from_args(args, graph):
+    """The address → cluster map selected on the command line for a crawled graph, or None"""
+    if args.cluster_map:
+        return read_cluster_map(args.cluster_map, set(graph.ids))
+    if args.cluster or args.cluster_change:
+        with get_metrics().stage('cluster'):
+            return cluster_graph(graph, args.cluster_change).clusters()
+    return None
+
+
+def main(argv=None):
+    """Clustering entry point (`crypto_tracker_v3.py cluster`)"""
+    parser = argparse.ArgumentParser(prog='crypto_tracker_v3.py cluster',
+                                     description='Cluster the addresses of an ingested index by common-input '
+                                                 'ownership and write an address to cluster map')
+    parser.add_argument('index', help="Address index built by the 'ingest' subcommand")
+    parser.add_argument('-o', '--output', default='clusters.csv', help='CSV file to write (default: clusters.csv)')
+    parser.add_argument('--change', action='store_true', help='Also apply the one-time change heuristic')
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+
+    metrics_from_args(args)
+    index = AddressIndex(args.index)
+    started = time.monotonic()
+    with get_metrics().stage('cluster'):
+        clusterer = cluster_index(index, args.change)
+    with get_metrics().stage('cluster_write'):
+        write_cluster_map(clusterer.clusters(), args.output)
+    stats = clusterer.stats()
+    print(f"[+] {stats['addresses']:,} addresses in {stats['clusters']:,} clusters (largest {stats['largest']:,}; "
+          f"{stats['input_links']:,} input and {stats['change_links']:,} change merges) in "
+          f"{time.monotonic() - started:.1f}s, written to {args.output}", file=sys.stderr)
+    report_metrics(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,653 @@
+import heapq
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from crypto_graph import ROLE_EXPANDED, ROLE_ROOT, TransactionGraph
+from crypto_http import default_client
+from crypto_labels import get_label_index
+from crypto_metrics import get_metrics
+from crypto_providers import (RESULT_CAP, ProviderError, TRANSFER_ACTIONS, etherscan_transfer, make_provider,
+                              transfer_order)
+
+
+# Headless fetch, crawl and analysis shared by both scripts and the subcommands. Keep module-level
+# imports light: pandas is imported where frames are built and plotting is left to the renderers,
+# so fetch-only runs start in a fraction of a second.
+API_KEY = "Etherscan_API"
+LATEST_BLOCK = 99999999
+TX_COLUMNS = ["id", "hash", "blockNumber", "timeStamp", "from", "to", "value", "kind", "asset", "decimals", "logIndex"]
+TRANSFER_BATCH = 1000  # merged transfers yielded together, cut at a block boundary
+
+
+def fetch_txlist_page(address, api_key, startblock, endblock, page, offset, http=None, sort="asc", action="txlist"):
+    """Fetch one page of an address's history (txlist, txlistinternal or tokentx) within a block window"""
+    params = {
+        "module": "account",
+        "action": action,
+        "address": address,
+        "startblock": startblock,
+        "endblock": endblock,
+        "page": page,
+        "offset": offset,
+        "sort": sort,
+        "apikey": api_key,
+    }
+    http = http or default_client()
+    data = http.get_json("etherscan", http.urls["etherscan"], params)
+    if data["status"] == "1":
+        return data["result"]
+    if data["message"] == "No transactions found":
+        return []
+    raise RuntimeError(f"Etherscan Error: {data['message']} ({data['result']})")
+
+
+def iter_transactions(address, api_key=API_KEY, startblock=0, endblock=LATEST_BLOCK, page_size=1000, http=None,
+                      action="txlist"):
+    """Yield batches of transactions in block order, walking past the result cap
+
+    Each block window is paged through until it is exhausted. A window that hits
+    the result cap is resumed from its last block with a narrower span, and the
+    span grows again once windows come back under the cap. Only the current page
+    and the rows of its last (possibly incomplete) block are held in memory.
+    """
+    start = startblock
+    span = endblock - startblock + 1
+    while start <= endblock:
+        end = min(start + span - 1, endblock)
+        pending = []
+        for page in range(1, RESULT_CAP // page_size + 1):
+            rows = fetch_txlist_page(address, api_key, start, end, page, page_size, http, action=action)
+            pending.extend(rows)
+            if len(rows) < page_size:
+                break
+            # Hold back the last block in case it continues on the next page
+            cut = len(pending)
+            while cut and pending[cut - 1]["blockNumber"] == pending[-1]["blockNumber"]:
+                cut -= 1
+            if cut:
+                yield pending[:cut]
+                pending = pending[cut:]
+        else:
+            tail = int(pending[0]["blockNumber"])
+            if tail == start:
+                # A single block above the cap cannot be split any further
+                print(f"Warning: block {tail} of {address} truncated at {RESULT_CAP} transactions")
+                yield pending
+                start = tail + 1
+            else:
+                span = max(1, tail - start)
+                start = tail
+            continue
+        if pending:
+            yield pending
+        start = end + 1
+        span *= 2
+
+
+def _transfer_stream(address, api_key, startblock, http, action, stop):
+    """Start a background thread queueing the typed batches of one account action, returning its rows
+
+    The thread starts right away rather than on first iteration, so all
+    actions are in flight together. The queue ends with None, or with the
+    exception that stopped the walk.
+    """
+    batches = queue.Queue()
+
+    def produce():
+        try:
+            for batch in iter_transactions(address, api_key, startblock, http=http, action=action):
+                if stop.is_set():
+                    break
+                batches.put([etherscan_transfer(row, action) for row in batch])
+            batches.put(None)
+        except Exception as e:
+            batches.put(e)
+
+    def rows():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield from batch
+
+    threading.Thread(target=produce, daemon=True).start()
+    return rows()
+
+
+def iter_transfers(address, api_key=API_KEY, startblock=0, http=None, actions=TRANSFER_ACTIONS):
+    """Yield batches of typed transfers from several account actions, ordered by block and log index
+
+    Every action is walked by its own thread, so the history takes about as
+    long as the slowest single list, and the sorted streams are joined as they
+    arrive. Batches end on a block boundary, so every transfer up to a batch's
+    last block has been yielded once the batch is.
+    """
+    stop = threading.Event()
+    streams = [_transfer_stream(address, api_key, startblock, http, action, stop) for action in actions]
+    batch = []
+    try:
+        for row in heapq.merge(*streams, key=transfer_order):
+            if len(batch) >= TRANSFER_BATCH and row["blockNumber"] != batch[-1]["blockNumber"]:
+                yield batch
+                batch = []
+            batch.append(row)
+        if batch:
+            yield batch
+    finally:
+        stop.set()
+
+
+def _txlist_row(tx):
+    """Convert an indexed BlockCypher-style transaction back to an Etherscan txlist row"""
+    confirmed = datetime.fromisoformat(tx["confirmed"].replace("Z", "+00:00"))
+    return etherscan_transfer({
+        "hash": tx["hash"],
+        "blockNumber": str(tx["block_height"]),
+        "timeStamp": str(int(confirmed.timestamp())),
+        "from": tx["inputs"][0]["addresses"][0],
+        "to": (tx["outputs"][0]["addresses"] or [""])[0],
+        "value": str(tx["outputs"][0]["value"]),
+    })
+
+
+def _block_ordered(batches):
+    """Re-sort cached transfer batches by transfer_order across batch boundaries
+
+    The cache pages by block and row id, so the transfers of one block can be
+    split over two pages in id order. The last block of every batch is
+    carried over to the next one before sorting.
+    """
+    pending = []
+    for batch in batches:
+        pending.extend(batch)
+        if not pending:
+            continue
+        last = int(pending[-1]["blockNumber"])
+        cut = len(pending)
+        while cut and int(pending[cut - 1]["blockNumber"]) == last:
+            cut -= 1
+        if cut:
+            yield sorted(pending[:cut], key=transfer_order)
+            pending = pending[cut:]
+    if pending:
+        yield sorted(pending, key=transfer_order)
+
+
+def iter_transaction_batches(address, api_key=API_KEY, cache=None, http=None, index=None, actions=TRANSFER_ACTIONS):
+    """Yield the full transfer history in block order, only requesting blocks past the cached cursor
+
+    With an ingested `index` the history of its block ranges is read locally
+    instead; an index only holds normal transactions.
+    """
+    address = address.lower()
+    if index:
+        for batch in index.iter_batches(address):
+            yield [_txlist_row(tx) for tx in batch]
+        return
+    # Plain txlist histories stay under "eth"; merged streams are cached apart
+    chain = "eth" if tuple(actions) == ("txlist",) else "eth:transfers"
+    cursor = cache.cursor(chain, address) if cache else None
+    if cursor is not None:
+        batches = cache.iter_batches(chain, address)
+        yield from batches if chain == "eth" else _block_ordered(batches)
+    startblock = 0 if cursor is None else cursor + 1
+    for batch in iter_transfers(address, api_key, startblock, http=http, actions=actions):
+        if cache:
+            cache.merge(chain, address, batch, lambda tx: tx["blockNumber"], lambda tx: tx["id"])
+        yield batch
+
+
+def get_transactions(address, api_key=API_KEY, cache=None, http=None, index=None, actions=TRANSFER_ACTIONS):
+    try:
+        return [tx for batch in iter_transaction_batches(address, api_key, cache, http, index, actions)
+                for tx in batch]
+    except Exception as e:
+        print(f"API Error: {str(e)}")
+        return []
+
+
+def _transaction_frame(transactions):
+    """Build a compact frame holding only the columns the analysis uses"""
+    import pandas as pd
+
+    df = pd.DataFrame(transactions, columns=TX_COLUMNS)
+    # Plain txlist rows are normal ETH transfers
+    df["id"] = df["id"].fillna(df["hash"])
+    df = df.fillna({"kind": "normal", "asset": "ETH", "decimals": 18, "logIndex": -1})
+    df["blockNumber"] = df["blockNumber"].astype("int64")
+    df["timeStamp"] = df["timeStamp"].astype("int64")
+    df["decimals"] = df["decimals"].astype("int64")
+    df["logIndex"] = df["logIndex"].astype("int64")
+    df["amount"] = df["value"].astype(float) / 10.0 ** df["decimals"]
+    df["value_eth"] = df["amount"].where(df["asset"] == "ETH", 0.0)
+    df["timestamp"] = pd.to_datetime(df["timeStamp"], unit="s")
+    df["from"] = df["from"].str.lower()
+    df["to"] = df["to"].str.lower()
+    return df
+
+
+def analyze_transactions(transactions, address):
+    """Analyze a list of transactions or an iterable of transaction batches"""
+    import pandas as pd
+
+    metrics = get_metrics()
+    batches = [transactions] if isinstance(transactions, list) else transactions
+    frames = []
+    for batch in batches:
+        if batch:
+            with metrics.stage('frame'):
+                frames.append(_transaction_frame(batch))
+    if not frames:
+        return pd.DataFrame(), [], []
+    df = pd.concat(frames, ignore_index=True)
+    metrics.count('transactions_analyzed', len(df))
+    
+    # Classify senders and receivers against the label index in one pass
+    with metrics.stage('classify'):
+        df = get_label_index().classify(df, address)
+    exchange_txs = df[df['risk_category'] == 'exchange']
+    mixer_txs = df[df['risk_category'] == 'mixer']
+    
+    return df, exchange_txs, mixer_txs
+
+
+def add_transfers(graph, transactions, address):
+    """Add Etherscan-style transfer rows to a TransactionGraph, marking `address` as the root"""
+    address = address.lower()
+    for tx in transactions:
+        try:
+            from_addr = tx['from'].lower()
+            to_addr = tx['to'].lower()
+            value = int(tx['value'])
+            timestamp = int(tx['timeStamp'])
+
+            asset = graph.asset(tx.get('asset', 'ETH'), tx.get('decimals', 18))
+            tx_id = graph.add_transaction(tx.get('id', tx['hash']), int(tx.get('blockNumber', -1)), timestamp, asset)
+            from_id = graph.add_address(from_addr)
+            to_id = graph.add_address(to_addr)
+            for addr_id, addr in ((from_id, from_addr), (to_id, to_addr)):
+                if addr == address:
+                    graph.mark(addr_id, ROLE_ROOT)
+
+            graph.add_edge(from_id, tx_id, value, timestamp)
+            graph.add_edge(tx_id, to_id, value, timestamp)
+        except Exception as e:
+            print(f"Error processing transaction: {str(e)}")
+            continue
+
+
+def parse_confirmed(confirmed):
+    """Convert a BlockCypher-style confirmation time to a unix timestamp (0 if unknown)"""
+    if not confirmed:
+        return 0
+    try:
+        return int(datetime.fromisoformat(confirmed.replace('Z', '+00:00')).timestamp())
+    except ValueError:
+        return 0
+
+
+# Transactions followed per expanded address, and the activity that marks an address as a hub
+FAN_OUT = 5
+HUB_RECENT_TXS = 10
+HUB_WINDOW = 3600
+HUB_TX_COUNT = 10000
+# Options a checkpoint records so --resume repeats the same crawl
+CRAWL_PARAMS = ('address', 'crypto', 'depth', 'fan_out', 'hub_window', 'hub_tx_count')
+
+
+def _tx_value(tx):
+    """Output total in whole units, so token transfers rank against ETH ones by amount"""
+    return sum(out.get('value', 0) or 0 for out in tx.get('outputs', [])) / 10 ** tx.get('decimals', 0)
+
+
+def _split(addresses, value):
+    """Share an input's or output's value between all its (multisig) addresses"""
+    share, rest = divmod(value or 0, len(addresses))
+    return [(address, share + (rest if i == 0 else 0)) for i, address in enumerate(addresses)]
+
+
+def _tx_addresses(tx):
+    """Every input address, then every output address of a transaction, in order"""
+    for inp in tx.get('inputs', []):
+        yield from inp.get('addresses') or []
+    for out in tx.get('outputs', []):
+        yield from out.get('addresses') or []
+
+
+class CrawlBudget:
+    """Limits for a single crawl; None means unlimited"""
+
+    def __init__(self, max_calls=None, max_time=None, max_nodes=None):
+        self.max_calls = max_calls
+        self.max_time = max_time
+        self.max_nodes = max_nodes
+        self.start()
+
+    def start(self):
+        self.started = time.monotonic()
+        self.calls = 0
+
+    def calls_left(self):
+        return None if self.max_calls is None else max(0, self.max_calls - self.calls)
+
+    def out_of_time(self):
+        return self.max_time is not None and time.monotonic() - self.started >= self.max_time
+
+
+class BlockchainAnalyzer:
+    def __init__(self, crypto_type='btc', api_key=None, cache=None, http=None, labels=None, budget=None,
+                 fan_out=FAN_OUT, hub_window=HUB_WINDOW, hub_tx_count=HUB_TX_COUNT, provider=None,
+                 checkpoint=None, work_queue=None):
+        """Initialize with a pluggable transaction provider
+
+        `provider` defaults to Etherscan for ETH and BlockCypher for BTC.
+        With a `checkpoint` (CrawlCheckpoint), crawl progress is saved as it
+        runs and a crawl it already holds is resumed. With a `work_queue`
+        (crypto_queue.QueueFetcher), each level is fetched by the queue's
+        workers rather than by this process.
+
+        `budget` bounds API calls, wall time and graph size. Each expanded address
+        follows its `fan_out` highest-value transactions. Labeled addresses, and
+        hubs that report `hub_tx_count` transactions or whose last
+        HUB_RECENT_TXS transactions fit in `hub_window` seconds, are kept as
+        terminal nodes instead of being expanded.
+        """
+        self.crypto_type = crypto_type
+        self.api_key = api_key
+        self.http = http or default_client()
+        self.provider = provider or make_provider(crypto_type, api_key, self.http)
+        self.labels = labels or get_label_index()
+        # Only the most recent page of each history is fetched here, so entries
+        # live under their own key rather than next to complete histories
+        self.cache = None if self.provider.local else cache
+        self.cache_chain = f"{crypto_type}:{self.provider.cache_key}"
+        self.graph = TransactionGraph(*{'btc': ('BTC', 8), 'eth': ('ETH', 18)}.get(crypto_type, ('BTC', 8)))
+        self.budget = budget or CrawlBudget()
+        self.fan_out = fan_out
+        self.hub_window = hub_window
+        self.hub_tx_count = hub_tx_count
+        self.hubs = set()
+        self.pruned = {'hubs': [], 'labeled': [], 'fan_out': 0, 'max_calls': 0, 'max_time': 0, 'max_nodes': 0}
+        self.checkpoint = checkpoint
+        self.work_queue = work_queue
+
+    def get_address_info(self, address):
+        """Fetch address details from the configured provider"""
+        return self.get_addresses_info([address]).get(address)
+
+    def get_addresses_info(self, addresses):
+        """Fetch several addresses, in batched requests where the provider supports them
+
+        With a cache attached only blocks after each cached cursor are requested
+        and the responses are merged into the stored histories; the provider
+        then cuts the stored history to the window an uncached fetch would
+        return, so caching never changes the graph. Addresses that could not be
+        fetched map to None.
+        """
+        provider = self.provider
+        cursors = {address: self.cache.cursor(self.cache_chain, address) if self.cache else None
+                   for address in addresses}
+        try:
+            results = provider.fetch_many(cursors)
+        except Exception as e:
+            print(f"API Error: {str(e)}")
+            return dict.fromkeys(addresses)
+        info = {}
+        for address in addresses:
+            data = results.get(address)
+            if isinstance(data, ProviderError):
+                print(str(data))
+                data = None
+            if data is None:
+                info[address] = None
+                continue
+            txs = data.get('txs', [])
+            if self.cache:
+                self.cache.merge(self.cache_chain, address, txs, provider.block_of, provider.key_of)
+                unconfirmed = [tx for tx in txs if int(provider.block_of(tx)) < 0]
+                txs = provider.trim(unconfirmed + self.cache.load(self.cache_chain, address, descending=True))
+            data['txs'] = [provider.normalize(tx) for tx in txs]
+            info[address] = data
+        return info
+
+    def _select_txs(self, data):
+        """The fan_out highest-value transactions of an address, in their original order"""
+        txs = data.get('txs', []) if data else []
+        if self.fan_out is None or len(txs) <= self.fan_out:
+            return txs
+        ranked = sorted(range(len(txs)), key=lambda i: _tx_value(txs[i]), reverse=True)[:self.fan_out]
+        return [txs[i] for i in sorted(ranked)]
+
+    def _is_hub(self, data):
+        """Detect exchange hot wallets and busy contracts from an address's own history"""
+        if not data:
+            return False
+        if data.get('n_tx', 0) >= self.hub_tx_count:
+            return True
+        if not self.hub_window:
+            return False
+        times = sorted((parse_confirmed(tx.get('confirmed')) for tx in data.get('txs', [])), reverse=True)
+        recent = [t for t in times if t][:HUB_RECENT_TXS]
+        return len(recent) >= HUB_RECENT_TXS and recent[0] - recent[-1] <= self.hub_window
+
+    def _counterparties(self, data):
+        """Yield the addresses a crawl steps into from an address's transactions"""
+        for tx in self._select_txs(data):
+            yield from _tx_addresses(tx)
+
+    def _fetch_level(self, pool, frontier, fetched, concurrency):
+        """Fetch one level of addresses, stopping at the call and time budgets"""
+        budget = self.budget
+        left = budget.calls_left()
+        if left is not None and left < len(frontier):
+            self.pruned['max_calls'] += len(frontier) - left
+            frontier = frontier[:left]
+        if self.work_queue:
+            self._fetch_distributed(frontier, fetched)
+            return
+        # Fetch in small chunks only when a deadline has to be checked or progress saved between them
+        batch = self.provider.batch_size
+        chunked = budget.max_time is not None or self.checkpoint
+        step = concurrency * batch if chunked else max(1, len(frontier))
+        for start in range(0, len(frontier), step):
+            if budget.out_of_time():
+                self.pruned['max_time'] += len(frontier) - start
+                return
+            chunk = frontier[start:start + step]
+            budget.calls += len(chunk)
+            groups = [chunk[i:i + batch] for i in range(0, len(chunk), batch)]
+            for info in pool.map(self.get_addresses_info, groups):
+                fetched.update(info)
+                if self.checkpoint:
+                    self.checkpoint.record(info, budget.calls)
+
+    def _fetch_distributed(self, frontier, fetched):
+        """Fetch one level through the work queue's workers instead of the local pool"""
+        budget = self.budget
+        if not frontier:
+            return
+        if budget.out_of_time():
+            self.pruned['max_time'] += len(frontier)
+            return
+        deadline = None if budget.max_time is None else budget.started + budget.max_time
+        info, dropped = self.work_queue.fetch(frontier, deadline)
+        self.pruned['max_time'] += dropped
+        budget.calls += len(frontier) - dropped
+        fetched.update(info)
+        if self.checkpoint:
+            self.checkpoint.record(info, budget.calls)
+
+    def fetch_frontier(self, address, depth=2, concurrency=8):
+        """Fetch every address within depth hops, one level at a time
+
+        Hubs and labeled addresses are not expanded, and nothing more is fetched
+        once the crawl budget is used up; what was skipped is recorded in
+        self.pruned. A checkpointed crawl restarts at its saved level and only
+        fetches the addresses of that level it has no response for.
+        """
+        budget = self.budget
+        budget.start()
+        checkpoint = self.checkpoint
+        state = checkpoint.load() if checkpoint else None
+        if state:
+            fetched, frontier, seen, tx_hashes = state['fetched'], state['frontier'], state['seen'], state['tx_hashes']
+            first_level = state['level']
+            self.pruned = state['pruned']
+            self.hubs = set(self.pruned['hubs'])
+            budget.calls = state['calls']
+            if first_level > depth:
+                print(f"[+] Checkpoint holds a finished crawl of {len(fetched)} addresses", file=sys.stderr)
+            else:
+                print(f"[+] Resuming at depth {first_level} with {len(fetched)} addresses already fetched",
+                      file=sys.stderr)
+        else:
+            fetched = {}
+            frontier = [address]
+            seen = {address}
+            tx_hashes = set()  # with seen, a lower bound on the graph's node count
+            first_level = 0
+            if checkpoint:
+                checkpoint.level(0, frontier, seen, tx_hashes, self.pruned, budget.calls)
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for level in range(first_level, depth + 1):
+                self._fetch_level(pool, [addr for addr in frontier if addr not in fetched], fetched, concurrency)
+                if level == depth:
+                    if checkpoint:
+                        checkpoint.level(depth + 1, [], (), (), self.pruned, budget.calls)
+                    break
+                next_frontier = []
+                new_seen, new_hashes = [], []
+                for addr in frontier:
+                    if addr not in fetched:
+                        continue
+                    if addr != address and self._is_hub(fetched[addr]):
+                        self.hubs.add(addr)
+                        self.pruned['hubs'].append(addr)
+                        continue
+                    txs = fetched[addr].get('txs', []) if fetched[addr] else []
+                    selected = self._select_txs(fetched[addr])
+                    self.pruned['fan_out'] += len(txs) - len(selected)
+                    new_hashes.extend(tx['hash'] for tx in selected if tx['hash'] not in tx_hashes)
+                    tx_hashes.update(tx['hash'] for tx in selected)
+                    for neighbour in self._counterparties(fetched[addr]):
+                        if neighbour in seen:
+                            continue
+                        seen.add(neighbour)
+                        new_seen.append(neighbour)
+                        if neighbour in self.labels:
+                            self.pruned['labeled'].append(neighbour)
+                        elif budget.max_nodes is None or len(seen) + len(tx_hashes) <= budget.max_nodes:
+                            # Past the node budget nothing is fetched, but the graph replay
+                            # decides (and counts) what is actually left out
+                            next_frontier.append(neighbour)
+                frontier = next_frontier
+                if checkpoint:
+                    checkpoint.level(level + 1, frontier, new_seen, new_hashes, self.pruned, budget.calls)
+                if not frontier:
+                    break
+        get_metrics().count('crawl_lookups', budget.calls)
+        for reason in ('fan_out', 'max_calls', 'max_time'):
+            get_metrics().count('crawl_pruned', self.pruned[reason], reason=reason)
+        get_metrics().count('crawl_pruned', len(self.pruned['hubs']), reason='hub')
+        get_metrics().count('crawl_pruned', len(self.pruned['labeled']), reason='labeled')
+        return fetched
+
+    def pruning_report(self):
+        """Describe what the last crawl skipped, one line per reason"""
+        pruned = self.pruned
+        lines = []
+        if pruned['hubs']:
+            lines.append(f"{len(pruned['hubs'])} hub address(es) kept terminal: {', '.join(pruned['hubs'][:5])}"
+                         + (' ...' if len(pruned['hubs']) > 5 else ''))
+        if pruned['labeled']:
+            lines.append(f"{len(pruned['labeled'])} labeled address(es) not expanded")
+        if pruned['fan_out']:
+            lines.append(f"{pruned['fan_out']} lower-value transaction(s) beyond the fan-out of {self.fan_out}")
+        if pruned['max_calls']:
+            lines.append(f"{pruned['max_calls']} address(es) not fetched: call budget of "
+                         f"{self.budget.max_calls} reached")
+        if pruned['max_time']:
+            lines.append(f"{pruned['max_time']} address(es) not fetched: time budget of "
+                         f"{self.budget.max_time}s reached")
+        if pruned['max_nodes']:
+            lines.append(f"{pruned['max_nodes']} transaction(s) left out: node budget of "
+                         f"{self.budget.max_nodes} reached")
+        return lines
+
+    def get_transaction_graph(self, address, depth=2, concurrency=8):
+        """Build transaction graph with metadata
+
+        Addresses are fetched level by level with up to `concurrency` requests
+        in flight, then the graph is assembled in the same depth-first order as
+        a sequential crawl so node numbering does not depend on fetch timing.
+        """
+        graph = self.graph
+        budget = self.budget
+        visited = set()
+        over_budget = set()
+        metrics = get_metrics()
+        with metrics.stage('crawl_fetch'):
+            fetched = self.fetch_frontier(address, depth, concurrency)
+        metrics.gauge('addresses_fetched', len(fetched))
+
+        def process_transaction(tx, current_address, current_depth):
+            if tx['hash'] in graph:
+                return  # already recorded from another address's history
+            with metrics.stage('timestamp_parse'):
+                timestamp = parse_confirmed(tx.get('confirmed'))
+            try:
+                block = int(tx.get('block_height', -1))
+            except (TypeError, ValueError):
+                block = -1
+            asset = graph.asset(tx['asset'], tx['decimals']) if 'asset' in tx else 0
+            tx_id = graph.add_transaction(tx['hash'], block, timestamp, asset)
+
+            for inp in tx.get('inputs', []):
+                for sender, value in _split(inp.get('addresses') or [], inp.get('output_value', 0)):
+                    sender_id = graph.add_address(sender)
+                    graph.add_edge(sender_id, tx_id, value, timestamp)
+
+            for out in tx.get('outputs', []):
+                for receiver, value in _split(out.get('addresses') or [], out.get('value', 0)):
+                    receiver_id = graph.add_address(receiver)
+                    graph.add_edge(tx_id, receiver_id, value, timestamp)
+
+        def recurse(current_address, current_depth):
+            if current_depth > depth or current_address in visited:
+                return
+            visited.add(current_address)
+
+            addr_id = graph.add_address(current_address)
+            graph.mark(addr_id, ROLE_ROOT if current_depth == 0 else ROLE_EXPANDED)
+
+            data = fetched.get(current_address)
+            if not data or 'txs' not in data or current_address in self.hubs:
+                return
+
+            for tx in self._select_txs(data):
+                if budget.max_nodes is not None and len(graph) >= budget.max_nodes and tx['hash'] not in graph:
+                    if tx['hash'] not in over_budget:
+                        over_budget.add(tx['hash'])
+                        self.pruned['max_nodes'] += 1
+                    continue
+                try:
+                    process_transaction(tx, current_address, current_depth)
+                    if current_depth < depth:
+                        for neighbour in _tx_addresses(tx):
+                            recurse(neighbour, current_depth + 1)
+                except Exception as e:
+                    print(f"Error processing transaction: {str(e)}")
+                    continue
+
+        with metrics.stage('graph_build'):
+            recurse(address, 0)
+        metrics.count('crawl_pruned', self.pruned['max_nodes'], reason='max_nodes')
+        metrics.gauge('graph_nodes', len(graph))
+        metrics.gauge('graph_edges', graph.edge_count)
+        return graph, graph.legend
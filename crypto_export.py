@@ -0,0 +1,563 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from itertools import chain, islice
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+from crypto_cluster import add_cluster_arguments, clusters_from_args, collapse_clusters
+from crypto_graph import ADDRESS, TRANSACTION, TransactionGraph
+from crypto_labels import add_label_arguments, get_label_index, labels_from_args
+from crypto_metrics import add_metrics_arguments, get_metrics, metrics_from_args, report_metrics
+from crypto_render import add_render_arguments
+
+ROLES = ('none', 'root', 'expanded')
+# Key of the graph metadata (currencies, assets and wide edge values) stored with the node table
+METADATA_KEY = b'crypto_graph'
+
+
+def _graph_metadata(graph):
+    """Currencies, assets and the edge values too wide for the value_lo/value_hi columns"""
+    return {'currency': graph.currency, 'decimals': graph.decimals, 'assets': graph.assets,
+            'wide_values': {str(edge): str(value) for edge, value in graph.wide_values.items()}}
+
+
+def _split_value(value):
+    """The low and high 64-bit halves a TransactionGraph stores for a value (wider bits go to the metadata)"""
+    return value & ((1 << 64) - 1), (value >> 64) & ((1 << 64) - 1)
+
+
+def _nodes_path(path):
+    """Columnar exports keep the node table next to the edge table: graph.parquet -> graph.nodes.parquet"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.nodes{ext}"
+
+
+class GraphExporter(ABC):
+    """Stream a TransactionGraph to a file while it is being built
+
+    attach() registers the exporter as a graph listener, so edges are written
+    in chunks as they are added and never pile up in a second copy. A crawl
+    adds them when it assembles the graph after fetching (node numbers follow
+    that depth-first replay), not while lookups are in flight. Node roles
+    (root, expanded) are only final once the graph is complete, so the nodes
+    are written by close(), straight from the graph's arrays.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.graph = None
+        self.written = 0
+
+    def attach(self, graph):
+        self.graph = graph
+        graph.listeners.append(self)
+        self.open()
+        return self
+
+    def on_edges(self, graph, start, stop):
+        if stop > self.written:
+            with get_metrics().stage('export'):
+                self.write_edges(self.written, stop)
+            self.written = stop
+
+    def close(self, labels=None):
+        """Write the remaining edges and every node, and close the file"""
+        graph = self.graph
+        self.on_edges(graph, self.written, graph.edge_count)
+        with get_metrics().stage('export'):
+            self.write_nodes(labels or get_label_index())
+            self.finish()
+        graph.listeners.remove(self)
+
+    def edge_rows(self, start, stop):
+        """Yield (source, target, exact value, amount, asset symbol, timestamp) for a range of edges"""
+        graph = self.graph
+        for edge in range(start, stop):
+            source, target = graph.sources[edge], graph.targets[edge]
+            asset = graph.edge_asset(source, target)
+            value = graph.value(edge)
+            yield source, target, value, graph.amount(value, asset), graph.symbol(asset), graph.edge_times[edge]
+
+    def node_rows(self, labels):
+        """Yield one dict per node, in node ID order"""
+        graph = self.graph
+        for index, identifier in enumerate(graph.keys):
+            node_id = index + 1
+            category, entity = (None, None) if graph.kinds[index] == TRANSACTION else \
+                labels.lookup(identifier) or (None, None)
+            yield {
+                'id': node_id,
+                'key': identifier,
+                'kind': graph.kinds[index],
+                'type': graph.legend[index]['type'],
+                'role': graph.roles[index],
+                'block': graph.blocks[index],
+                'time': graph.times[index],
+                'asset': graph.node_assets[index],
+                'members': graph.cluster_sizes.get(node_id, 0),
+                'category': category,
+                'entity': entity,
+            }
+
+    def open(self):
+        pass
+
+    @abstractmethod
+    def write_edges(self, start, stop):
+        """Write edges start..stop-1"""
+
+    @abstractmethod
+    def write_nodes(self, labels):
+        """Write every node, once the graph is complete"""
+
+    def finish(self):
+        pass
+
+
+class ArrowExporter(GraphExporter):
+    """Arrow IPC edge and node tables"""
+
+    def _schemas(self):
+        import pyarrow as pa
+
+        edges = pa.schema([('source', pa.uint32()), ('target', pa.uint32()),
+                           ('value_lo', pa.uint64()), ('value_hi', pa.uint64()),
+                           ('amount', pa.float64()), ('asset', pa.string()), ('time', pa.int64())])
+        nodes = pa.schema([('id', pa.uint32()), ('key', pa.string()), ('kind', pa.uint8()), ('type', pa.string()),
+                           ('role', pa.uint8()), ('block', pa.int64()), ('time', pa.int64()), ('asset', pa.uint16()),
+                           ('members', pa.uint32()), ('category', pa.string()), ('entity', pa.string())])
+        return edges, nodes
+
+    def _edge_batch(self, start, stop):
+        import pyarrow as pa
+
+        graph = self.graph
+        rows = list(self.edge_rows(start, stop))
+        return pa.record_batch([
+            pa.array(graph.sources[start:stop], pa.uint32()),
+            pa.array(graph.targets[start:stop], pa.uint32()),
+            pa.array(graph.values_lo[start:stop], pa.uint64()),
+            pa.array(graph.values_hi[start:stop], pa.uint64()),
+            pa.array([row[3] for row in rows], pa.float64()),
+            pa.array([row[4] for row in rows], pa.string()),
+            pa.array(graph.edge_times[start:stop], pa.int64()),
+        ], schema=self.edge_schema)
+
+    def _node_table(self, labels):
+        import pyarrow as pa
+
+        rows = list(self.node_rows(labels))
+        schema = self.node_schema.with_metadata({METADATA_KEY: json.dumps(_graph_metadata(self.graph))})
+        return pa.Table.from_pylist(rows, schema=schema)
+
+    def open(self):
+        import pyarrow as pa
+
+        self.edge_schema, self.node_schema = self._schemas()
+        self.writer = pa.ipc.new_file(self.path, self.edge_schema)
+
+    def write_edges(self, start, stop):
+        self.writer.write_batch(self._edge_batch(start, stop))
+
+    def write_nodes(self, labels):
+        import pyarrow as pa
+
+        table = self._node_table(labels)
+        with pa.ipc.new_file(_nodes_path(self.path), table.schema) as writer:
+            writer.write_table(table)
+
+    def finish(self):
+        self.writer.close()
+
+
+class ParquetExporter(ArrowExporter):
+    """Parquet edge and node tables; each streamed chunk of edges becomes a row group"""
+
+    def open(self):
+        import pyarrow.parquet as pq
+
+        self.edge_schema, self.node_schema = self._schemas()
+        self.writer = pq.ParquetWriter(self.path, self.edge_schema, compression='zstd')
+
+    def write_edges(self, start, stop):
+        import pyarrow as pa
+
+        self.writer.write_table(pa.Table.from_batches([self._edge_batch(start, stop)]))
+
+    def write_nodes(self, labels):
+        import pyarrow.parquet as pq
+
+        pq.write_table(self._node_table(labels), _nodes_path(self.path), compression='zstd')
+
+
+class JsonlExporter(GraphExporter):
+    """One JSON object per line (gzip-compressed for .gz): edges, then nodes, then the graph metadata"""
+
+    def open(self):
+        opener = gzip.open if self.path.endswith('.gz') else open
+        self.file = opener(self.path, 'wt', encoding='utf-8')
+
+    def write_edges(self, start, stop):
+        for source, target, value, amount, asset, timestamp in self.edge_rows(start, stop):
+            self.file.write(json.dumps({'type': 'edge', 'source': source, 'target': target, 'value': str(value),
+                                        'amount': amount, 'asset': asset, 'time': timestamp}) + '\n')
+
+    def write_nodes(self, labels):
+        for node in self.node_rows(labels):
+            node['node_type'] = node.pop('type')
+            self.file.write(json.dumps({'type': 'node', **node}) + '\n')
+        self.file.write(json.dumps({'type': 'graph', **_graph_metadata(self.graph)}) + '\n')
+
+    def finish(self):
+        self.file.close()
+
+
+class GraphMLExporter(GraphExporter):
+    """GraphML for Gephi, Cytoscape or networkx.read_graphml; edges are written before the nodes they join
+
+    The graph's currency, asset list and wide values are stored as JSON in a graph-level
+    `metadata` attribute, written last, so load_graph() can rebuild it.
+    """
+
+    NODE_KEYS = (('key', 'string'), ('type', 'string'), ('role', 'string'), ('block', 'long'), ('time', 'long'),
+                 ('asset', 'string'), ('asset_id', 'int'), ('members', 'int'), ('category', 'string'),
+                 ('entity', 'string'))
+    EDGE_KEYS = (('value', 'string'), ('amount', 'double'), ('asset', 'string'), ('time', 'long'))
+
+    def open(self):
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for domain, keys in (('node', self.NODE_KEYS), ('edge', self.EDGE_KEYS)):
+            for name, kind in keys:
+                self.file.write(f'  <key id="{domain}_{name}" for="{domain}" attr.name="{name}" '
+                                f'attr.type="{kind}"/>\n')
+        self.file.write('  <key id="graph_metadata" for="graph" attr.name="metadata" attr.type="string"/>\n'
+                        '  <graph id="transactions" edgedefault="directed">\n')
+
+    @staticmethod
+    def _data(domain, values):
+        return ''.join(f'<data key="{domain}_{name}">{escape(str(value))}</data>'
+                       for name, value in values if value is not None)
+
+    def write_edges(self, start, stop):
+        for source, target, value, amount, asset, timestamp in self.edge_rows(start, stop):
+            data = self._data('edge', (('value', value), ('amount', amount), ('asset', asset), ('time', timestamp)))
+            self.file.write(f'    <edge source="n{source}" target="n{target}">{data}</edge>\n')
+
+    def write_nodes(self, labels):
+        graph = self.graph
+        for node in self.node_rows(labels):
+            values = (('key', node['key']), ('type', node['type']), ('role', ROLES[node['role']]),
+                      ('block', node['block']), ('time', node['time']), ('asset', graph.symbol(node['asset'])),
+                      ('asset_id', node['asset']), ('members', node['members'] or None), ('category', node['category']),
+                      ('entity', node['entity']))
+            self.file.write(f'    <node id="n{node["id"]}">{self._data("node", values)}</node>\n')
+
+    def finish(self):
+        metadata = escape(json.dumps(_graph_metadata(self.graph)))
+        self.file.write(f'    <data key="graph_metadata">{metadata}</data>\n  </graph>\n</graphml>\n')
+        self.file.close()
+
+
+EXPORTERS = {
+    '.arrow': ArrowExporter,
+    '.parquet': ParquetExporter,
+    '.jsonl': JsonlExporter,
+    '.jsonl.gz': JsonlExporter,
+    '.graphml': GraphMLExporter,
+}
+
+
+def _format(path):
+    return next((ext for ext in sorted(EXPORTERS, key=len, reverse=True) if path.endswith(ext)), None)
+
+
+def exporter_for(path):
+    """The exporter class for a file name, chosen by its extension"""
+    ext = _format(path)
+    if ext is None:
+        raise ValueError(f"cannot export to {path}: use one of {', '.join(EXPORTERS)}")
+    return EXPORTERS[ext](path)
+
+
+def export_graph(graph, path, labels=None):
+    """Export a graph that is already built"""
+    exporter_for(path).attach(graph).close(labels)
+
+
+def _typed(typecode, values):
+    """Copy a numeric column into an array of the TransactionGraph's type without a Python-level loop"""
+    import numpy as np
+
+    result = array(typecode)
+    result.frombytes(np.ascontiguousarray(values, dtype=typecode).tobytes())
+    return result
+
+
+class _ChunkedView(Sequence):
+    """Read-only sequence over the record batches of a memory-mapped Arrow column"""
+
+    def __init__(self, views):
+        self.views = views
+        self.starts = [0]
+        for view in views:
+            self.starts.append(self.starts[-1] + len(view))
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return list(islice(iter(self), start, stop, step))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        chunk = bisect_right(self.starts, index) - 1
+        return self.views[chunk][index - self.starts[chunk]]
+
+    def __iter__(self):
+        return chain.from_iterable(self.views)
+
+
+# memoryview formats of the Arrow column types a graph export uses
+_ARROW_FORMATS = {'uint8': 'B', 'uint16': 'H', 'uint32': 'I', 'uint64': 'Q', 'int64': 'q'}
+
+
+def _mapped(typecode, column):
+    """Zero-copy, read-only view of a numeric Arrow column backed by a memory-mapped file"""
+    views = []
+    for chunk in column.chunks:
+        if chunk.null_count:
+            raise ValueError(f"column of type {chunk.type} has missing values")
+        data = memoryview(chunk.buffers()[1]).cast(_ARROW_FORMATS[str(chunk.type)])
+        views.append(data[chunk.offset:chunk.offset + len(chunk)])
+    if not views:
+        return array(typecode)
+    return views[0] if len(views) == 1 else _ChunkedView(views)
+
+
+def _from_tables(nodes, edges, metadata, column=_typed):
+    """Build a TransactionGraph from node and edge columns
+
+    `column(typecode, values)` turns each numeric column into the graph's
+    storage: _typed copies lists and numpy arrays into arrays, _mapped wraps
+    memory-mapped Arrow columns without copying them.
+    """
+    graph = TransactionGraph(metadata['currency'], metadata['decimals'])
+    for currency, decimals in metadata['assets'][1:]:
+        graph.asset(currency, decimals)
+    graph.keys = list(nodes['key'])
+    graph.ids = {key: index + 1 for index, key in enumerate(graph.keys)}
+    graph.kinds = column('B', nodes['kind'])
+    graph.roles = column('B', nodes['role'])
+    graph.blocks = column('q', nodes['block'])
+    graph.times = column('q', nodes['time'])
+    graph.node_assets = column('H', nodes['asset'])
+    graph.cluster_sizes = {index + 1: int(members) for index, members in enumerate(column('L', nodes['members']))
+                           if members}
+    graph.sources = column('L', edges['source'])
+    graph.targets = column('L', edges['target'])
+    graph.values_lo = column('Q', edges['value_lo'])
+    graph.values_hi = column('Q', edges['value_hi'])
+    graph.edge_times = column('q', edges['time'])
+    graph.wide_values = {int(edge): int(value) for edge, value in metadata.get('wide_values', {}).items()}
+    if graph.edge_count and max(max(graph.sources), max(graph.targets)) > len(graph):
+        raise ValueError("edges refer to nodes missing from the node table")
+    return graph
+
+
+def _columns(table, names):
+    return {name: table.column(name).to_numpy(zero_copy_only=False) for name in names}
+
+
+NODE_COLUMNS = ('key', 'kind', 'role', 'block', 'time', 'asset', 'members')
+EDGE_COLUMNS = ('source', 'target', 'value_lo', 'value_hi', 'time')
+
+
+def _load_columnar(path, ext):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if ext == '.arrow':
+        # Uncompressed Arrow IPC is used in place: the graph's numeric columns
+        # are views of the mapped files, paged in by the OS as they are read
+        nodes = pa.ipc.open_file(pa.memory_map(_nodes_path(path))).read_all()
+        edges = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        node_columns = {name: nodes.column(name) for name in NODE_COLUMNS}
+        edge_columns = {name: edges.column(name) for name in EDGE_COLUMNS}
+        column = _mapped
+    else:
+        nodes = pq.read_table(_nodes_path(path), columns=list(NODE_COLUMNS), memory_map=True)
+        edges = pq.read_table(path, columns=list(EDGE_COLUMNS), memory_map=True)
+        node_columns, edge_columns, column = _columns(nodes, NODE_COLUMNS), _columns(edges, EDGE_COLUMNS), _typed
+    metadata = json.loads((nodes.schema.metadata or {}).get(METADATA_KEY, b'null'))
+    if metadata is None:
+        raise ValueError(f"{_nodes_path(path)} holds no graph metadata")
+    node_columns['key'] = nodes.column('key').to_pylist()
+    return _from_tables(node_columns, edge_columns, metadata, column)
+
+
+def _load_jsonl(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    nodes = {name: [] for name in NODE_COLUMNS}
+    edges = {name: [] for name in EDGE_COLUMNS}
+    metadata = None
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['type'] == 'edge':
+                value = int(record['value'])
+                record['value_lo'], record['value_hi'] = _split_value(value)
+                for name in EDGE_COLUMNS:
+                    edges[name].append(record[name])
+            elif record['type'] == 'node':
+                for name in NODE_COLUMNS:
+                    nodes[name].append(record[name])
+            else:
+                metadata = record
+    if metadata is None:
+        raise ValueError(f"{path} is incomplete: the export did not finish")
+    return _from_tables(nodes, edges, metadata)
+
+
+def _load_graphml(path):
+    """Rebuild a graph from a GraphML export, streaming the elements instead of building a tree"""
+    namespace = '{http://graphml.graphdrawing.org/xmlns}'
+    nodes, edges = {}, {name: [] for name in EDGE_COLUMNS}
+    metadata = None
+    for _, element in iterparse(path):
+        tag = element.tag[len(namespace):] if element.tag.startswith(namespace) else element.tag
+        if tag not in ('node', 'edge', 'graph'):
+            continue
+        data = {child.get('key'): child.text or '' for child in element.findall(f'{namespace}data')}
+        if tag == 'edge':
+            value_lo, value_hi = _split_value(int(data['edge_value']))
+            edges['source'].append(int(element.get('source')[1:]))
+            edges['target'].append(int(element.get('target')[1:]))
+            edges['value_lo'].append(value_lo)
+            edges['value_hi'].append(value_hi)
+            edges['time'].append(int(data.get('edge_time', 0)))
+        elif tag == 'node':
+            nodes[int(element.get('id')[1:])] = {
+                'key': data['node_key'],
+                'kind': TRANSACTION if data.get('node_type') == 'transaction' else ADDRESS,
+                'role': ROLES.index(data.get('node_role', 'none')),
+                'block': int(data.get('node_block', -1)),
+                'time': int(data.get('node_time', 0)),
+                'asset': int(data.get('node_asset_id', 0)),
+                'members': int(data.get('node_members', 0)),
+            }
+        elif 'graph_metadata' in data:
+            metadata = json.loads(data['graph_metadata'])
+        element.clear()
+    if metadata is None:
+        raise ValueError(f"{path} holds no graph metadata: it is incomplete or was not written by --export")
+    if sorted(nodes) != list(range(1, len(nodes) + 1)):
+        raise ValueError(f"{path} does not number its nodes n1..n{len(nodes)}")
+    ordered = [nodes[node_id] for node_id in range(1, len(nodes) + 1)]
+    return _from_tables({name: [node[name] for node in ordered] for name in NODE_COLUMNS}, edges, metadata)
+
+
+def load_graph(path):
+    """Load a graph exported to Arrow, Parquet, JSONL or GraphML, without any API access
+
+    An Arrow export is memory-mapped: the node and edge columns of the
+    returned graph are read-only views of the files, so only the node keys
+    (needed to look nodes up by identifier) are read into memory, and the
+    graph cannot be extended. The other formats are compressed or text, so
+    they are decoded into a regular in-memory TransactionGraph.
+    """
+    ext = _format(path)
+    with get_metrics().stage('load'):
+        if ext in ('.arrow', '.parquet'):
+            return _load_columnar(path, ext)
+        if ext in ('.jsonl', '.jsonl.gz'):
+            return _load_jsonl(path)
+        if ext == '.graphml':
+            return _load_graphml(path)
+    raise ValueError(f"cannot load {path}: use an .arrow, .parquet, .jsonl, .jsonl.gz or .graphml export")
+
+
+def add_export_arguments(parser):
+    """Register the graph export option"""
+    parser.add_argument('--export', action='append', default=[], metavar='PATH',
+                        help='Stream the graph to PATH while it is built; the format follows the extension '
+                             '(.parquet, .arrow, .graphml, .jsonl, .jsonl.gz). Can be repeated.')
+
+
+def exporters_from_args(args, graph, parser):
+    """Attach the exporters selected on the command line to a graph"""
+    exporters = []
+    for path in args.export:
+        try:
+            exporters.append(exporter_for(path))
+        except ValueError as e:
+            parser.error(str(e))
+    return [exporter.attach(graph) for exporter in exporters]
+
+
+def main(argv=None):
+    """Graph loading entry point (`crypto_tracker_v3.py load`)"""
+    parser = argparse.ArgumentParser(prog='crypto_tracker_v3.py load',
+                                     description='Re-render, cluster or convert a graph saved with --export, '
+                                                 'without any API access')
+    parser.add_argument('graph', help='Graph exported as .arrow, .parquet, .jsonl, .jsonl.gz or .graphml')
+    parser.add_argument('--no-render', action='store_true',
+                        help='Print the graph as JSON on stdout instead of writing transaction_graph.html')
+    parser.add_argument('--export', action='append', default=[], metavar='PATH',
+                        help='Write the loaded (and clustered) graph to another format. Can be repeated.')
+    add_label_arguments(parser)
+    add_render_arguments(parser)
+    add_cluster_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+
+    metrics = metrics_from_args(args)
+    labels = labels_from_args(args)
+    started = time.monotonic()
+    try:
+        graph = load_graph(args.graph)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    print(f"[+] Loaded {len(graph):,} nodes and {graph.edge_count:,} edges in {time.monotonic() - started:.2f}s",
+          file=sys.stderr)
+
+    clusters = clusters_from_args(args, graph)
+    if clusters:
+        with metrics.stage('cluster_collapse'):
+            graph = collapse_clusters(graph, clusters, labels)
+    for path in args.export:
+        try:
+            export_graph(graph, path, labels)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"[+] Graph written to {path}", file=sys.stderr)
+
+    if args.no_render:
+        json.dump({'graph': graph.to_dict(labels)}, sys.stdout)
+        print()
+    elif not args.export:
+        # Imported here: crypto_tracker_v3 imports this module for its --export option
+        from crypto_tracker_v3 import Visualizer
+
+        print("\n[+] Generated Node Legend:")
+        for item in graph.legend:
+            print(f"Node {item['id']}: {item['label']} ({item['type']})")
+        with metrics.stage('render'):
+            Visualizer.plot_interactive(graph, graph.legend, labels, args.large_graph_threshold, args.leaf_threshold)
+    report_metrics(args)
+
+
+if __name__ == '__main__':
+    main()
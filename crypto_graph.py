@@ -0,0 +1,278 @@
+from array import array
+from collections.abc import Sequence
+from datetime import datetime, timezone
+
+from crypto_labels import DEFAULT_LABEL_COLOR, LABEL_COLORS, get_label_index
+
+ADDRESS, TRANSACTION = 0, 1
+NODE_TYPES = ('address', 'transaction')
+
+# Address roles used when picking node colors at render time
+ROLE_NONE, ROLE_ROOT, ROLE_EXPANDED = 0, 1, 2
+
+_LOW_MASK = (1 << 64) - 1
+_WIDE_MASK = (1 << 128) - 1
+# Edges added between two calls to the graph's listeners
+LISTENER_CHUNK = 50000
+
+
+def format_time(timestamp):
+    """Render a unix timestamp for tooltips"""
+    if not timestamp:
+        return "Unknown"
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+
+
+class Legend(Sequence):
+    """Read-only view of the node legend, generated on access"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.graph.keys)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        identifier = self.graph.keys[index]
+        return {
+            'id': index + 1,
+            'label': f"{index + 1}: {identifier[:6]}...{identifier[-4:]}",
+            'identifier': identifier,
+            'type': 'cluster' if index + 1 in self.graph.cluster_sizes else NODE_TYPES[self.graph.kinds[index]],
+        }
+
+
+class TransactionGraph:
+    """Directed address -> transaction -> address graph stored in typed arrays
+
+    Addresses and transaction hashes are interned to consecutive integer node
+    IDs starting at 1. Nodes keep only their kind, role, block and timestamp;
+    edges are parallel arrays of source, target, value in base units (wei or
+    satoshi, split into two unsigned 64-bit halves so wei amounts stay exact)
+    and timestamp. The rare uint256 token amounts that do not fit in 128 bits
+    are kept whole in `wide_values`, keyed by edge index. Transaction nodes also carry the index of the asset they
+    move (0 is the native `currency`; tokens are added with asset()), which
+    sets the units of their edges. `cluster_sizes` counts the addresses merged
+    into a node when address clusters were collapsed. Tooltips, colors and
+    the legend are generated only when the graph is rendered or exported.
+
+    Objects in `listeners` have on_edges(graph, start, stop) called each time
+    another LISTENER_CHUNK edges were added, so exporters can stream a graph
+    to disk while it is being built.
+    """
+
+    def __init__(self, currency='ETH', decimals=18):
+        self.currency = currency
+        self.decimals = decimals
+        self.assets = [(currency, decimals)]
+        self._asset_ids = {(currency, decimals): 0}
+        self.ids = {}
+        self.keys = []
+        self.kinds = array('B')
+        self.roles = array('B')
+        self.node_assets = array('H')
+        self.blocks = array('q')
+        self.times = array('q')
+        self.sources = array('L')
+        self.targets = array('L')
+        self.values_lo = array('Q')
+        self.values_hi = array('Q')
+        self.edge_times = array('q')
+        self.wide_values = {}
+        self.cluster_sizes = {}
+        self.legend = Legend(self)
+        self.listeners = []
+        self._notified = 0
+
+    def __contains__(self, identifier):
+        return identifier in self.ids
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def edge_count(self):
+        return len(self.sources)
+
+    def asset(self, currency, decimals):
+        """Return the index of an asset, registering it on first use"""
+        key = (currency, int(decimals))
+        index = self._asset_ids.get(key)
+        if index is None:
+            index = self._asset_ids[key] = len(self.assets)
+            self.assets.append(key)
+        return index
+
+    def node_id(self, identifier, kind=ADDRESS, block=-1, timestamp=0, asset=0):
+        """Return the node ID for an identifier, assigning the next one if it is new"""
+        node_id = self.ids.get(identifier)
+        if node_id is None:
+            self.keys.append(identifier)
+            node_id = self.ids[identifier] = len(self.keys)
+            self.kinds.append(kind)
+            self.roles.append(ROLE_NONE)
+            self.blocks.append(block)
+            self.times.append(timestamp)
+            self.node_assets.append(asset)
+        return node_id
+
+    def add_address(self, address):
+        return self.node_id(address, ADDRESS)
+
+    def add_transaction(self, tx_hash, block=-1, timestamp=0, asset=0):
+        return self.node_id(tx_hash, TRANSACTION, block, timestamp, asset)
+
+    def mark(self, node_id, role):
+        """Record that an address is the crawl root or has been expanded"""
+        if role > self.roles[node_id - 1]:
+            self.roles[node_id - 1] = role
+
+    def add_edge(self, source, target, value=0, timestamp=0):
+        value = int(value)
+        if value >> 128:
+            self.wide_values[len(self.sources)] = value
+            value &= _WIDE_MASK
+        self.sources.append(source)
+        self.targets.append(target)
+        self.values_lo.append(value & _LOW_MASK)
+        self.values_hi.append(value >> 64)
+        self.edge_times.append(timestamp)
+        if self.listeners and len(self.sources) - self._notified >= LISTENER_CHUNK:
+            self.notify()
+
+    def notify(self):
+        """Hand the edges added since the last call to every listener"""
+        start, self._notified = self._notified, len(self.sources)
+        for listener in self.listeners:
+            listener.on_edges(self, start, self._notified)
+
+    def value(self, edge):
+        """Exact value of an edge in base units"""
+        if self.wide_values and edge in self.wide_values:
+            return self.wide_values[edge]
+        return self.values_hi[edge] << 64 | self.values_lo[edge]
+
+    def amount(self, value, asset=0):
+        """Convert base units of an asset to display units"""
+        return value / 10 ** self.assets[asset][1]
+
+    def symbol(self, asset=0):
+        return self.assets[asset][0]
+
+    def edge_asset(self, source, target):
+        """Asset of an edge: the one moved by its transaction end"""
+        return self.node_assets[(source if self.kinds[source - 1] == TRANSACTION else target) - 1]
+
+    def merged_edges(self):
+        """Yield (source, target, value, timestamp), summing parallel edges"""
+        merged = {}
+        for edge in range(self.edge_count):
+            key = (self.sources[edge], self.targets[edge])
+            value, timestamp = merged.get(key, (0, 0))
+            merged[key] = (value + self.value(edge), max(timestamp, self.edge_times[edge]))
+        for (source, target), (value, timestamp) in merged.items():
+            yield source, target, value, timestamp
+
+    def node_attrs(self, labels=None):
+        """Yield (node_id, display attributes) for every node"""
+        labels = labels or get_label_index()
+        tx_values = {}
+        for edge in range(self.edge_count):
+            if self.kinds[self.sources[edge] - 1] == TRANSACTION:
+                tx_values[self.sources[edge]] = tx_values.get(self.sources[edge], 0) + self.value(edge)
+        for index, identifier in enumerate(self.keys):
+            node_id = index + 1
+            if self.kinds[index] == TRANSACTION:
+                block = self.blocks[index]
+                asset = self.node_assets[index]
+                yield node_id, {
+                    'label': str(node_id),
+                    'title': (f"TX: {identifier}\n"
+                              f"Value: {self.amount(tx_values.get(node_id, 0), asset):.4f} {self.symbol(asset)}\n"
+                              f"Time: {format_time(self.times[index])}\n"
+                              f"Block: {block if block >= 0 else 'N/A'}"),
+                    'color': 'yellow',
+                    'shape': 'box',
+                    'size': 25,
+                }
+                continue
+            root = self.roles[index] == ROLE_ROOT
+            attrs = {
+                'label': str(node_id),
+                'title': f"Address: {identifier}",
+                'color': 'red' if root else 'blue',
+                'size': 30 if root else 25,
+            }
+            members = self.cluster_sizes.get(node_id)
+            if members:
+                attrs['title'] = f"Cluster of {members} addresses including {identifier}"
+                attrs['shape'] = 'diamond'
+                attrs['size'] = 35
+            label = labels.lookup(identifier)
+            if label:
+                category, entity = label
+                attrs['title'] += f"\n{entity} ({category})"
+                if not root:
+                    attrs['color'] = LABEL_COLORS.get(category, DEFAULT_LABEL_COLOR)
+            yield node_id, attrs
+
+    def edge_attrs(self):
+        """Yield (source, target, display attributes) for every merged edge"""
+        for source, target, value, timestamp in self.merged_edges():
+            asset = self.edge_asset(source, target)
+            amount = self.amount(value, asset)
+            symbol = self.symbol(asset)
+            outgoing = self.kinds[source - 1] == TRANSACTION
+            counterparty = self.keys[(target if outgoing else source) - 1]
+            yield source, target, {
+                'label': f"{amount:.4f} {symbol}",
+                'value': amount,
+                'color': '#00FF00' if outgoing else '#FF0000',
+                'title': f"{'To' if outgoing else 'From'}: {counterparty}\nAmount: {amount:.4f} {symbol}",
+            }
+
+    def to_dict(self, labels=None):
+        """Export nodes and (unmerged) edges as plain JSON-serializable data
+
+        Edge values are decimal strings in base units so wei amounts stay exact;
+        `amount` is the same value in display units of the edge's asset.
+        """
+        labels = labels or get_label_index()
+        nodes = []
+        for index, identifier in enumerate(self.keys):
+            node_id = index + 1
+            node = {'id': node_id, 'key': identifier, 'type': self.legend[index]['type']}
+            if self.kinds[index] == TRANSACTION:
+                block = self.blocks[index]
+                node.update(block=block if block >= 0 else None, time=self.times[index] or None,
+                            asset=self.symbol(self.node_assets[index]))
+            else:
+                node['role'] = ('none', 'root', 'expanded')[self.roles[index]]
+                if node_id in self.cluster_sizes:
+                    node['members'] = self.cluster_sizes[node_id]
+                label = labels.lookup(identifier)
+                if label:
+                    node['category'], node['entity'] = label
+            nodes.append(node)
+        edges = []
+        for edge in range(self.edge_count):
+            source, target = self.sources[edge], self.targets[edge]
+            asset = self.edge_asset(source, target)
+            value = self.value(edge)
+            edges.append({'source': source, 'target': target, 'value': str(value),
+                          'amount': self.amount(value, asset), 'asset': self.symbol(asset),
+                          'time': self.edge_times[edge] or None})
+        return {'nodes': nodes, 'edges': edges}
+
+    def to_networkx(self, labels=None):
+        """Export to a networkx DiGraph carrying the display attributes"""
+        import networkx as nx
+
+        G = nx.DiGraph()
+        G.add_nodes_from(self.node_attrs(labels))
+        G.add_edges_from(self.edge_attrs())
+        return G
@@ -0,0 +1,216 @@
+import argparse
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from crypto_metrics import get_metrics
+
+# Requests per second allowed by the free tiers of each provider
+DEFAULT_RATES = {
+    'etherscan': 5.0,
+    'blockcypher': 3.0,
+    'rpc': 50.0,
+}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Base URL of each provider; override with --api-url to point at a mirror or the offline stub
+API_URLS = {
+    'etherscan': 'https://api.etherscan.io/api',
+    'blockcypher': 'https://api.blockcypher.com/v1/btc/main',
+    'rpc': 'http://127.0.0.1:8545',
+}
+
+
+class RateLimitError(Exception):
+    """Raised when a provider keeps throttling after all retries are used"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket that backs off when the provider throttles us
+
+    The fill rate drops by a third every time a rate limit is hit and recovers
+    gradually on success, so a crawl settles just under what the provider accepts
+    instead of repeatedly tripping the limit.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.max_rate / 10, self.rate * 2 / 3)
+            self.tokens = 0
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def _is_rate_limited(data):
+    """Detect Etherscan's HTTP 200 "Max rate limit reached" responses"""
+    if not isinstance(data, dict) or data.get('status') != '0':
+        return False
+    return 'rate limit' in str(data.get('result', '')).lower()
+
+
+class HttpClient:
+    """Pooled HTTP client with per-provider rate limiting and retry/backoff"""
+
+    def __init__(self, rates=None, max_retries=5, backoff=0.5, pool_size=16, timeout=30, urls=None):
+        if max_retries < 0:
+            raise ValueError(f"max_retries must not be negative, got {max_retries}")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(DEFAULT_RATES), pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.buckets = {name: TokenBucket(rate) for name, rate in {**DEFAULT_RATES, **(rates or {})}.items()}
+        self.urls = {**API_URLS, **(urls or {})}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def _sleep(self, attempt, retry_after=None):
+        """Exponential backoff with full jitter, honouring Retry-After when given"""
+        delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        time.sleep(delay)
+
+    def get_json(self, provider, url, params=None):
+        """GET a JSON document, retrying throttled, failed and 5xx responses"""
+        return self._request_json('GET', provider, url, params=params)
+
+    def post_json(self, provider, url, payload):
+        """POST a JSON payload (e.g. a JSON-RPC batch) with the same retry handling"""
+        return self._request_json('POST', provider, url, json=payload)
+
+    def _request_json(self, method, provider, url, **kwargs):
+        bucket = self.buckets[provider]
+        metrics = get_metrics()
+        error = retry_after = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Back off between attempts only, never after the last one
+                self._sleep(attempt - 1, retry_after)
+                retry_after = None
+                metrics.count('api_retries', provider=provider)
+            with metrics.stage('rate_limit_wait'):
+                bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.count('api_errors', provider=provider, reason='connection')
+                error = e
+                continue
+            elapsed = time.perf_counter() - started
+            metrics.add_time('http', elapsed)
+            metrics.observe('api_latency_seconds', elapsed, provider=provider)
+            metrics.count('api_requests', provider=provider, status=response.status_code)
+            metrics.count('api_bytes', len(response.content), provider=provider)
+            if response.status_code in RETRY_STATUS:
+                if response.status_code == 429:
+                    metrics.count('api_throttled', provider=provider)
+                    bucket.throttled()
+                error = RateLimitError(f"{provider} returned HTTP {response.status_code}")
+                retry_after = response.headers.get('Retry-After')
+                continue
+            response.raise_for_status()
+            with metrics.stage('json_decode'):
+                data = response.json()
+            if _is_rate_limited(data):
+                metrics.count('api_throttled', provider=provider)
+                bucket.throttled()
+                error = RateLimitError(f"{provider}: {data['result']}")
+                continue
+            bucket.succeeded()
+            return data
+        raise error
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """Return the process-wide client shared by callers that don't pass their own"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
+
+
+def parse_rate(value):
+    """argparse type for PROVIDER=RATE options, shared with the stub server's --rate-limit"""
+    provider, _, rate = value.partition('=')
+    if provider not in DEFAULT_RATES or not rate:
+        raise argparse.ArgumentTypeError(f"expected PROVIDER=RATE with PROVIDER in {sorted(DEFAULT_RATES)}")
+    try:
+        rate = float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate {rate!r} for {provider}")
+    if not rate > 0:
+        raise argparse.ArgumentTypeError(f"the rate for {provider} must be above 0, got {rate:g}")
+    return provider, rate
+
+
+def _parse_retries(value):
+    try:
+        retries = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid retry count {value!r}")
+    if retries < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative, got {retries}")
+    return retries
+
+
+def _parse_url(value):
+    provider, _, url = value.partition('=')
+    if provider not in API_URLS or not url:
+        raise argparse.ArgumentTypeError(f"expected PROVIDER=URL with PROVIDER in {sorted(API_URLS)}")
+    if not url.startswith(('http://', 'https://')):
+        raise argparse.ArgumentTypeError(f"invalid URL {url!r} for {provider}: expected http:// or https://")
+    return provider, url.rstrip('/')
+
+
+def add_http_arguments(parser):
+    """Register the rate limit, retry and endpoint options shared by both entry points"""
+    parser.add_argument('--rate-limit', action='append', type=parse_rate, default=[],
+                        metavar='PROVIDER=RATE',
+                        help='Requests per second for a provider, e.g. etherscan=5 (repeatable)')
+    parser.add_argument('--max-retries', type=_parse_retries, default=5,
+                        help='Retries for throttled or failed API requests')
+    parser.add_argument('--api-url', action='append', type=_parse_url, default=[], metavar='PROVIDER=URL',
+                        help='Base URL for a provider, e.g. etherscan=http://127.0.0.1:8545/api (repeatable)')
+
+
+def http_from_args(args, pool_size=16):
+    """Build the HTTP client selected on the command line"""
+    return HttpClient(rates=dict(args.rate_limit), max_retries=args.max_retries, pool_size=pool_size,
+                      urls=dict(args.api_url))
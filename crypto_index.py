@@ -0,0 +1,226 @@
+import json
+import os
+import sqlite3
+import threading
+
+from crypto_metrics import get_metrics
+
+
+def _postings(tx):
+    """(address, direction, value, counterparty) entries of a BlockCypher-style transaction
+
+    Each address gets at most one posting per direction, carrying its own
+    inputs (out) or outputs (in), so a transaction with many inputs and
+    outputs costs one row per address rather than one per address pair. The
+    counterparty is the one address on the other side, or None when there
+    are several and they have to be read from the stored transaction.
+    """
+    totals = {}
+    sides = {}
+    for side, direction, key in (('inputs', 'out', 'output_value'), ('outputs', 'in', 'value')):
+        sides[direction] = []
+        for entry in tx.get(side, []):
+            for address in entry.get('addresses') or []:
+                totals[address, direction] = totals.get((address, direction), 0) + entry.get(key, 0)
+                if address not in sides[direction]:
+                    sides[direction].append(address)
+    for (address, direction), value in totals.items():
+        others = sides['in' if direction == 'out' else 'out']
+        if len(others) > 1:
+            others = [other for other in others if other != address]
+        yield address, direction, value, others[0] if len(others) == 1 else None
+
+
+class AddressIndex:
+    """SQLite address → transaction postings for ingested block ranges
+
+    Every transaction is stored once, and each address it touches gets one
+    posting per direction with the value it sent or received and its
+    counterparty, keyed by address and block. Transactions with several
+    addresses on the other side leave the counterparty empty rather than
+    adding a posting per pair; they are read from the stored transaction.
+    A lookup is then one index range scan no matter how many addresses the
+    range holds. Ranges can be appended incrementally; re-ingesting
+    overlapping blocks is harmless.
+    """
+
+    def __init__(self, path, chain=None):
+        """Open (or create) the index at path; `chain` is recorded on first use and checked afterwards"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ranges (
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS transactions (
+                hash TEXT PRIMARY KEY,
+                block INTEGER NOT NULL,
+                tx TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                address TEXT NOT NULL,
+                block INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                direction TEXT NOT NULL,
+                value TEXT NOT NULL,
+                counterparty TEXT,
+                PRIMARY KEY (address, block, hash, direction)
+            ) WITHOUT ROWID;
+        """)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'chain'").fetchone()
+        if row is None and chain:
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('chain', ?)", (chain,))
+        elif row and chain and row[0] != chain:
+            raise ValueError(f"{path} indexes {row[0]} transactions, not {chain}")
+        self._conn.commit()
+        self.chain = row[0] if row else chain or 'eth'
+
+    def _normalize(self, address):
+        return address.lower() if self.chain == 'eth' else address
+
+    def _posting_rows(self, txs):
+        return [(self._normalize(address), int(tx['block_height']), tx['hash'], direction, str(value),
+                 counterparty and self._normalize(counterparty))
+                for tx in txs for address, direction, value, counterparty in _postings(tx)]
+
+    def add(self, txs):
+        """Store confirmed BlockCypher-style transactions and their postings, returning how many were new"""
+        txs = [tx for tx in txs if tx.get('block_height') is not None and int(tx['block_height']) >= 0]
+        tx_rows = [(tx['hash'], int(tx['block_height']), json.dumps(tx)) for tx in txs]
+        posting_rows = self._posting_rows(txs)
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany('INSERT OR IGNORE INTO transactions (hash, block, tx) VALUES (?, ?, ?)', tx_rows)
+            added = self._conn.total_changes - before
+            self._conn.executemany("""
+                INSERT OR IGNORE INTO postings (address, block, hash, direction, value, counterparty)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, posting_rows)
+            self._conn.commit()
+        get_metrics().count('index_rows_written', added)
+        return added
+
+    def add_range(self, start, end):
+        """Record that blocks start..end were ingested, merging touching ranges"""
+        with self._lock:
+            ranges = self._conn.execute('SELECT start, end FROM ranges').fetchall() + [(start, end)]
+            merged = []
+            for first, last in sorted(ranges):
+                if merged and first <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], last)
+                else:
+                    merged.append([first, last])
+            self._conn.execute('DELETE FROM ranges')
+            self._conn.executemany('INSERT INTO ranges (start, end) VALUES (?, ?)', merged)
+            self._conn.commit()
+
+    def ranges(self):
+        """Ingested block ranges as sorted (start, end) pairs"""
+        with self._lock:
+            return self._conn.execute('SELECT start, end FROM ranges ORDER BY start').fetchall()
+
+    def last_block(self):
+        """Highest ingested block, or None for an empty index"""
+        ranges = self.ranges()
+        return ranges[-1][1] if ranges else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'chain': self.chain,
+                'transactions': self._conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0],
+                'postings': self._conn.execute('SELECT COUNT(*) FROM postings').fetchone()[0],
+                'ranges': self._conn.execute('SELECT start, end FROM ranges ORDER BY start').fetchall(),
+            }
+
+    def postings(self, address, after=None):
+        """An address's postings in block order as (block, hash, direction, value, counterparty)
+
+        The counterparty is None where the transaction has several addresses on the other side.
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT block, hash, direction, value, counterparty FROM postings
+                WHERE address = ? AND block > ? ORDER BY block, hash, direction
+            """, (self._normalize(address), -1 if after is None else after)).fetchall()
+        return [(block, tx_hash, direction, int(value), counterparty)
+                for block, tx_hash, direction, value, counterparty in rows]
+
+    def count(self, address):
+        """Number of indexed transactions touching an address"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(DISTINCT hash) FROM postings WHERE address = ?',
+                                      (self._normalize(address),)).fetchone()[0]
+
+    def transactions(self, address, after=None, descending=True):
+        """An address's transactions after block `after`, ordered by block"""
+        order = 'DESC' if descending else 'ASC'
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT tx FROM transactions WHERE hash IN (
+                    SELECT hash FROM postings WHERE address = ? AND block > ?
+                ) ORDER BY block {order}, hash
+            """, (self._normalize(address), -1 if after is None else after)).fetchall()
+        get_metrics().count('index_lookups')
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_batches(self, address, batch_size=1000):
+        """Yield an address's transactions in ascending block order, batch_size at a time"""
+        address = self._normalize(address)
+        block, tx_hash = -1, ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute("""
+                    SELECT t.block, t.hash, t.tx FROM transactions t
+                    WHERE t.hash IN (SELECT hash FROM postings WHERE address = ?)
+                      AND (t.block > ? OR (t.block = ? AND t.hash > ?))
+                    ORDER BY t.block, t.hash LIMIT ?
+                """, (address, block, block, tx_hash, batch_size)).fetchall()
+            if not rows:
+                return
+            yield [json.loads(row[2]) for row in rows]
+            block, tx_hash = rows[-1][0], rows[-1][1]
+
+    def scan(self, batch_size=10000):
+        """Yield every indexed transaction in ascending block order, batch_size at a time"""
+        block, tx_hash = -1, ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute("""
+                    SELECT block, hash, tx FROM transactions
+                    WHERE block > ? OR (block = ? AND hash > ?)
+                    ORDER BY block, hash LIMIT ?
+                """, (block, block, tx_hash, batch_size)).fetchall()
+            if not rows:
+                return
+            yield [json.loads(row[2]) for row in rows]
+            block, tx_hash = rows[-1][0], rows[-1][1]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def add_index_arguments(parser):
+    """Register the --index option shared by the entry points that can read an ingested index"""
+    parser.add_argument('--index', metavar='PATH',
+                        help="Answer lookups from an address index built by the 'ingest' subcommand "
+                             'instead of the API')
+
+
+def index_from_args(args):
+    """Open the index selected on the command line, or None when not given"""
+    if not args.index:
+        return None
+    if not os.path.exists(args.index):
+        raise SystemExit(f"Index {args.index} does not exist; build it with the 'ingest' subcommand")
+    return AddressIndex(args.index)
@@ -0,0 +1,176 @@
+import argparse
+import gzip
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from crypto_http import add_http_arguments, http_from_args
+from crypto_index import AddressIndex
+from crypto_metrics import add_metrics_arguments, get_metrics, metrics_from_args, report_metrics
+from crypto_providers import RPC_BATCH, RPC_WINDOW, JsonRpcProvider, etherscan_transaction, rpc_transactions
+
+DUMP_BATCH = 10000  # transactions written per index transaction when reading dumps
+
+
+def dump_transactions(record):
+    """Normalize one dump record: an RPC block, a BlockCypher transaction or an Etherscan txlist row"""
+    if 'transactions' in record:
+        return rpc_transactions(record)
+    if 'inputs' in record:
+        return [record]
+    if 'blockNumber' in record and 'from' in record:
+        return [etherscan_transaction(record)]
+    raise ValueError(f"unrecognized dump record with keys {sorted(record)[:5]}")
+
+
+def read_dump(path):
+    """Yield the records of a JSON lines dump, gzip-compressed when the name ends in .gz
+
+    Saved JSON-RPC replies are unwrapped to their result; empty results are skipped.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'jsonrpc' in record:
+                record = record.get('result')
+            if record:
+                yield record
+
+
+def ingest_dump(index, paths, from_block=None, to_block=None):
+    """Add the transactions of local dumps to the index, returning (new transactions, blocks covered)
+
+    Only whole blocks (RPC block records) mark their block as ingested; loose
+    transactions are indexed but say nothing about the rest of their block.
+    """
+    added, batch, covered = 0, [], set()
+    for path in paths:
+        for record in read_dump(path):
+            for tx in dump_transactions(record):
+                block = int(tx.get('block_height', -1))
+                if block < 0 or (from_block is not None and block < from_block) or \
+                        (to_block is not None and block > to_block):
+                    continue
+                batch.append(tx)
+                if len(batch) >= DUMP_BATCH:
+                    added += index.add(batch)
+                    batch = []
+            if 'transactions' in record:
+                number = int(record['number'], 16)
+                if (from_block is None or number >= from_block) and (to_block is None or number <= to_block):
+                    covered.add(number)
+    added += index.add(batch)
+    run = None
+    for number in sorted(covered):
+        if run and number == run[1] + 1:
+            run[1] = number
+            continue
+        if run:
+            index.add_range(*run)
+        run = [number, number]
+    if run:
+        index.add_range(*run)
+    return added, len(covered)
+
+
+def ingest_rpc(index, provider, start, end, concurrency=4):
+    """Fetch blocks start..end from a node and add them to the index
+
+    Blocks are requested in batches of provider.batch with `concurrency` batches
+    in flight, and each completed group is recorded as ingested, so an
+    interrupted run keeps its progress and the next run appends after it.
+    """
+    step = provider.batch * concurrency
+    added = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for group_start in range(start, end + 1, step):
+            group_end = min(group_start + step - 1, end)
+            numbers = list(range(group_start, group_end + 1))
+            chunks = [numbers[i:i + provider.batch] for i in range(0, len(numbers), provider.batch)]
+            txs = []
+            with get_metrics().stage('ingest_fetch'):
+                for blocks in pool.map(provider.get_blocks, chunks):
+                    for block in blocks:
+                        txs.extend(rpc_transactions(block))
+            with get_metrics().stage('ingest_write'):
+                added += index.add(txs)
+                index.add_range(group_start, group_end)
+            done = group_end - start + 1
+            rate = done / max(time.monotonic() - started, 1e-9)
+            print(f"[+] blocks {group_start}-{group_end}: {added:,} transactions so far "
+                  f"({rate:,.0f} blocks/s)", file=sys.stderr)
+    return added
+
+
+def main(argv=None):
+    """Bulk ingestion entry point (`crypto_tracker_v3.py ingest`)"""
+    parser = argparse.ArgumentParser(prog='crypto_tracker_v3.py ingest',
+                                     description='Pull a block range into a local address index that crawls '
+                                                 'and path searches can answer from with --index')
+    parser.add_argument('index', help='SQLite index file to create or append to')
+    parser.add_argument('--dump', action='append', default=[], metavar='FILE',
+                        help='Read a local JSON lines dump (.gz allowed) instead of the node: RPC blocks, '
+                             'BlockCypher transactions or Etherscan txlist rows (repeatable)')
+    parser.add_argument('--crypto', choices=['btc', 'eth'], default='eth',
+                        help='Chain of the dump (the node is always eth)')
+    parser.add_argument('--from-block', type=int,
+                        help=f'First block to ingest (default: after the last ingested block, or the last '
+                             f'{RPC_WINDOW} blocks for a new index)')
+    parser.add_argument('--to-block', type=int, help='Last block to ingest (default: the latest block)')
+    parser.add_argument('--rpc-batch', type=int, default=RPC_BATCH, help='Blocks requested per JSON-RPC batch')
+    parser.add_argument('--concurrency', type=int, default=4, help='JSON-RPC batches in flight')
+    add_http_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    metrics_from_args(args)
+    try:
+        index = AddressIndex(args.index, 'eth' if not args.dump else args.crypto)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.monotonic()
+    if args.dump:
+        added, covered = ingest_dump(index, args.dump, args.from_block, args.to_block)
+        print(f"[+] {covered:,} whole blocks in the dump", file=sys.stderr)
+    else:
+        http = http_from_args(args, pool_size=args.concurrency)
+        provider = JsonRpcProvider(http, batch=args.rpc_batch, concurrency=args.concurrency)
+        try:
+            latest = provider.latest_block()
+        except Exception as e:
+            print(f"JSON-RPC Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        end = latest if args.to_block is None else min(args.to_block, latest)
+        start = args.from_block
+        if start is None:
+            last = index.last_block()
+            start = max(0, end - RPC_WINDOW + 1) if last is None else last + 1
+        if start > end:
+            print(f"[+] Already up to date at block {end}", file=sys.stderr)
+            added = 0
+        else:
+            print(f"[+] Ingesting blocks {start}-{end} into {args.index}", file=sys.stderr)
+            try:
+                added = ingest_rpc(index, provider, start, end, args.concurrency)
+            except KeyboardInterrupt:
+                print("\n[!] Stopped; completed blocks are kept, re-run to continue", file=sys.stderr)
+                added = 0
+
+    stats = index.stats()
+    ranges = ', '.join(f'{first}-{last}' for first, last in stats['ranges']) or 'none'
+    print(f"[+] {added:,} new transactions in {time.monotonic() - started:.1f}s; the index holds "
+          f"{stats['transactions']:,} {stats['chain']} transactions and {stats['postings']:,} postings "
+          f"(blocks {ranges})", file=sys.stderr)
+    report_metrics(args)
+
+
+if __name__ == '__main__':
+    main()
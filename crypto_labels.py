@@ -0,0 +1,407 @@
+import argparse
+import csv
+import hashlib
+import json
+import math
+import mmap
+import struct
+import threading
+
+# Updated list of mixer addresses (verified as of 2025), grouped by entity
+MIXER_LABELS = {
+    "Tornado Cash": [
+        # Pools (Sanctioned)
+        "0x12D66f87A04A9E220743712cE6d9bB1B5616B8Fc",  # 0.1 ETH
+        "0x47CE0C6eD5B0Ce3d3A51fdb1C52DC66a7c3c2936",  # 1 ETH
+        "0x910Cbd523D972eb0a6f4cAe4618aD62622b39DbF",  # 10 ETH
+        "0xA160cdAB225685dA1d56aa342Ad8841c3b53f291",  # 100 ETH
+        "0x23773E65ed146A459791799d01336DB287f25334",  # DAI
+        "0x722122dF12D4e14e13Ac3b6895a86e84145b6967",  # USDC
+
+        # Additional sanctioned addresses
+        "0x8589427373D6D84E98730D7795D8f6f8731FDA16",
+        "0xDD4c48C0B24039969fC16D1cdF626eaB821d3384",
+        "0xd90e2f925DA726b50C4Ed8D0Fb90Ad053324F31b",
+        "0xd96f2B1c14Db8458374d9Aca76E26c3D18364307",
+        "0x4736dCf1b7A3d580672CcE6E7c65cd5cc9cFBa9D",
+        "0xD4B88Df4D29F5CedD6857912842cff3b20C8Cfa3",
+        "0xFD8610d20aA15b7B2E3Be39B396a1bC3516c7144",
+        "0xF60dD140cFf0706bAE9Cd734Ac3ae76AD9eBC32A",
+        "0x22aaA7720ddd5388A3c0A3333430953C68f1849b",
+        "0xBA214C1c1928a32Bffe790263E38B4Af9bFCD659",
+        "0xb1C8094B234DcE6e03f10a5b673c1d8C69739A00",
+        "0x527653eA119F3E6a1F5BD18fbF4714081D7B31ce",
+        "0x58E8dCC13BE9780fC42E8723D8EaD4CF46943dF2",
+        "0xD691F27f38B395864Ea86CfC7253969B409c362d",
+        "0xaEaaC358560e11f52454D997AAFF2c5731B6f8a6",
+        "0x1356c899D8C9467C7f71C195612F8A395aBf2f0a",
+        "0xA60C772958a3eD56c1F15dD055bA37AC8e523a0D",
+        "0x169AD27A470D064DEDE56a2D3ff727986b15D52B",
+        "0x0836222F2B2B24A3F36f98668Ed8F0B38D1a872f",
+        "0xF67721A2D8F736E75a49FdD7FAd2e31D8676542a",
+        "0x9AD122c22B14202B4490eDAf288FDb3C7cb3ff5E",
+        "0x905b63Fff465B9fFBF41DeA908CEb12478ec7601",
+        "0x07687e702b410Fa43f4cB4Af7FA097918ffD2730",
+        "0x94A1B5CdB22c43faab4AbEb5c74999895464Ddaf",
+        "0xb541fc07bC7619fD4062A54d96268525cBC6FfEF",
+        "0xD21be7248e0197Ee08E0c20D4a96DEBdaC3D20Af",
+        "0x610B717796ad172B316836AC95a2ffad065CeaB4",
+        "0x178169B423a011fff22B9e3F3abeA13414dDD0F1",
+        "0xbB93e510BbCD0B7beb5A853875f9eC60275CF498",
+        "0x2717c5e28cf931547B621a5dddb772Ab6A35B701",
+        "0x03893a7c7463AE47D46bc7f091665f1893656003",
+        "0xCa0840578f57fE71599D29375e16783424023357",
+    ],
+    "Blender.io": ["0x94Be88213a387E992Dd87DE56950a9aef34b9448"],  # Sanctioned
+    "ChipMixer": ["0x8576acc5c05d6ce88f4e49bf65bdf0c62f91353c"],
+    "Wasabi Wallet": ["0x538Ab2E4eF7C6aC90bC4684890927fBDF069A5A5"],
+}
+
+
+# Major exchange hot wallet addresses
+EXCHANGE_LABELS = {
+    "Binance": [
+        "0x3f5CE5FBFe3E9af3971dD833D26bA9b5C936f0bE",
+        "0x21a31Ee1afC51d94C2eFcCAa2092aD1028285549",
+        "0xBE0eB53F46cd790Cd13851d5EFf43D12404d33E8",
+    ],
+    "Coinbase": [
+        "0xA090e606E30bD747d4E6245a1517EbE430F0057e",
+        "0x4f3a120e72c76c22ae802d129f599bfdbc31cb81",
+        "0xfbb1b73c4f0bda4f67dca266ce6ef42f520fbb98",
+    ],
+    "Kraken": [
+        "0x2910543Af39abA0Cd09dBb2D50200b3E800A63D2",
+        "0x0d0707963952f2fBA59dD06f2b425ace40b492Fe",
+    ],
+    "OKX": [
+        "0x6cC5F688a315f3dC28A7781717a9A798a59fDA7b",
+        "0x236f9f97e0E62388479bf9E5BA2CA76A2F41fAb3",
+    ],
+    "Bitfinex": [
+        "0x742d35Cc6634C0532925a3b844Bc454e4438f44e",
+        "0x876EabF441B2EE5B5b0554Fd502a8E0600950cFa",
+    ],
+    "Huobi": [
+        "0xdc76cd25977e0a5ae17155770273ad58648900d3",
+        "0xadb2b42f6bd96f5c65920b9ac88619dce4166f94",
+    ],
+    "Crypto.com": [
+        "0x6262998Ced04146fA42253a5C0AF90CA02dfd2A3",
+        "0x46340b20830761efd32832a74d7169b29feb9758",
+    ],
+    "FTX (Bankruptcy Estate)": [
+        "0x2faf487a4414fe77e2327f0bf4ae2a264a776ad2",
+        "0xC098B2a3Aa256D2140208C3de6543aAEf5cd3A94",
+    ],
+}
+
+MIXER_ADDRESSES = [address for addresses in MIXER_LABELS.values() for address in addresses]
+EXCHANGE_ADDRESSES = [address for addresses in EXCHANGE_LABELS.values() for address in addresses]
+
+# Node colors used by the graph builders for labeled addresses
+LABEL_COLORS = {
+    "mixer": "purple",
+    "exchange": "orange",
+    "sanctioned": "black",
+    "scam": "brown",
+}
+DEFAULT_LABEL_COLOR = "gray"
+
+STORE_MAGIC = b"CTLABEL1"
+# magic, record count, bloom bits, bloom hash count, entity count, categories JSON length
+STORE_HEADER = struct.Struct(">8sQQIQI")
+# 20-byte address key, category index, entity index
+STORE_RECORD = struct.Struct(">20sBI")
+KEY_SIZE = 20
+
+
+def normalize_address(address):
+    """Normalize an address for lookups (hex and bech32 addresses are case-insensitive)"""
+    address = address.strip()
+    if address[:2].lower() in ("0x", "bc", "tb"):
+        return address.lower()
+    return address
+
+
+def address_key(address):
+    """Map an address to a fixed 20-byte key (raw bytes for EVM, a digest otherwise)"""
+    address = normalize_address(address)
+    if len(address) == 42 and address.startswith("0x"):
+        try:
+            return bytes.fromhex(address[2:])
+        except ValueError:
+            pass
+    return hashlib.blake2b(address.encode(), digest_size=KEY_SIZE).digest()
+
+
+def _bloom_positions(key, bits, hashes):
+    digest = hashlib.blake2b(key, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:], "big") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class LabelStore:
+    """Read-only label file: a Bloom filter in front of sorted, memory-mapped keys
+
+    Only the header and category names are read into memory; membership tests
+    touch the Bloom filter and a binary search over the mapped records, and
+    entity names are decoded on demand.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, self.bloom_bits, self.bloom_hashes, entity_count, categories_len = \
+            STORE_HEADER.unpack_from(self._mm, 0)
+        if magic != STORE_MAGIC:
+            raise ValueError(f"{path} is not a label store")
+        offset = STORE_HEADER.size
+        self.categories = json.loads(self._mm[offset:offset + categories_len].decode())
+        offset += categories_len
+        self._bloom = offset
+        offset += (self.bloom_bits + 7) // 8
+        self._records = offset
+        offset += self.size * STORE_RECORD.size
+        self._entity_offsets = offset
+        self._entity_count = entity_count
+        self._entity_blob = offset + (entity_count + 1) * 8
+
+    def __len__(self):
+        return self.size
+
+    def _maybe_contains(self, key):
+        for position in _bloom_positions(key, self.bloom_bits, self.bloom_hashes):
+            if not self._mm[self._bloom + position // 8] & (1 << (position % 8)):
+                return False
+        return True
+
+    def _entity(self, index):
+        start, end = struct.unpack_from(">QQ", self._mm, self._entity_offsets + index * 8)
+        return self._mm[self._entity_blob + start:self._entity_blob + end].decode()
+
+    def lookup(self, address):
+        """Return (category, entity) for an address, or None if it is not in the store"""
+        key = address_key(address)
+        if not self._maybe_contains(key):
+            return None
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._records + mid * STORE_RECORD.size
+            probe = self._mm[offset:offset + KEY_SIZE]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                _, category, entity = STORE_RECORD.unpack_from(self._mm, offset)
+                return self.categories[category], self._entity(entity)
+        return None
+
+    def __contains__(self, address):
+        return self.lookup(address) is not None
+
+    def close(self):
+        self._mm.close()
+
+
+def read_label_file(path):
+    """Yield (address, category, entity) rows from a CSV or JSONL label file
+
+    Rows need an `address` and a `category`; the entity is read from `entity`,
+    `name` or `label`, whichever is present.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            address = (row.get("address") or "").strip()
+            if not address:
+                continue
+            category = (row.get("category") or "unknown").strip().lower()
+            entity = row.get("entity") or row.get("name") or row.get("label") or ""
+            yield address, category, entity.strip()
+
+
+def build_label_store(sources, path, false_positive_rate=0.01):
+    """Build a label store from CSV/JSONL files; later files override earlier ones"""
+    categories, entities = {}, {}
+    records = []
+    for source in sources:
+        for address, category, entity in read_label_file(source):
+            category_id = categories.setdefault(category, len(categories))
+            if category_id > 255:
+                raise ValueError("label stores support at most 256 categories")
+            entity_id = entities.setdefault(entity, len(entities))
+            records.append(STORE_RECORD.pack(address_key(address), category_id, entity_id))
+
+    # Stable sort by key, keeping the last label seen for duplicate addresses
+    records.sort(key=lambda record: record[:KEY_SIZE])
+    records = [record for i, record in enumerate(records)
+               if i + 1 == len(records) or records[i + 1][:KEY_SIZE] != record[:KEY_SIZE]]
+
+    count = max(1, len(records))
+    bloom_bits = max(8, math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2))
+    bloom_hashes = max(1, round(bloom_bits / count * math.log(2)))
+    bloom = bytearray((bloom_bits + 7) // 8)
+    for record in records:
+        for position in _bloom_positions(record[:KEY_SIZE], bloom_bits, bloom_hashes):
+            bloom[position // 8] |= 1 << (position % 8)
+
+    category_json = json.dumps(list(categories)).encode()
+    with open(path, "wb") as f:
+        f.write(STORE_HEADER.pack(STORE_MAGIC, len(records), bloom_bits, bloom_hashes,
+                                  len(entities), len(category_json)))
+        f.write(category_json)
+        f.write(bloom)
+        f.writelines(records)
+        encoded = [entity.encode() for entity in entities]
+        offset = 0
+        for value in encoded:
+            f.write(struct.pack(">Q", offset))
+            offset += len(value)
+        f.write(struct.pack(">Q", offset))
+        f.writelines(encoded)
+    return len(records)
+
+
+class LabelIndex:
+    """Hash index from normalized address to its (category, entity) label
+
+    Label stores attached with `attach` are consulted after the in-memory
+    labels, so million-entry watchlists never have to be loaded into Python.
+    """
+
+    def __init__(self, labels=()):
+        self.categories = {}
+        self.entities = {}
+        self.stores = []
+        for address, category, entity in labels:
+            self.add(address, category, entity)
+
+    def add(self, address, category, entity):
+        address = normalize_address(address)
+        self.categories[address] = category
+        self.entities[address] = entity
+
+    def attach(self, store):
+        self.stores.append(store)
+
+    def __len__(self):
+        return len(self.categories) + sum(len(store) for store in self.stores)
+
+    def __contains__(self, address):
+        return self.lookup(address) is not None
+
+    def lookup(self, address):
+        """Return (category, entity) for an address, or None if it is not labeled"""
+        address = normalize_address(address)
+        category = self.categories.get(address)
+        if category is not None:
+            return category, self.entities[address]
+        for store in self.stores:
+            label = store.lookup(address)
+            if label:
+                return label
+        return None
+
+    def _labels_for(self, addresses):
+        """Resolve a set of addresses into category and entity maps"""
+        if not self.stores:
+            return self.categories, self.entities
+        categories, entities = {}, {}
+        for address in addresses:
+            label = self.lookup(address)
+            if label:
+                categories[address], entities[address] = label
+        return categories, entities
+
+    def classify(self, df, address):
+        """Label both sides of every transaction in a frame of lowercased addresses
+
+        Adds `from_category`/`to_category` for the two endpoints, `direction`
+        (in/out/self) relative to `address`, the `counterparty` and its `entity`,
+        and a `risk_category` (the counterparty's category, or regular).
+        """
+        address = normalize_address(address)
+        categories, entities = self._labels_for(set(df["from"]) | set(df["to"]))
+        outgoing = df["from"] == address
+        incoming = df["to"] == address
+        df["from_category"] = df["from"].map(categories).fillna("regular")
+        df["to_category"] = df["to"].map(categories).fillna("regular")
+        df["direction"] = outgoing.map({True: "out", False: "in"})
+        df.loc[outgoing & incoming, "direction"] = "self"
+        df["counterparty"] = df["to"].where(outgoing, df["from"])
+        df["risk_category"] = df["to_category"].where(outgoing, df["from_category"])
+        df.loc[outgoing & incoming, "risk_category"] = "regular"
+        df["entity"] = df["counterparty"].map(entities)
+        return df
+
+
+def _builtin_labels():
+    for category, groups in (("mixer", MIXER_LABELS), ("exchange", EXCHANGE_LABELS)):
+        for entity, addresses in groups.items():
+            for address in addresses:
+                yield address, category, entity
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_label_index():
+    """Return the shared index of built-in labels, building it on first use"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = LabelIndex(_builtin_labels())
+        return _default_index
+
+
+def add_label_arguments(parser):
+    """Register the --labels option shared by both entry points"""
+    parser.add_argument("--labels", action="append", default=[], metavar="STORE",
+                        help="Label store built with `python crypto_labels.py build` (repeatable)")
+
+
+def labels_from_args(args):
+    """Attach the label stores given on the command line to the shared index"""
+    index = get_label_index()
+    attached = {store.path for store in index.stores}
+    for path in args.labels:
+        if path not in attached:
+            index.attach(LabelStore(path))
+    return index
+
+
+def main():
+    """Build a label store from CSV/JSONL label files"""
+    parser = argparse.ArgumentParser(description="Crypto Tracker label store builder")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build a label store from CSV/JSONL files")
+    build.add_argument("output", help="Path of the label store to write")
+    build.add_argument("sources", nargs="+", help="CSV or JSONL files with address,category,entity columns")
+    build.add_argument("--false-positive-rate", type=float, default=0.01,
+                       help="Bloom filter false positive rate")
+    lookup = subparsers.add_parser("lookup", help="Look addresses up in a label store")
+    lookup.add_argument("store")
+    lookup.add_argument("addresses", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_label_store(args.sources, args.output, args.false_positive_rate)
+        print(f"[+] Wrote {count} labels to {args.output}")
+    else:
+        store = LabelStore(args.store)
+        for address in args.addresses:
+            label = store.lookup(address)
+            print(f"{address}: {label[1]} ({label[0]})" if label else f"{address}: not labeled")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# Upper bounds, in seconds, of the API latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_PREFIX = 'crypto_tracker'
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulative['+Inf' if bound == float('inf') else str(bound)] = total
+        return {'count': self.count, 'sum': self.sum, 'buckets': cumulative}
+
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """Thread-safe registry of stage timers, counters, gauges and histograms
+
+    Every series can carry labels, e.g. count('api_requests', provider='etherscan').
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        """Context manager adding the time spent inside it to a stage"""
+        return _Stage(self, name)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            calls, total = self.stages.get(name, (0, 0.0))
+            self.stages[name] = (calls + 1, total + seconds)
+
+    def count(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        """All series as a JSON-able dict"""
+        def series(items, value=lambda v: v):
+            return [{'name': name, 'labels': dict(labels), 'value': value(v)}
+                    for (name, labels), v in sorted(items.items())]
+
+        with self._lock:
+            return {
+                'started_at': self.started,
+                'elapsed_seconds': time.time() - self.started,
+                'stages': {name: {'calls': calls, 'seconds': total}
+                           for name, (calls, total) in sorted(self.stages.items())},
+                'counters': series(self.counters),
+                'gauges': series(self.gauges),
+                'histograms': series(self.histograms, Histogram.to_dict),
+            }
+
+    def to_prometheus(self):
+        """Render all series in the Prometheus text exposition format"""
+        def labelled(labels, **extra):
+            pairs = list(labels) + sorted(extra.items())
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+        lines = [f'# TYPE {PROMETHEUS_PREFIX}_stage_seconds_total counter',
+                 f'# TYPE {PROMETHEUS_PREFIX}_stage_calls_total counter']
+        with self._lock:
+            for name, (calls, total) in sorted(self.stages.items()):
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_total{{stage="{name}"}} {total}')
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_calls_total{{stage="{name}"}} {calls}')
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{name}_total counter')
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}_total{labelled(labels)} {value}')
+            for (name, labels), value in sorted(self.gauges.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{name} gauge')
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}{labelled(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{name} histogram')
+                for bound, count in histogram.to_dict()['buckets'].items():
+                    lines.append(f'{PROMETHEUS_PREFIX}_{name}_bucket{labelled(labels, le=bound)} {count}')
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}_sum{labelled(labels)} {histogram.sum}')
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}_count{labelled(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Human-readable report of stages and totals"""
+        snapshot = self.snapshot()
+        lines = [f"Profile ({snapshot['elapsed_seconds']:.2f}s wall time)", 'Stages:']
+        for name, stage in sorted(snapshot['stages'].items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f"  {name:24} {stage['seconds']:9.3f}s  {stage['calls']:>8} calls")
+        lines.append('Counters:')
+        for item in snapshot['counters'] + snapshot['gauges']:
+            labels = ','.join(f'{k}={v}' for k, v in item['labels'].items())
+            lines.append(f"  {item['name'] + (f'[{labels}]' if labels else ''):40} {item['value']:>12,}")
+        for item in snapshot['histograms']:
+            value = item['value']
+            if value['count']:
+                labels = ','.join(f'{k}={v}' for k, v in item['labels'].items())
+                lines.append(f"  {item['name']}[{labels}] mean {value['sum'] / value['count'] * 1000:.1f}ms "
+                             f"over {value['count']}")
+        return '\n'.join(lines)
+
+
+class NullMetrics:
+    """Stand-in used while profiling is off; every call is a no-op"""
+
+    enabled = False
+    _stage = nullcontext()
+
+    def stage(self, name):
+        return self._stage
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, amount=1, **labels):
+        pass
+
+    def gauge(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+
+_metrics = NullMetrics()
+
+
+def get_metrics():
+    """Return the process-wide registry (a no-op one unless profiling was enabled)"""
+    return _metrics
+
+
+def enable_metrics():
+    """Switch on profiling for this process and return the live registry"""
+    global _metrics
+    if not _metrics.enabled:
+        _metrics = Metrics()
+    return _metrics
+
+
+def add_metrics_arguments(parser):
+    """Register the profiling options shared by the entry points"""
+    parser.add_argument('--profile', action='store_true',
+                        help='Time each stage and count API calls, bytes, retries and cache hits')
+    parser.add_argument('--metrics-json', metavar='PATH', help='Write the profile as JSON (implies --profile)')
+    parser.add_argument('--metrics-prom', metavar='PATH',
+                        help='Write the profile in Prometheus text format (implies --profile)')
+
+
+def metrics_from_args(args):
+    """Enable profiling when any of the profiling options was given"""
+    if args.profile or args.metrics_json or args.metrics_prom:
+        return enable_metrics()
+    return get_metrics()
+
+
+def report_metrics(args):
+    """Print the profile to stderr and write the requested export files"""
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return
+    print('\n' + metrics.summary(), file=sys.stderr)
+    try:
+        if args.metrics_json:
+            with open(args.metrics_json, 'w', encoding='utf-8') as f:
+                json.dump(metrics.snapshot(), f, indent=2)
+        if args.metrics_prom:
+            with open(args.metrics_prom, 'w', encoding='utf-8') as f:
+                f.write(metrics.to_prometheus())
+    except OSError as e:
+        print(f"Metrics export error: {str(e)}", file=sys.stderr)
@@ -0,0 +1,519 @@
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from crypto_http import default_client
+from crypto_index import add_index_arguments, index_from_args
+from crypto_metrics import get_metrics
+
+# Blocks scanned by the JSON-RPC backend, and blocks requested per batched round trip
+RPC_WINDOW = 1000
+RPC_BATCH = 50
+# Addresses per batched BlockCypher request, transactions per page (the /full
+# maximum) and pages followed per address before a history is cut off
+BLOCKCYPHER_BATCH = 20
+BLOCKCYPHER_LIMIT = 50
+BLOCKCYPHER_PAGES = 20
+# Etherscan account actions merged into one transfer stream: normal
+# transactions, internal (contract) ETH transfers and ERC-20 token transfers
+TRANSFER_ACTIONS = ('txlist', 'txlistinternal', 'tokentx')
+RESULT_CAP = 10000  # Etherscan never returns more than page * offset = 10,000 rows per query
+REFRESH_PAGE = 1000  # rows per page when a cached Etherscan history is brought up to date
+TRANSFER_KINDS = {'txlist': 'normal', 'txlistinternal': 'internal', 'tokentx': 'token'}
+_KIND_RANK = {'normal': 0, 'internal': 1, 'token': 2}
+
+
+class ProviderError(Exception):
+    """Raised when a provider answers with an error instead of data"""
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(int(timestamp), timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def etherscan_transfer(row, action='txlist'):
+    """Type an Etherscan account row as a transfer with its kind, asset, decimals and a unique id
+
+    Internal and token transfers share the hash of the transaction that caused
+    them, so `id` tells them apart. Only token rows carry a log index; the
+    others get -1 and sort ahead of the token events of their block.
+    """
+    kind = TRANSFER_KINDS[action]
+    if kind == 'token':
+        log_index = int(row.get('logIndex') or 0)
+        asset = row.get('tokenSymbol') or row.get('contractAddress', 'TOKEN')[:10]
+        decimals = int(row.get('tokenDecimal') or 0)
+        transfer_id = f"{row['hash']}:{log_index}"
+    else:
+        log_index, asset, decimals = -1, 'ETH', 18
+        transfer_id = row['hash'] if kind == 'normal' else f"{row['hash']}:internal:{row.get('traceId', '')}"
+    return {**row, 'kind': kind, 'asset': asset, 'decimals': decimals, 'logIndex': log_index, 'id': transfer_id}
+
+
+def transfer_order(row):
+    """Sort key of a typed transfer: block number, then log index, then kind"""
+    return int(row['blockNumber']), int(row['logIndex']), _KIND_RANK[row['kind']]
+
+
+def etherscan_transaction(tx):
+    """Convert an Etherscan txlist entry (or typed transfer) to the BlockCypher transaction shape"""
+    normalized = {
+        'hash': tx.get('id', tx['hash']),
+        'confirmed': _iso(tx['timeStamp']),
+        'block_height': tx['blockNumber'],
+        'inputs': [{
+            'addresses': [tx['from']],
+            'output_value': int(tx['value'])
+        }],
+        'outputs': [{
+            'addresses': [tx['to']],
+            'value': int(tx['value'])
+        }]
+    }
+    if 'asset' in tx:
+        normalized['asset'], normalized['decimals'] = tx['asset'], tx['decimals']
+    return normalized
+
+
+def rpc_transactions(block):
+    """Convert the transaction objects of an eth_getBlockByNumber block to the BlockCypher shape"""
+    timestamp = _iso(int(block['timestamp'], 16))
+    height = int(block['number'], 16)
+    txs = []
+    for tx in block['transactions']:
+        if not isinstance(tx, dict):
+            continue
+        value = int(tx.get('value') or '0x0', 16)
+        sender, receiver = (tx.get('from') or '').lower(), (tx.get('to') or '').lower()
+        txs.append({
+            'hash': tx['hash'],
+            'confirmed': timestamp,
+            'block_height': height,
+            'inputs': [{'addresses': [sender], 'output_value': value}],
+            'outputs': [{'addresses': [receiver] if receiver else [], 'value': value}],
+        })
+    return txs
+
+
+class Provider(ABC):
+    """Source of recent transactions for an address
+
+    `fetch` returns a dict whose 'txs' are in the provider's native shape, so
+    they can be cached as received; `block_of` gives a native transaction's
+    block (negative when unconfirmed) and `normalize` converts it to the
+    BlockCypher-style shape the graph builder consumes.
+    """
+
+    name = None
+    chain = None  # set when the provider serves a single chain
+    cache_key = 'recent'
+    local = False  # answers without network calls, so caching its responses is pointless
+    batch_size = 1  # addresses fetch_many can answer in one request
+
+    def __init__(self, http=None):
+        self.http = http or default_client()
+
+    @property
+    def url(self):
+        return self.http.urls[self.name]
+
+    @abstractmethod
+    def fetch(self, address, cursor=None):
+        """Return {'txs': [...]} for an address, only transactions after block `cursor` when given"""
+
+    def fetch_many(self, cursors):
+        """Fetch {address: cursor}, returning {address: data}; failed addresses map to their ProviderError"""
+        results = {}
+        for address, cursor in cursors.items():
+            try:
+                results[address] = self.fetch(address, cursor)
+            except ProviderError as e:
+                results[address] = e
+        return results
+
+    def block_of(self, tx):
+        return tx.get('block_height', -1)
+
+    def key_of(self, tx):
+        """Identity a native transaction is cached under"""
+        return tx['hash']
+
+    def normalize(self, tx):
+        return tx
+
+    def trim(self, txs):
+        """Cut a cached history, newest first, to what an uncached fetch returns"""
+        return txs
+
+
+class EtherscanProvider(Provider):
+    """The latest page of each of an address's Etherscan transfer lists
+
+    txlist, txlistinternal and tokentx are requested concurrently, so a lookup
+    takes about as long as a single call, and merged newest first. With a
+    cursor every list is paged oldest first from the block after it until it
+    is exhausted, so a cached history never skips transfers that arrived
+    between two runs.
+    """
+
+    name = 'etherscan'
+    chain = 'eth'
+    # Typed transfer pages live apart from the txlist-only pages once cached under 'recent'
+    cache_key = 'recent-transfers'
+
+    def __init__(self, http=None, api_key=None, page_size=10, actions=TRANSFER_ACTIONS):
+        super().__init__(http)
+        self.api_key = api_key
+        self.page_size = page_size
+        self.actions = tuple(actions)
+
+    def fetch(self, address, cursor=None):
+        def rows(action):
+            if cursor is None:
+                return self._page(action, address, 0, 1, self.page_size, 'desc')
+            return self._refresh(action, address, cursor)
+
+        if len(self.actions) == 1:
+            pages = [rows(self.actions[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(self.actions)) as pool:
+                pages = list(pool.map(rows, self.actions))
+        txs = sorted((row for page in pages for row in page), key=transfer_order, reverse=True)
+        if not txs and cursor is None:
+            raise ProviderError("Etherscan Error: No transactions found")
+        return {'txs': txs}
+
+    def _page(self, action, address, startblock, page, offset, sort):
+        params = {
+            'module': 'account',
+            'action': action,
+            'address': address,
+            'startblock': startblock,
+            'endblock': 99999999,
+            'page': page,
+            'offset': offset,
+            'sort': sort,
+            'apikey': self.api_key
+        }
+        data = self.http.get_json(self.name, self.url, params)
+        if data['status'] == '1':
+            return [etherscan_transfer(row, action) for row in data['result']]
+        if data['message'] == 'No transactions found':
+            return []
+        raise ProviderError(f"Etherscan Error: {data['message']}")
+
+    def _refresh(self, action, address, cursor):
+        """Every row of one list after the cursor, oldest first
+
+        A query stops at RESULT_CAP rows, so a longer backlog is resumed from
+        the last block it reached, whose rows are fetched again in full.
+        """
+        rows, start = [], cursor + 1
+        while True:
+            for page in range(1, RESULT_CAP // REFRESH_PAGE + 1):
+                batch = self._page(action, address, start, page, REFRESH_PAGE, 'asc')
+                rows.extend(batch)
+                if len(batch) < REFRESH_PAGE:
+                    return rows
+            last = int(rows[-1]['blockNumber'])
+            if last == start:
+                # A single block above the cap cannot be split any further
+                print(f"Warning: block {last} of {address} truncated at {RESULT_CAP} transactions")
+                start = last + 1
+                continue
+            rows = [row for row in rows if int(row['blockNumber']) != last]
+            start = last
+
+    def trim(self, txs):
+        """The newest page_size rows of each list, like an uncached fetch"""
+        kept, counts = [], {}
+        for tx in sorted(txs, key=transfer_order, reverse=True):
+            counts[tx['kind']] = counts.get(tx['kind'], 0) + 1
+            if counts[tx['kind']] <= self.page_size:
+                kept.append(tx)
+        return kept
+
+    def block_of(self, tx):
+        return tx['blockNumber']
+
+    def key_of(self, tx):
+        return tx.get('id', tx['hash'])
+
+    def normalize(self, tx):
+        return etherscan_transaction(tx)
+
+
+class BlockCypherProvider(Provider):
+    """Address histories from BlockCypher's addrs/{address}/full
+
+    Addresses sharing a cursor are requested `batch_size` at a time with
+    BlockCypher's semicolon-separated batch syntax, then every history is paged
+    with hasMore/before until it is complete or `max_pages` pages were read.
+    """
+
+    name = 'blockcypher'
+    chain = 'btc'
+    # Histories here are paged to the end, unlike the single page cached under 'recent'
+    cache_key = 'full'
+
+    def __init__(self, http=None, batch_size=BLOCKCYPHER_BATCH, max_pages=BLOCKCYPHER_PAGES):
+        super().__init__(http)
+        self.batch_size = max(1, batch_size)
+        self.max_pages = max(1, max_pages)
+
+    def _get(self, addresses, cursor=None, before=None):
+        params = {'limit': BLOCKCYPHER_LIMIT}
+        if cursor is not None:
+            params['after'] = cursor
+        if before is not None:
+            params['before'] = before
+        data = self.http.get_json(self.name, f"{self.url}/addrs/{';'.join(addresses)}/full", params)
+        return data if isinstance(data, list) else [data]
+
+    def fetch(self, address, cursor=None):
+        result = self.fetch_many({address: cursor})[address]
+        if isinstance(result, ProviderError):
+            raise result
+        return result
+
+    def fetch_many(self, cursors):
+        """Batch new addresses together, and cached ones together from the lowest cursor of each batch"""
+        fresh = [address for address, cursor in cursors.items() if cursor is None]
+        cached = sorted((address for address, cursor in cursors.items() if cursor is not None), key=cursors.get)
+        results = {}
+        for addresses in (fresh, cached):
+            for start in range(0, len(addresses), self.batch_size):
+                chunk = addresses[start:start + self.batch_size]
+                after = min((cursors[address] for address in chunk if cursors[address] is not None), default=None)
+                replies = {reply.get('address'): reply for reply in self._get(chunk, after)}
+                for address in chunk:
+                    reply = replies.get(address)
+                    try:
+                        if reply is None:
+                            raise ProviderError(f"BlockCypher Error: no data for {address}")
+                        if 'error' in reply:
+                            raise ProviderError(f"BlockCypher Error: {reply['error']}")
+                        data = self._paginate(address, reply, after)
+                    except ProviderError as e:
+                        results[address] = e
+                        continue
+                    cursor = cursors[address]
+                    if cursor is not None and cursor != after:
+                        # Drop what this address already has cached below the shared cursor
+                        data['txs'] = [tx for tx in data['txs'] if not 0 <= tx.get('block_height', -1) <= cursor]
+                    results[address] = data
+        return results
+
+    def _paginate(self, address, data, cursor):
+        """Follow hasMore/before from a first page until the history after the cursor is complete"""
+        txs, seen = [], set()
+        page, pages = data, 1
+        while True:
+            batch = page.get('txs', [])
+            heights = {tx['block_height'] for tx in batch if tx.get('block_height', -1) >= 0}
+            before = None
+            if page.get('hasMore') and heights:
+                lowest = min(heights)
+                if len(heights) > 1:
+                    # The lowest block may continue on the next page, so fetch it again there
+                    batch = [tx for tx in batch if tx.get('block_height') != lowest]
+                    before = lowest + 1
+                else:
+                    before = lowest
+            for tx in batch:
+                if tx['hash'] not in seen:
+                    seen.add(tx['hash'])
+                    txs.append(tx)
+            if before is None or pages >= self.max_pages:
+                break
+            page = self._get([address], cursor, before)[0]
+            if 'error' in page:
+                raise ProviderError(f"BlockCypher Error: {page['error']}")
+            pages += 1
+        get_metrics().count('blockcypher_pages', pages)
+        return {**data, 'txs': txs, 'hasMore': before is not None}
+
+    def trim(self, txs):
+        """The newest max_pages pages of a history, like an uncached fetch"""
+        return txs[:self.max_pages * BLOCKCYPHER_LIMIT]
+
+
+class JsonRpcProvider(Provider):
+    """Transactions of an address found by scanning recent blocks on an Ethereum node
+
+    A node keeps no per-address index, so the last `window` blocks are fetched
+    once with batched eth_getBlockByNumber calls (`batch` blocks per round trip,
+    `concurrency` round trips in flight) and indexed by sender and receiver.
+    Every later lookup is answered from that index, and only blocks mined since
+    the previous scan are fetched. Nodes that return bare transaction hashes
+    are followed up with batched eth_getTransactionByHash calls.
+    """
+
+    name = 'rpc'
+    chain = 'eth'
+    cache_key = 'rpc'
+
+    def __init__(self, http=None, window=RPC_WINDOW, batch=RPC_BATCH, concurrency=4):
+        super().__init__(http)
+        self.window = window
+        self.batch = batch
+        self.concurrency = max(1, concurrency)
+        self.scanned = None  # highest block indexed so far
+        self.index = {}
+        self._scan_lock = threading.Lock()
+        self._id_lock = threading.Lock()
+        self._ids = 0
+
+    def call(self, requests):
+        """Send [(method, params), ...] as one JSON-RPC batch and return the results in order"""
+        with self._id_lock:
+            first = self._ids
+            self._ids += len(requests)
+        payload = [{'jsonrpc': '2.0', 'id': first + i, 'method': method, 'params': params}
+                   for i, (method, params) in enumerate(requests)]
+        replies = self.http.post_json(self.name, self.url, payload)
+        if isinstance(replies, dict):
+            replies = [replies]  # some nodes answer a failed batch with one error object
+        by_id = {reply.get('id'): reply for reply in replies}
+        results = []
+        for request in payload:
+            reply = by_id.get(request['id'])
+            if reply is None or 'error' in reply:
+                error = (reply or {}).get('error', 'no reply')
+                raise ProviderError(f"JSON-RPC Error: {request['method']}: {error}")
+            results.append(reply['result'])
+        get_metrics().count('rpc_calls', len(requests))
+        return results
+
+    def latest_block(self):
+        return int(self.call([('eth_blockNumber', [])])[0], 16)
+
+    def get_blocks(self, numbers):
+        """Fetch blocks with full transaction objects in one round trip"""
+        blocks = self.call([('eth_getBlockByNumber', [hex(n), True]) for n in numbers])
+        missing = [tx for block in blocks if block for tx in block['transactions'] if isinstance(tx, str)]
+        if missing:
+            found = dict(zip(missing, self.call([('eth_getTransactionByHash', [h]) for h in missing])))
+            for block in blocks:
+                if block:
+                    block['transactions'] = [found.get(tx, tx) if isinstance(tx, str) else tx
+                                             for tx in block['transactions']]
+        return [block for block in blocks if block]
+
+    def _index_block(self, block):
+        for tx in rpc_transactions(block):
+            sender, receiver = tx['inputs'][0]['addresses'][0], (tx['outputs'][0]['addresses'] or [''])[0]
+            for address in {sender, receiver} - {''}:
+                self.index.setdefault(address, []).append(tx)
+
+    def scan(self):
+        """Index blocks mined since the last scan, within the window
+
+        Called automatically by the first lookup; call it again to pick up new blocks.
+        """
+        latest = self.latest_block()
+        start = max(0, latest - self.window + 1)
+        if self.scanned is not None:
+            start = max(start, self.scanned + 1)
+        numbers = list(range(start, latest + 1))
+        chunks = [numbers[i:i + self.batch] for i in range(0, len(numbers), self.batch)]
+        with get_metrics().stage('rpc_scan'), ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for blocks in pool.map(self.get_blocks, chunks):
+                for block in blocks:
+                    self._index_block(block)
+        self.scanned = latest
+
+    def fetch(self, address, cursor=None):
+        with self._scan_lock:
+            if self.scanned is None:
+                self.scan()
+        txs = self.index.get(address.lower(), [])
+        after = -1 if cursor is None else cursor
+        return {'txs': sorted((tx for tx in txs if tx['block_height'] > after),
+                              key=lambda tx: tx['block_height'], reverse=True)}
+
+    def trim(self, txs):
+        """Transactions within the scanned blocks, like an uncached fetch"""
+        if self.scanned is None:
+            return txs
+        return [tx for tx in txs if tx['block_height'] > self.scanned - self.window]
+
+
+class IndexProvider(Provider):
+    """Transactions of an address from a local AddressIndex built by the ingest subcommand
+
+    Only the ingested block ranges are covered; lookups never touch the network.
+    """
+
+    name = 'index'
+    cache_key = 'index'
+    local = True
+
+    def __init__(self, index, http=None):
+        super().__init__(http)
+        self.index = index
+        self.chain = index.chain
+
+    def fetch(self, address, cursor=None):
+        return {'txs': self.index.transactions(address, cursor), 'n_tx': self.index.count(address)}
+
+
+PROVIDERS = {
+    'etherscan': EtherscanProvider,
+    'blockcypher': BlockCypherProvider,
+    'rpc': JsonRpcProvider,
+}
+
+
+def make_provider(crypto_type, api_key=None, http=None, name=None):
+    """Build the provider for a chain: Etherscan for ETH and BlockCypher for BTC unless `name` is given"""
+    name = name or ('etherscan' if crypto_type == 'eth' else 'blockcypher')
+    if name == 'index':
+        raise ValueError("the index provider reads a local index; build an IndexProvider from an AddressIndex")
+    if name not in PROVIDERS:
+        raise ValueError(f"unknown provider {name!r}; expected one of {sorted(PROVIDERS)}")
+    if name == 'etherscan':
+        provider = EtherscanProvider(http, api_key)
+    else:
+        provider = PROVIDERS[name](http)
+    if provider.chain != crypto_type:
+        raise ValueError(f"the {name} provider serves {provider.chain}, not {crypto_type}")
+    return provider
+
+
+def add_provider_arguments(parser):
+    """Register the provider selection and JSON-RPC scan options"""
+    parser.add_argument('--provider', choices=sorted(PROVIDERS),
+                        help='Transaction source (default: etherscan for eth, blockcypher for btc); '
+                             'rpc scans recent blocks on your own node, set its URL with --api-url rpc=URL')
+    parser.add_argument('--rpc-window', type=int, default=RPC_WINDOW,
+                        help='Recent blocks the rpc provider scans for transactions')
+    parser.add_argument('--rpc-batch', type=int, default=RPC_BATCH,
+                        help='Blocks requested per JSON-RPC batch')
+    parser.add_argument('--blockcypher-batch', type=int, default=BLOCKCYPHER_BATCH,
+                        help='Addresses per batched BlockCypher request')
+    parser.add_argument('--blockcypher-pages', type=int, default=BLOCKCYPHER_PAGES,
+                        help=f'Pages of {BLOCKCYPHER_LIMIT} transactions followed per BlockCypher address')
+    add_index_arguments(parser)
+
+
+def provider_from_args(args, http, parser, concurrency=4):
+    """Build the provider selected on the command line; --index takes precedence over --provider
+
+    Without --crypto the chain follows the provider (btc when none is
+    selected); a --crypto the provider does not serve is a usage error.
+    """
+    index = index_from_args(args)
+    if index:
+        provider = IndexProvider(index, http)
+    elif args.provider == 'rpc':
+        provider = JsonRpcProvider(http, args.rpc_window, args.rpc_batch, concurrency)
+    elif args.provider == 'blockcypher' or (args.provider is None and args.crypto in (None, 'btc')):
+        provider = BlockCypherProvider(http, args.blockcypher_batch, args.blockcypher_pages)
+    else:
+        provider = EtherscanProvider(http, args.api_key)
+    if args.crypto and args.crypto != provider.chain:
+        source = f"the index {args.index}" if index else f"--provider {provider.name}"
+        parser.error(f"{source} serves {provider.chain}, not --crypto {args.crypto}")
+    return provider
@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from crypto_cache import add_cache_arguments, cache_from_args
+from crypto_core import BlockchainAnalyzer
+from crypto_http import add_http_arguments, http_from_args
+from crypto_labels import add_label_arguments, labels_from_args
+from crypto_metrics import add_metrics_arguments, get_metrics, metrics_from_args, report_metrics
+from crypto_providers import add_provider_arguments, provider_from_args
+
+LEASE = 120.0  # seconds before an address claimed by a silent worker is handed out again
+MAX_ATTEMPTS = 3  # lookups of an address before it is recorded as failed
+POLL_INTERVAL = 0.2
+
+
+class WorkQueue:
+    """Shared crawl work queue in a SQLite file that coordinator and workers open
+
+    Every address is a row keyed by the address itself, so submitting an
+    address that was queued before is a no-op: deduplication is atomic however
+    many processes submit. Workers claim pending addresses inside an immediate
+    transaction, so no two workers get the same address, and write the fetched
+    responses back to the same row. Claims expire after `lease` seconds so the
+    addresses of a crashed worker are fetched by another.
+    """
+
+    def __init__(self, path, lease=LEASE):
+        self.path = path
+        self.lease = lease
+        self._lock = threading.Lock()
+        # Autocommit, with explicit transactions where several statements must be atomic
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                address TEXT PRIMARY KEY,
+                level INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                claimed_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                data TEXT
+            );
+            CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, level, position);
+        """)
+
+    def _meta(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def start(self, params):
+        """Begin a crawl, clearing a finished one; fails while another crawl is still running"""
+        if self._meta('params') is not None and not self.finished():
+            raise ValueError(f"{self.path} is in use by an unfinished crawl")
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.execute('DELETE FROM tasks')
+            self._conn.execute('DELETE FROM meta')
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('params', ?)", (json.dumps(params),))
+            self._conn.execute('COMMIT')
+
+    def params(self):
+        return self._meta('params')
+
+    def finish(self):
+        """Tell the workers the crawl is over"""
+        self._set_meta('finished', True)
+
+    def finished(self):
+        return bool(self._meta('finished'))
+
+    def submit(self, level, addresses):
+        """Queue addresses for a level, returning how many were not queued before"""
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.executemany('INSERT OR IGNORE INTO tasks (address, level, position) VALUES (?, ?, ?)',
+                                   [(address, level, position) for position, address in enumerate(addresses)])
+            self._conn.execute('COMMIT')
+            return self._conn.total_changes - before
+
+    def claim(self, worker, limit):
+        """Atomically take up to `limit` pending (or expired) addresses, lowest level first"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            rows = self._conn.execute("""
+                SELECT address FROM tasks
+                WHERE status = 'pending' OR (status = 'claimed' AND claimed_at < ?)
+                ORDER BY level, position LIMIT ?
+            """, (now - self.lease, limit)).fetchall()
+            addresses = [row[0] for row in rows]
+            self._conn.executemany("""
+                UPDATE tasks SET status = 'claimed', worker = ?, claimed_at = ?, attempts = attempts + 1
+                WHERE address = ?
+            """, [(worker, now, address) for address in addresses])
+            self._conn.execute('COMMIT')
+        return addresses
+
+    def complete(self, worker, info, max_attempts=MAX_ATTEMPTS):
+        """Store fetched responses; failed lookups go back to the queue until max_attempts is reached"""
+        done = [(json.dumps(data), address, worker) for address, data in info.items() if data is not None]
+        failed = [(max_attempts, address, worker) for address, data in info.items() if data is None]
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            # A claim that expired and went to another worker is no longer ours to complete
+            self._conn.executemany("""
+                UPDATE tasks SET status = 'done', data = ? WHERE address = ? AND worker = ? AND status = 'claimed'
+            """, done)
+            self._conn.executemany("""
+                UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END
+                WHERE address = ? AND worker = ? AND status = 'claimed'
+            """, failed)
+            self._conn.execute('COMMIT')
+
+    def outstanding(self, level):
+        """Addresses of a level that are not fetched or failed yet"""
+        with self._lock:
+            return self._conn.execute("""
+                SELECT COUNT(*) FROM tasks WHERE level = ? AND status IN ('pending', 'claimed')
+            """, (level,)).fetchone()[0]
+
+    def cancel(self, level):
+        """Drop the pending addresses of a level, returning how many were dropped"""
+        with self._lock:
+            return self._conn.execute("DELETE FROM tasks WHERE level = ? AND status = 'pending'",
+                                      (level,)).rowcount
+
+    def results(self, level):
+        """Responses of a level as {address: data}, None for failed lookups"""
+        with self._lock:
+            rows = self._conn.execute("SELECT address, data FROM tasks WHERE level = ? AND status IN ('done', 'failed')",
+                                      (level,)).fetchall()
+        return {address: json.loads(data) if data else None for address, data in rows}
+
+    def workers(self):
+        """Addresses completed per worker"""
+        with self._lock:
+            return dict(self._conn.execute("""
+                SELECT worker, COUNT(*) FROM tasks WHERE status = 'done' GROUP BY worker ORDER BY worker
+            """).fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def work(queue, fetch, batch_size=1, concurrency=4, name=None, stop=None, idle_timeout=None):
+    """Claim, fetch and complete addresses until the crawl finishes, `stop` is set or the queue idles out
+
+    `fetch` takes a list of up to batch_size addresses and returns {address:
+    data}, like BlockchainAnalyzer.get_addresses_info. Returns the number of
+    addresses fetched.
+    """
+    name = name or worker_name()
+    fetched = 0
+    idle_since = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        while not (stop and stop.is_set()) and not queue.finished():
+            addresses = queue.claim(name, batch_size * concurrency)
+            if not addresses:
+                if idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+            groups = [addresses[i:i + batch_size] for i in range(0, len(addresses), batch_size)]
+            for info in pool.map(fetch, groups):
+                queue.complete(name, info)
+                fetched += len(info)
+            get_metrics().count('queue_fetched', len(addresses))
+            idle_since = time.monotonic()
+    return fetched
+
+
+class QueueFetcher:
+    """Hands each crawl level to the workers of a WorkQueue and waits for its responses
+
+    The coordinator can work the queue itself with `fetch`, the same way any
+    other worker does, so a crawl makes progress before remote workers join.
+    """
+
+    def __init__(self, queue, fetch=None, batch_size=1, concurrency=4):
+        self.queue = queue
+        self.level = 0
+        self.stop = threading.Event()
+        self.local = None
+        if fetch:
+            self.local = threading.Thread(target=work, args=(queue, fetch, batch_size, concurrency,
+                                                             f"{worker_name()}:coordinator", self.stop),
+                                          daemon=True)
+            self.local.start()
+
+    def fetch(self, addresses, deadline=None):
+        """Queue one level and return ({address: data}, addresses dropped at the deadline)"""
+        level = self.level
+        self.level += 1
+        self.queue.submit(level, addresses)
+        dropped = 0
+        while self.queue.outstanding(level):
+            if deadline is not None and time.monotonic() >= deadline:
+                dropped = self.queue.cancel(level)
+                deadline = None  # claimed addresses are still collected
+                continue
+            time.sleep(POLL_INTERVAL)
+        return self.queue.results(level), dropped
+
+    def close(self):
+        self.queue.finish()
+        self.stop.set()
+        if self.local:
+            self.local.join()
+
+
+def add_queue_arguments(parser):
+    """Register the distributed crawl options of the coordinator"""
+    parser.add_argument('--queue', metavar='PATH',
+                        help="Coordinate a distributed crawl through this work queue file; start workers with "
+                             "'crypto_tracker_v3.py worker PATH'")
+    parser.add_argument('--no-local-worker', action='store_true',
+                        help='With --queue, leave all fetching to the workers')
+
+
+def main(argv=None):
+    """Worker entry point (`crypto_tracker_v3.py worker`)"""
+    parser = argparse.ArgumentParser(prog='crypto_tracker_v3.py worker',
+                                     description='Fetch addresses for a distributed crawl coordinated with --queue')
+    parser.add_argument('queue', help='Work queue file shared with the coordinator')
+    parser.add_argument('--api-key', help='Etherscan API key of this worker')
+    parser.add_argument('--concurrency', type=int, default=4, help='Lookups in flight')
+    parser.add_argument('--idle-timeout', type=float,
+                        help='Also exit after this many seconds without work (default: exit when the crawl finishes)')
+    add_provider_arguments(parser)
+    add_cache_arguments(parser)
+    add_http_arguments(parser)
+    add_label_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    metrics_from_args(args)
+    queue = WorkQueue(args.queue)
+    print(f"[+] Waiting for a crawl in {args.queue}", file=sys.stderr)
+    while queue.params() is None or queue.finished():
+        time.sleep(POLL_INTERVAL)
+    args.crypto = queue.params()['crypto']
+    http = http_from_args(args, pool_size=args.concurrency)
+    provider = provider_from_args(args, http, parser, args.concurrency)
+    if args.crypto == 'eth' and not args.api_key and provider.name == 'etherscan':
+        parser.error("Ethereum crawls require --api-key")
+    analyzer = BlockchainAnalyzer(args.crypto, api_key=args.api_key, cache=cache_from_args(args), http=http,
+                                  labels=labels_from_args(args), provider=provider)
+    started = time.monotonic()
+    try:
+        fetched = work(queue, analyzer.get_addresses_info, provider.batch_size, args.concurrency,
+                       idle_timeout=args.idle_timeout)
+    except KeyboardInterrupt:
+        fetched = 0
+        print("\n[!] Stopped; claimed addresses go back to the queue after the lease expires", file=sys.stderr)
+    print(f"[+] {fetched} addresses fetched in {time.monotonic() - started:.1f}s", file=sys.stderr)
+    report_metrics(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+import html
+import json
+import math
+from collections import defaultdict, deque
+
+from crypto_graph import ADDRESS, ROLE_ROOT, TRANSACTION, format_time
+from crypto_labels import get_label_index
+from crypto_metrics import get_metrics
+
+# Graphs with more edges than this are rendered in large-graph mode
+LARGE_GRAPH_EDGES = 2000
+# Leaf addresses hanging off one side of a transaction are collapsed above this count
+LEAF_THRESHOLD = 5
+# Minimum arc length between neighbouring nodes on a layout ring, in pixels
+NODE_SPACING = 40
+RING_SPACING = 250
+
+LARGE_GRAPH_OPTIONS = {
+    "layout": {"improvedLayout": False},
+    "physics": {"enabled": False},
+    "nodes": {"font": {"size": 14}},
+    "edges": {
+        "smooth": False,
+        "arrows": {"to": {"enabled": True, "scaleFactor": 0.5}},
+        "scaling": {"min": 0.5, "max": 4},
+    },
+    "interaction": {
+        "hover": True,
+        "hideEdgesOnDrag": True,
+        "hideEdgesOnZoom": True,
+        "navigationButtons": True,
+        "tooltipDelay": 200,
+    },
+}
+
+LEGEND_TEMPLATE = """
+<div id="legend" style="font-family: arial; margin: 12px;">
+  <h3>Node Legend ({count} nodes)</h3>
+  <input id="legend-search" type="search" placeholder="Search by node number, address or hash..."
+         style="width: 400px; padding: 4px;">
+  <div style="max-height: 400px; overflow-y: auto;">
+    <table id="legend-table" style="border-collapse: collapse; width: 100%;">
+      <thead><tr><th align="left">Node</th><th align="left">Type</th><th align="left">Identifier</th></tr></thead>
+      <tbody>{rows}</tbody>
+    </table>
+  </div>
+</div>
+<script>
+document.getElementById("legend-search").addEventListener("input", function() {{
+    var query = this.value.toLowerCase();
+    var rows = document.getElementById("legend-table").tBodies[0].rows;
+    for (var i = 0; i < rows.length; i++) {{
+        rows[i].style.display = rows[i].textContent.toLowerCase().indexOf(query) === -1 ? "none" : "";
+    }}
+}});
+document.getElementById("legend-table").addEventListener("click", function(event) {{
+    var row = event.target.closest("tr[data-node]");
+    if (row && typeof network !== "undefined") {{
+        var node = row.getAttribute("data-node");
+        node = isNaN(node) ? node : Number(node);
+        network.selectNodes([node]);
+        network.focus(node, {{scale: 1.5}});
+    }}
+}});
+</script>
+"""
+
+
+class RenderGraph:
+    """Display-ready nodes and edges, possibly with aggregate nodes"""
+
+    def __init__(self):
+        self.nodes = {}
+        self.edges = []
+        self.legend = []
+
+
+def _short(identifier):
+    return f"{identifier[:6]}...{identifier[-4:]}"
+
+
+def aggregate_graph(graph, labels=None, leaf_threshold=LEAF_THRESHOLD):
+    """Collapse parallel transactions and leaf addresses into aggregate nodes
+
+    Transactions with exactly one sender and one receiver are grouped by that
+    address pair, and leaf addresses (one edge, unlabeled, not the root) beyond
+    `leaf_threshold` on one side of a transaction are merged into a single node.
+    Kept nodes retain their IDs so the legend numbering matches the full graph.
+    """
+    labels = labels or get_label_index()
+    senders, receivers = defaultdict(list), defaultdict(list)
+    degree = defaultdict(int)
+    for source, target, value, timestamp in graph.merged_edges():
+        if graph.kinds[source - 1] == TRANSACTION:
+            receivers[source].append((target, value))
+        else:
+            senders[target].append((source, value))
+        degree[source] += 1
+        degree[target] += 1
+
+    # Group simple transfers between the same pair of addresses
+    groups = defaultdict(list)
+    for node_id in range(1, len(graph) + 1):
+        if graph.kinds[node_id - 1] != TRANSACTION:
+            continue
+        if len(senders[node_id]) == 1 and len(receivers[node_id]) == 1:
+            groups[(senders[node_id][0][0], receivers[node_id][0][0],
+                    graph.node_assets[node_id - 1])].append(node_id)
+        else:
+            groups[node_id].append(node_id)
+
+    def is_leaf(node_id):
+        return (degree[node_id] == 1 and graph.roles[node_id - 1] != ROLE_ROOT
+                and graph.keys[node_id - 1] not in labels)
+
+    rendered = RenderGraph()
+    attrs = dict(graph.node_attrs(labels))
+    aggregates = 0
+
+    def add_aggregate(label, title, color, shape):
+        nonlocal aggregates
+        aggregates += 1
+        node_id = f"a{aggregates}"
+        rendered.nodes[node_id] = {'label': label, 'title': title, 'color': color, 'shape': shape, 'size': 30}
+        rendered.legend.append({'id': node_id, 'label': f"{node_id}: {label}", 'type': 'aggregate',
+                                'identifier': title.split('\n', 1)[0]})
+        return node_id
+
+    def add_node(node_id):
+        if node_id not in rendered.nodes:
+            rendered.nodes[node_id] = attrs[node_id]
+            item = graph.legend[node_id - 1]
+            item['identifier'] = graph.keys[node_id - 1]
+            rendered.legend.append(item)
+        return node_id
+
+    def add_edge(source, target, value, outgoing, count=1, asset=0):
+        amount = graph.amount(value, asset)
+        suffix = f" over {count} transfers" if count > 1 else ""
+        rendered.edges.append((source, target, {
+            'value': amount,
+            'color': '#00FF00' if outgoing else '#FF0000',
+            'title': f"Amount: {amount:.4f} {graph.symbol(asset)}{suffix}",
+        }))
+
+    def add_side(tx_node, neighbours, incoming):
+        asset = graph.node_assets[tx_node - 1]
+        leaves = [(node_id, value) for node_id, value in neighbours if is_leaf(node_id)]
+        if len(leaves) <= leaf_threshold:
+            leaves = []
+        collapsed = {node_id for node_id, _ in leaves}
+        for node_id, value in neighbours:
+            if node_id in collapsed:
+                continue
+            add_node(node_id)
+            if incoming:
+                add_edge(node_id, tx_node, value, outgoing=False, asset=asset)
+            else:
+                add_edge(tx_node, node_id, value, outgoing=True, asset=asset)
+        if leaves:
+            total = sum(value for _, value in leaves)
+            members = "\n".join(graph.keys[node_id - 1] for node_id, _ in leaves[:10])
+            more = f"\n... and {len(leaves) - 10} more" if len(leaves) > 10 else ""
+            agg = add_aggregate(f"{len(leaves)} addresses",
+                                f"{len(leaves)} {'senders' if incoming else 'receivers'}\n{members}{more}",
+                                'lightblue', 'dot')
+            if incoming:
+                add_edge(agg, tx_node, total, False, len(leaves), asset)
+            else:
+                add_edge(tx_node, agg, total, True, len(leaves), asset)
+
+    for key, members in groups.items():
+        if len(members) == 1:
+            tx_node = add_node(members[0])
+            add_side(tx_node, senders[members[0]], incoming=True)
+            add_side(tx_node, receivers[members[0]], incoming=False)
+            continue
+        sender, receiver, asset = key
+        sent = sum(senders[tx][0][1] for tx in members)
+        received = sum(receivers[tx][0][1] for tx in members)
+        first = min(graph.times[tx - 1] for tx in members)
+        last = max(graph.times[tx - 1] for tx in members)
+        tx_node = add_aggregate(f"{len(members)} txs",
+                                f"{len(members)} transactions {_short(graph.keys[sender - 1])} -> "
+                                f"{_short(graph.keys[receiver - 1])}\n"
+                                f"Total: {graph.amount(received, asset):.4f} {graph.symbol(asset)}\n"
+                                f"From {format_time(first)} to {format_time(last)}",
+                                'yellow', 'box')
+        add_edge(add_node(sender), tx_node, sent, False, len(members), asset)
+        add_edge(tx_node, add_node(receiver), received, True, len(members), asset)
+
+    # Addresses without any edges (e.g. an empty root) still need a node
+    for node_id in range(1, len(graph) + 1):
+        if graph.kinds[node_id - 1] == ADDRESS and not degree[node_id]:
+            add_node(node_id)
+    return rendered
+
+
+def radial_layout(rendered, roots):
+    """Place nodes on rings by hop distance from the roots, in linear time
+
+    Each node gets an angular sector proportional to the number of leaves below
+    it in the breadth-first tree, so branches do not overlap. Rings grow to keep
+    at least NODE_SPACING pixels between neighbours.
+    """
+    adjacency = defaultdict(list)
+    for source, target, _ in rendered.edges:
+        adjacency[source].append(target)
+        adjacency[target].append(source)
+
+    roots = [root for root in roots if root in rendered.nodes] or list(rendered.nodes)[:1]
+    # Unreached components hang off a virtual center so they get their own sectors
+    center = object()
+    parent, depth, order = {}, {center: -1}, []
+    children = defaultdict(list)
+    queue = deque()
+
+    def walk(starts):
+        for start in starts:
+            parent[start], depth[start] = center, 0
+            children[center].append(start)
+            queue.append(start)
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for neighbour in adjacency[node]:
+                if neighbour not in depth:
+                    parent[neighbour], depth[neighbour] = node, depth[node] + 1
+                    children[node].append(neighbour)
+                    queue.append(neighbour)
+
+    # Walk out from the roots first, so only nodes they cannot reach start new components
+    walk(roots)
+    for start in list(rendered.nodes):
+        if start not in depth:
+            walk([start])
+
+    weight = {}
+    for node in reversed(order):
+        weight[node] = sum(weight[child] for child in children[node]) or 1
+    weight[center] = sum(weight[root] for root in children[center]) or 1
+
+    per_ring = defaultdict(int)
+    for node in order:
+        per_ring[depth[node]] += 1
+    radius = {}
+    for ring in sorted(per_ring):
+        minimum = per_ring[ring] * NODE_SPACING / (2 * math.pi)
+        radius[ring] = max(minimum, radius.get(ring - 1, -RING_SPACING) + RING_SPACING)
+    if len(roots) == 1 and len(children[center]) == 1:
+        radius[0] = 0
+
+    sector = {center: (0.0, 2 * math.pi)}
+    positions = {}
+    for node in [center] + order:
+        start, end = sector[node]
+        if node is not center:
+            angle = (start + end) / 2
+            r = radius[depth[node]]
+            positions[node] = (r * math.cos(angle), r * math.sin(angle))
+        total = weight[node]
+        for child in children[node]:
+            share = (end - start) * weight[child] / total
+            sector[child] = (start, start + share)
+            start += share
+    return positions
+
+
+def legend_table(legend):
+    """Build the searchable legend table shown under the graph"""
+    rows = [
+        f'<tr data-node="{html.escape(str(item["id"]))}" style="cursor: pointer;">'
+        f'<td><b>{html.escape(str(item["id"]))}</b></td><td>{html.escape(item["type"])}</td>'
+        f'<td>{html.escape(item.get("identifier", item["label"]))}</td></tr>'
+        for item in legend
+    ]
+    return LEGEND_TEMPLATE.format(count=len(legend), rows="".join(rows))
+
+
+def add_legend(page, legend):
+    """Insert the legend table below the graph of a generated pyvis page"""
+    return page.replace('</body>', legend_table(legend) + '</body>', 1)
+
+
+def render_large_graph(graph, labels=None, leaf_threshold=LEAF_THRESHOLD, height='800px'):
+    """Render a large graph to standalone HTML with a fixed, precomputed layout"""
+    metrics = get_metrics()
+    with metrics.stage('aggregate'):
+        rendered = aggregate_graph(graph, labels, leaf_threshold)
+    roots = [node_id for node_id in range(1, len(graph) + 1) if graph.roles[node_id - 1] == ROLE_ROOT]
+    with metrics.stage('layout'):
+        positions = radial_layout(rendered, roots)
+    metrics.gauge('rendered_nodes', len(rendered.nodes))
+    metrics.gauge('rendered_edges', len(rendered.edges))
+
+    from pyvis.network import Network  # deferred so headless runs never load it
+
+    net = Network(height=height, width='100%', directed=True, notebook=False, cdn_resources='remote')
+    # Fill the node and edge lists directly: add_node/add_edge scan every
+    # existing node on each call, which is quadratic at this size
+    net.nodes = [{'id': node_id, 'shape': 'dot', **attrs, 'x': positions[node_id][0], 'y': positions[node_id][1]}
+                 for node_id, attrs in rendered.nodes.items()]
+    net.node_ids = list(rendered.nodes)
+    net.edges = [{'from': source, 'to': target, 'arrows': 'to', **attrs}
+                 for source, target, attrs in rendered.edges]
+    net.set_options(json.dumps(LARGE_GRAPH_OPTIONS))
+    with metrics.stage('html_generate'):
+        page = net.generate_html()
+    return add_legend(page, rendered.legend)
+
+
+def add_render_arguments(parser):
+    """Register the large-graph rendering options shared by both entry points"""
+    parser.add_argument('--large-graph-threshold', type=int, default=LARGE_GRAPH_EDGES,
+                        help='Edge count above which graphs are aggregated and rendered without physics')
+    parser.add_argument('--leaf-threshold', type=int, default=LEAF_THRESHOLD,
+                        help='Collapse leaf addresses on one side of a transaction above this count')
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from crypto_cache import add_cache_arguments, cache_from_args
+from crypto_core import API_KEY, TX_COLUMNS, analyze_transactions, iter_transaction_batches
+from crypto_http import add_http_arguments, http_from_args
+from crypto_labels import LabelStore, add_label_arguments, get_label_index
+from crypto_metrics import add_metrics_arguments, get_metrics, metrics_from_args, report_metrics
+
+
+def read_addresses(path):
+    """Read one address per line from a file, or stdin when path is '-'"""
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        seen = set()
+        for line in f:
+            address = line.split('#', 1)[0].strip()
+            if address and address.lower() not in seen:
+                seen.add(address.lower())
+                yield address
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def completed_addresses(path):
+    """Addresses already screened successfully in an existing output file"""
+    done = set()
+    if path == '-' or not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # partial line from an interrupted run
+            if not result.get('error'):
+                done.add(result['address'].lower())
+    return done
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if not f.tell():
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def fetch_history(address, api_key, cache, http):
+    """Download an address's history, trimmed to the columns the analysis uses"""
+    try:
+        with get_metrics().stage('fetch'):
+            txs = [{column: tx[column] for column in TX_COLUMNS}
+                   for batch in iter_transaction_batches(address, api_key, cache, http) for tx in batch]
+        return address, txs, None
+    except Exception as e:
+        return address, None, str(e)
+
+
+def _init_worker(label_paths):
+    index = get_label_index()
+    for path in label_paths:
+        index.attach(LabelStore(path))
+
+
+def screen_transactions(address, transactions):
+    """Run the risk analysis for one address and summarize it as a JSON-able dict"""
+    result = {'address': address, 'transactions': len(transactions)}
+    df, exchange_txs, mixer_txs = analyze_transactions(transactions, address)
+    if df.empty:
+        return result
+    incoming = df['direction'] == 'in'
+    outgoing = df['direction'] == 'out'
+    flagged = df[df['risk_category'] != 'regular']
+    result.update({
+        'first_seen': df['timestamp'].min().isoformat(),
+        'last_seen': df['timestamp'].max().isoformat(),
+        'volume_in_eth': float(df.loc[incoming, 'value_eth'].sum()),
+        'volume_out_eth': float(df.loc[outgoing, 'value_eth'].sum()),
+        'mixer_hits': len(mixer_txs),
+        'mixer_in': int((mixer_txs['direction'] == 'in').sum()),
+        'mixer_out': int((mixer_txs['direction'] == 'out').sum()),
+        'mixer_volume_eth': float(mixer_txs['value_eth'].sum()),
+        'exchange_hits': len(exchange_txs),
+        'exchange_in': int((exchange_txs['direction'] == 'in').sum()),
+        'exchange_out': int((exchange_txs['direction'] == 'out').sum()),
+        'exchange_volume_eth': float(exchange_txs['value_eth'].sum()),
+        'risk_categories': flagged['risk_category'].value_counts().to_dict(),
+        'entities': sorted(flagged['entity'].dropna().unique().tolist()),
+    })
+    return result
+
+
+def screen(addresses, output, api_key=API_KEY, cache=None, http=None, concurrency=8, workers=None,
+           label_paths=(), report_every=10.0):
+    """Screen addresses, appending one JSON line per address to output as each finishes"""
+    workers = workers or os.cpu_count() or 1
+    started = time.monotonic()
+    last_report = started
+    screened = transactions = failed = 0
+    addresses = iter(addresses)
+
+    def report(final=False):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        print(f"[{'=' if final else '+'}] {screened} addresses ({failed} failed), {transactions} transactions "
+              f"in {elapsed:.1f}s: {screened / elapsed:.2f} addresses/s, {transactions / elapsed:.0f} tx/s",
+              file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as fetchers, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(list(label_paths),)) as analyzers:
+        fetching, analyzing = set(), set()
+        exhausted = False
+        while True:
+            # Keep fetches bounded, and stop fetching while analysis is backed up
+            while not exhausted and len(fetching) < concurrency and len(analyzing) < workers * 2:
+                address = next(addresses, None)
+                if address is None:
+                    exhausted = True
+                    break
+                fetching.add(fetchers.submit(fetch_history, address, api_key, cache, http))
+            if not fetching and not analyzing:
+                break
+            done, _ = wait(fetching | analyzing, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetching:
+                    fetching.discard(future)
+                    address, txs, error = future.result()
+                    if error is None:
+                        analyzing.add(analyzers.submit(screen_transactions, address, txs))
+                        continue
+                    result = {'address': address, 'error': error}
+                else:
+                    analyzing.discard(future)
+                    result = future.result()
+                screened += 1
+                failed += bool(result.get('error'))
+                get_metrics().count('addresses_screened', status='failed' if result.get('error') else 'ok')
+                transactions += result.get('transactions', 0)
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+            if time.monotonic() - last_report >= report_every:
+                report()
+                last_report = time.monotonic()
+    report(final=True)
+
+
+def main(argv=None):
+    """Bulk screening entry point (`crypto_tracker_v3.py screen`)"""
+    parser = argparse.ArgumentParser(prog='crypto_tracker_v3.py screen',
+                                     description='Screen many Ethereum addresses for mixer and exchange activity')
+    parser.add_argument('input', help="File with one address per line, or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-',
+                        help="JSONL file to append results to; re-running resumes after completed addresses "
+                             "(default: stdout)")
+    parser.add_argument('--api-key', default=API_KEY, help='Etherscan API key')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum number of histories fetched at once')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Analysis processes (default: number of CPUs)')
+    add_cache_arguments(parser)
+    add_http_arguments(parser)
+    add_label_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics_from_args(args)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    done = completed_addresses(args.output)
+    if done:
+        print(f"[+] Resuming: skipping {len(done)} addresses already in {args.output}", file=sys.stderr)
+    addresses = (a for a in read_addresses(args.input) if a.lower() not in done)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    if output is not sys.stdout and not _ends_with_newline(args.output):
+        output.write('\n')  # terminate a line cut off by an interrupted run
+    try:
+        screen(addresses, output, api_key=args.api_key, cache=cache_from_args(args),
+               http=http_from_args(args, pool_size=args.concurrency), concurrency=args.concurrency,
+               workers=args.workers, label_paths=args.labels)
+    except KeyboardInterrupt:
+        print("\n[!] Interrupted; re-run with the same --output to resume", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    report_metrics(args)
+
+
+if __name__ == '__main__':
+    main()
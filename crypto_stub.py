@@ -0,0 +1,525 @@
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from crypto_cache import TransactionCache
+from crypto_http import parse_rate
+from crypto_labels import EXCHANGE_ADDRESSES, MIXER_ADDRESSES
+from crypto_providers import RESULT_CAP
+
+GENESIS_TIME = 1438269973  # Ethereum block 0
+BLOCK_TIME = 12
+LATEST_BLOCK = 20000000
+# Stub tokens as (symbol, decimals, contract address)
+TOKENS = [
+    ('USDT', 6, '0xdac17f958d2ee523a2206206994597c13d831ec7'),
+    ('USDC', 6, '0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48'),
+    ('DAI', 18, '0x6b175474e89094c44da98b954eedeac495271d0f'),
+]
+
+
+def _digest(*parts):
+    return hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class SyntheticChain:
+    """Deterministic made-up histories for any address
+
+    Counterparties are drawn from a fixed pool of `addresses` so crawls keep
+    finding new but bounded neighbours, and `label_rate` of transfers go to a
+    known exchange or mixer so the risk analysis has work to do. The same seed
+    always produces the same histories.
+    """
+
+    def __init__(self, seed=0, addresses=1000, txs_per_address=50, label_rate=0.02, sizes=None):
+        self.seed = seed
+        self.pool = [self.address(i) for i in range(addresses)]
+        self.txs_per_address = txs_per_address
+        self.label_rate = label_rate
+        self.sizes = {address.lower(): count for address, count in (sizes or {}).items()}
+        self.labeled = list(EXCHANGE_ADDRESSES) + list(MIXER_ADDRESSES)
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def address(self, index):
+        """The index-th address of the pool, usable as a crawl root"""
+        return '0x' + _digest(self.seed, 'address', index)[:40]
+
+    def _counterparty(self, rng):
+        if rng.random() < self.label_rate:
+            return rng.choice(self.labeled)
+        return rng.choice(self.pool)
+
+    def txlist(self, address):
+        """Etherscan txlist rows for an address in ascending block order"""
+        address = address.lower()
+        with self._lock:
+            if address in self._histories:
+                return self._histories[address]
+        rng = random.Random(_digest(self.seed, address))
+        count = self.sizes.get(address, self.txs_per_address)
+        blocks = sorted(rng.randrange(1, LATEST_BLOCK) for _ in range(count))
+        rows = []
+        for i, block in enumerate(blocks):
+            counterparty = self._counterparty(rng)
+            sender, receiver = (address, counterparty) if rng.random() < 0.5 else (counterparty, address)
+            rows.append({
+                'blockNumber': str(block),
+                'timeStamp': str(GENESIS_TIME + block * BLOCK_TIME),
+                'hash': '0x' + _digest(self.seed, address, i),
+                'from': sender,
+                'to': receiver,
+                'value': str(rng.randrange(10 ** 15, 10 ** 20)),
+                'isError': '0',
+            })
+        with self._lock:
+            self._histories[address] = rows
+        return rows
+
+    def internal(self, address):
+        """Etherscan txlistinternal rows: about one in ten transactions also moves ETH through a contract"""
+        rows = []
+        for row in self.txlist(address):
+            digest = _digest(self.seed, 'internal', row['hash'])
+            if int(digest[:2], 16) >= 26:
+                continue
+            contract = self.pool[int(digest[2:10], 16) % len(self.pool)]
+            sender, receiver = (contract, address.lower()) if int(digest[10], 16) < 8 else (address.lower(), contract)
+            rows.append({
+                'blockNumber': row['blockNumber'],
+                'timeStamp': row['timeStamp'],
+                'hash': row['hash'],
+                'from': sender,
+                'to': receiver,
+                'value': str(int(digest[11:24], 16) * 10 ** 3),
+                'type': 'call',
+                'traceId': '0_1',
+                'isError': '0',
+            })
+        return rows
+
+    def tokens(self, address):
+        """Etherscan tokentx rows: about one in five transactions also emits a token transfer"""
+        rows = []
+        for row in self.txlist(address):
+            digest = _digest(self.seed, 'token', row['hash'])
+            if int(digest[:2], 16) >= 51:
+                continue
+            symbol, decimals, contract = TOKENS[int(digest[2], 16) % len(TOKENS)]
+            counterparty = self.pool[int(digest[3:11], 16) % len(self.pool)]
+            sender, receiver = (counterparty, address.lower()) if int(digest[11], 16) < 8 else \
+                (address.lower(), counterparty)
+            rows.append({
+                'blockNumber': row['blockNumber'],
+                'timeStamp': row['timeStamp'],
+                'hash': row['hash'],
+                'from': sender,
+                'to': receiver,
+                'value': str(int(digest[12:17], 16) * 10 ** decimals // 1000),
+                'contractAddress': contract,
+                'tokenName': symbol,
+                'tokenSymbol': symbol,
+                'tokenDecimal': str(decimals),
+                'logIndex': str(int(digest[20:22], 16)),
+            })
+        return rows
+
+    def block(self, number, txs_per_block=20):
+        """An eth_getBlockByNumber block with full transaction objects, or None past the chain head"""
+        if not 0 <= number <= LATEST_BLOCK:
+            return None
+        rng = random.Random(_digest(self.seed, 'block', number))
+        transactions = []
+        for i in range(rng.randrange(txs_per_block + 1)):
+            transactions.append({
+                # The hash carries its block and position so eth_getTransactionByHash can find it
+                'hash': f'0x{number:012x}{i:04x}' + _digest(self.seed, 'block', number, i)[:48],
+                'blockNumber': hex(number),
+                'transactionIndex': hex(i),
+                'from': self._counterparty(rng),
+                'to': self._counterparty(rng),
+                'value': hex(rng.randrange(10 ** 15, 10 ** 20)),
+                'input': '0x',
+            })
+        return {
+            'number': hex(number),
+            'hash': '0x' + _digest(self.seed, 'blockhash', number),
+            'timestamp': hex(GENESIS_TIME + number * BLOCK_TIME),
+            'transactions': transactions,
+        }
+
+    def transaction(self, tx_hash):
+        """The block transaction with this hash, or None"""
+        try:
+            number, i = int(tx_hash[2:14], 16), int(tx_hash[14:18], 16)
+        except (TypeError, ValueError):
+            return None
+        transactions = (self.block(number) or {}).get('transactions', [])
+        tx = transactions[i] if i < len(transactions) else None
+        return tx if tx and tx['hash'] == tx_hash else None
+
+    def full(self, address):
+        """BlockCypher addrs/{address}/full transactions in descending block order
+
+        About one in five transactions gets a second input from another pool
+        address, the way consolidating wallets spend several outputs at once.
+        """
+        txs = []
+        for row in reversed(self.txlist(address)):
+            value = int(row['value'])
+            inputs = [{'addresses': [row['from']], 'output_value': value}]
+            digest = _digest(self.seed, 'cosigner', row['hash'])
+            if int(digest[:2], 16) < 51:
+                inputs.append({'addresses': [self.pool[int(digest[2:10], 16) % len(self.pool)]],
+                               'output_value': int(digest[10:16], 16)})
+            txs.append({
+                'hash': row['hash'][2:],
+                'block_height': int(row['blockNumber']),
+                'confirmed': datetime.fromtimestamp(int(row['timeStamp']), timezone.utc)
+                .strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'inputs': inputs,
+                'outputs': [{'addresses': [row['to']], 'value': value}],
+            })
+        return txs
+
+
+class RecordedChain:
+    """Histories recorded earlier, from a fixture file or the local response cache
+
+    A fixture is a JSON object {"etherscan": {address: [txlist rows]},
+    "blockcypher": {address: [full transactions]}}, optionally with
+    "etherscan_internal" and "etherscan_tokens" holding txlistinternal and
+    tokentx rows. Addresses missing from the recording fall back to `fallback`
+    (usually a SyntheticChain), or are served as empty histories.
+    """
+
+    def __init__(self, etherscan=None, blockcypher=None, fallback=None, internal=None, tokens=None):
+        self.etherscan = {address.lower(): rows for address, rows in (etherscan or {}).items()}
+        self.etherscan_internal = {address.lower(): rows for address, rows in (internal or {}).items()}
+        self.etherscan_tokens = {address.lower(): rows for address, rows in (tokens or {}).items()}
+        self.blockcypher = dict(blockcypher or {})
+        self.fallback = fallback
+
+    @classmethod
+    def from_fixture(cls, path, fallback=None):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('etherscan'), data.get('blockcypher'), fallback, data.get('etherscan_internal'),
+                   data.get('etherscan_tokens'))
+
+    @classmethod
+    def from_cache(cls, cache_dir, fallback=None):
+        """Serve every history stored in a TransactionCache directory"""
+        cache = TransactionCache(cache_dir)
+        try:
+            etherscan, blockcypher = {}, {}
+            lists = {'normal': etherscan, 'internal': {}, 'token': {}}
+            for chain, address in cache.addresses():
+                if chain in ('eth', 'eth:recent'):
+                    etherscan.setdefault(address, {}).update(
+                        (tx['hash'], tx) for tx in cache.load(chain, address))
+                elif chain in ('eth:transfers', 'eth:recent-transfers'):
+                    for tx in cache.load(chain, address):
+                        lists[tx['kind']].setdefault(address, {})[tx['id']] = tx
+                elif chain in ('btc:recent', 'btc:full'):
+                    blockcypher.setdefault(address, {}).update(
+                        (tx['hash'], tx) for tx in cache.load(chain, address))
+        finally:
+            cache.close()
+        etherscan, internal, tokens = (
+            {address: sorted(txs.values(), key=lambda tx: int(tx['blockNumber'])) for address, txs in rows.items()}
+            for rows in (etherscan, lists['internal'], lists['token']))
+        blockcypher = {address: sorted(txs.values(), key=lambda tx: tx['block_height'], reverse=True)
+                       for address, txs in blockcypher.items()}
+        return cls(etherscan, blockcypher, fallback, internal, tokens)
+
+    def _recorded(self, rows, address, fallback):
+        rows = rows.get(address.lower())
+        if rows is None and self.fallback:
+            return getattr(self.fallback, fallback)(address)
+        return rows or []
+
+    def txlist(self, address):
+        return self._recorded(self.etherscan, address, 'txlist')
+
+    def internal(self, address):
+        return self._recorded(self.etherscan_internal, address, 'internal')
+
+    def tokens(self, address):
+        return self._recorded(self.etherscan_tokens, address, 'tokens')
+
+    def full(self, address):
+        txs = self.blockcypher.get(address)
+        if txs is None and self.fallback:
+            return self.fallback.full(address)
+        return txs or []
+
+    def block(self, number):
+        return self.fallback.block(number) if self.fallback else None
+
+    def transaction(self, tx_hash):
+        return self.fallback.transaction(tx_hash) if self.fallback else None
+
+
+class RateLimiter:
+    """Sliding one-second window of accepted requests"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.sent = deque()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        now = time.monotonic()
+        with self._lock:
+            while self.sent and now - self.sent[0] >= 1.0:
+                self.sent.popleft()
+            if len(self.sent) >= self.rate:
+                return False
+            self.sent.append(now)
+            return True
+
+
+# Etherscan account actions and the chain source method answering them
+ACCOUNT_ACTIONS = {'txlist': 'txlist', 'txlistinternal': 'internal', 'tokentx': 'tokens'}
+
+
+def _int(params, name, default):
+    try:
+        return int(params.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.count('bytes', len(data))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        if url.path == '/stats':
+            return self._send(200, self.server.snapshot())
+        if url.path == '/api':
+            provider = 'etherscan'
+        elif len(parts) == 6 and parts[:3] == ['v1', 'btc', 'main'] and parts[3] == 'addrs' and parts[5] == 'full':
+            provider = 'blockcypher'
+        else:
+            return self._send(404, {'error': f'Unknown endpoint {url.path}'})
+
+        self.server.count(f'{provider}_requests')
+        self.server.delay()
+        limiter = self.server.limiters.get(provider)
+        if limiter and not limiter.allow():
+            self.server.count(f'{provider}_throttled')
+            if provider == 'etherscan':
+                return self._send(200, {'status': '0', 'message': 'NOTOK', 'result': 'Max rate limit reached'})
+            return self._send(429, {'error': 'Limits reached.'}, {'Retry-After': '1'})
+        if provider == 'etherscan':
+            return self._send(200, self.txlist(params))
+        # addrs/{a};{b};.../full batches several addresses and answers with a list
+        addresses = parts[4].split(';')
+        self.server.count('blockcypher_addresses', len(addresses))
+        replies = [self.full(address, params) for address in addresses]
+        return self._send(200, replies if len(addresses) > 1 else replies[0])
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/rpc':
+            return self._send(404, {'error': f'Unknown endpoint {self.path}'})
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            return self._send(200, {'jsonrpc': '2.0', 'id': None,
+                                    'error': {'code': -32700, 'message': 'Parse error'}})
+        self.server.count('rpc_requests')
+        self.server.delay()
+        limiter = self.server.limiters.get('rpc')
+        if limiter and not limiter.allow():
+            self.server.count('rpc_throttled')
+            return self._send(429, {'error': 'Too many requests'}, {'Retry-After': '1'})
+        if isinstance(payload, list):
+            self.server.count('rpc_calls', len(payload))
+            return self._send(200, [self.rpc(request) for request in payload])
+        self.server.count('rpc_calls')
+        return self._send(200, self.rpc(payload))
+
+    def rpc(self, request):
+        """Answer one JSON-RPC call from the synthetic chain"""
+        method, params = request.get('method'), request.get('params') or []
+        reply = {'jsonrpc': '2.0', 'id': request.get('id')}
+        if method == 'eth_blockNumber':
+            reply['result'] = hex(LATEST_BLOCK)
+        elif method == 'eth_getBlockByNumber':
+            block = self.server.source.block(int(params[0], 16))
+            if block and (self.server.hashes_only or not params[1]):
+                block = {**block, 'transactions': [tx['hash'] for tx in block['transactions']]}
+            reply['result'] = block
+        elif method == 'eth_getTransactionByHash':
+            reply['result'] = self.server.source.transaction(params[0])
+        else:
+            reply['error'] = {'code': -32601, 'message': f'the method {method} does not exist/is not available'}
+        return reply
+
+    def txlist(self, params):
+        """Answer module=account&action=txlist (or txlistinternal, tokentx) the way Etherscan does"""
+        source = ACCOUNT_ACTIONS.get(params.get('action'))
+        if params.get('module') != 'account' or source is None:
+            return {'status': '0', 'message': 'NOTOK', 'result': 'Error! Missing Or invalid Action name'}
+        page, offset = _int(params, 'page', 1), _int(params, 'offset', RESULT_CAP)
+        if page * offset > RESULT_CAP:
+            return {'status': '0', 'message': 'NOTOK',
+                    'result': 'Result window is too large, PageNo x Offset size must be less than or equal to 10000'}
+        start, end = _int(params, 'startblock', 0), _int(params, 'endblock', LATEST_BLOCK)
+        rows = [row for row in getattr(self.server.source, source)(params.get('address', ''))
+                if start <= int(row['blockNumber']) <= end]
+        if params.get('sort') == 'desc':
+            rows.reverse()
+        rows = rows[(page - 1) * offset:page * offset]
+        if not rows:
+            return {'status': '0', 'message': 'No transactions found', 'result': []}
+        return {'status': '1', 'message': 'OK', 'result': rows}
+
+    def full(self, address, params):
+        """Answer addrs/{address}/full with BlockCypher's after/before/limit paging"""
+        after, before = _int(params, 'after', -1), _int(params, 'before', None)
+        limit = max(1, min(_int(params, 'limit', 10), 50))
+        history = self.server.source.full(address)
+        txs = [tx for tx in history
+               if tx.get('block_height', -1) > after and (before is None or tx.get('block_height', -1) < before)]
+        return {'address': address, 'n_tx': len(history), 'txs': txs[:limit], 'hasMore': len(txs) > limit}
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local stand-in for the Etherscan, BlockCypher and node JSON-RPC endpoints the trackers use
+
+    `latency` (plus up to `jitter`) seconds are added to every API response, and
+    `rate_limits` maps a provider to the requests per second it accepts before
+    answering the way that provider throttles. With `hashes_only` the JSON-RPC
+    endpoint returns blocks with bare transaction hashes, like nodes that do not
+    honour the full-transactions flag. Counters are exposed at /stats.
+    """
+
+    daemon_threads = True
+    # The default backlog of 5 drops connections from concurrent crawls, which
+    # then stall for a full TCP retransmit timeout
+    request_queue_size = 128
+
+    def __init__(self, source, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, rate_limits=None,
+                 hashes_only=False):
+        super().__init__((host, port), StubHandler)
+        self.source = source
+        self.hashes_only = hashes_only
+        self.latency = latency
+        self.jitter = jitter
+        self.limiters = {provider: RateLimiter(rate) for provider, rate in (rate_limits or {}).items() if rate}
+        self.counters = {}
+        self._counter_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def urls(self):
+        """Provider base URLs to hand to HttpClient(urls=...) or --api-url"""
+        return {'etherscan': f'{self.base_url}/api', 'blockcypher': f'{self.base_url}/v1/btc/main',
+                'rpc': f'{self.base_url}/rpc'}
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def count(self, name, amount=1):
+        with self._counter_lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._counter_lock:
+            return dict(self.counters)
+
+    def start(self):
+        """Serve from a background thread, for use inside benchmarks"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+def add_source_arguments(parser):
+    """Register the options selecting recorded or synthetic histories"""
+    parser.add_argument('--seed', type=int, default=0, help='Seed for synthetic histories')
+    parser.add_argument('--addresses', type=int, default=1000, help='Size of the synthetic address pool')
+    parser.add_argument('--txs-per-address', type=int, default=50, help='Transactions per synthetic address')
+    parser.add_argument('--fixture', help='JSON file of recorded responses to serve')
+    parser.add_argument('--from-cache', metavar='CACHE_DIR',
+                        help='Serve the histories recorded in a local response cache')
+
+
+def source_from_args(args, sizes=None):
+    """Build the history source selected on the command line"""
+    source = SyntheticChain(args.seed, args.addresses, args.txs_per_address, sizes=sizes)
+    if args.fixture:
+        source = RecordedChain.from_fixture(args.fixture, fallback=source)
+    if args.from_cache:
+        source = RecordedChain.from_cache(args.from_cache, fallback=source)
+    return source
+
+
+def main(argv=None):
+    """Offline API server entry point (`crypto_tracker_v3.py stub`)"""
+    parser = argparse.ArgumentParser(prog='crypto_tracker_v3.py stub',
+                                     description='Serve recorded or synthetic Etherscan/BlockCypher responses locally')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8545)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra random seconds per response')
+    parser.add_argument('--rate-limit', action='append', type=parse_rate, default=[], metavar='PROVIDER=RATE',
+                        help='Throttle a provider above this many requests per second (repeatable)')
+    parser.add_argument('--rpc-hashes-only', action='store_true',
+                        help='Return JSON-RPC blocks with bare transaction hashes')
+    add_source_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = StubServer(source_from_args(args), args.host, args.port, args.latency, args.jitter,
+                        dict(args.rate_limit), args.rpc_hashes_only)
+    flags = ' '.join(f'--api-url {provider}={url}' for provider, url in server.urls.items())
+    print(f"[+] Serving on {server.base_url} (stats at {server.base_url}/stats)", file=sys.stderr)
+    print(f"[+] Point the trackers at it with: {flags}", file=sys.stderr)
+    print(f"[+] Example root address: {SyntheticChain(args.seed, 1).address(0)}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import heapq
+import json
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from crypto_cache import add_cache_arguments, cache_from_args
+from crypto_core import BlockchainAnalyzer, parse_confirmed
+from crypto_graph import format_time
+from crypto_http import add_http_arguments, http_from_args
+from crypto_labels import add_label_arguments, labels_from_args
+from crypto_metrics import add_metrics_arguments, get_metrics, metrics_from_args, report_metrics
+from crypto_providers import add_provider_arguments, provider_from_args
+
+DEFAULT_TARGETS = ('mixer', 'exchange')
+FRONTIER_SHOWN = 10  # unexpanded addresses printed when the lookup budget runs out
+
+
+def transaction_edges(tx, address):
+    """Yield (counterparty, direction, value, timestamp, hash) for one transaction of an address
+
+    Outgoing edges carry the amount each receiver got; incoming edges carry the
+    amount the address received, attributed to every sender.
+    """
+    timestamp = parse_confirmed(tx.get('confirmed'))
+    senders = [(a, inp.get('output_value', 0)) for inp in tx.get('inputs', []) for a in inp.get('addresses') or []]
+    receivers = [(a, out.get('value', 0)) for out in tx.get('outputs', []) for a in out.get('addresses') or []]
+    if any(a == address for a, _ in senders):
+        for counterparty, value in receivers:
+            if counterparty != address:
+                yield counterparty, 'out', value, timestamp, tx['hash']
+    received = sum(value for a, value in receivers if a == address)
+    if received:
+        for counterparty, _ in senders:
+            if counterparty != address:
+                yield counterparty, 'in', received, timestamp, tx['hash']
+
+
+class PathTracer:
+    """Best-first search from an address toward labeled addresses
+
+    The search is a uniform-cost (Dijkstra) search over transfers. Every hop
+    costs 1, plus a value term that shrinks for large transfers and a recency
+    term that grows with age, so large recent flows are followed first and the
+    reported paths are the cheapest value-weighted ones. Only the addresses
+    popped from the queue are fetched, and the search stops once `paths`
+    distinct labeled targets have been reached or `max_calls` lookups were spent.
+    Labeled addresses end a path and are never expanded. Once the budget is
+    spent, the addresses the search would have looked up next are collected
+    in `frontier`, cheapest first.
+    """
+
+    def __init__(self, analyzer, targets=DEFAULT_TARGETS, direction='both', max_hops=3, paths=3,
+                 max_calls=200, value_weight=1.0, recency_weight=0.5, concurrency=4):
+        self.analyzer = analyzer
+        self.labels = analyzer.labels
+        self.targets = set(targets)
+        self.direction = direction
+        self.max_hops = max_hops
+        self.paths = paths
+        self.max_calls = max_calls
+        self.value_weight = value_weight
+        self.recency_weight = recency_weight
+        self.concurrency = max(1, concurrency)
+        self.calls = 0
+        self.frontier = []  # addresses left unexpanded when the lookup budget ran out, cheapest first
+        self.now = time.time()
+
+    def _normalize(self, address):
+        return address.lower() if self.analyzer.crypto_type == 'eth' else address
+
+    def edge_cost(self, value, timestamp, decimals=None):
+        graph = self.analyzer.graph
+        amount = graph.amount(value) if decimals is None else value / 10 ** decimals
+        cost = 1.0 + self.value_weight / (1.0 + math.log2(1.0 + max(amount, 0.0)))
+        if timestamp:
+            cost += self.recency_weight * min(1.0, max(0.0, self.now - timestamp) / (365 * 86400))
+        else:
+            cost += self.recency_weight
+        return cost
+
+    def _target(self, address):
+        label = self.labels.lookup(address)
+        if label and label[0] in self.targets:
+            return label
+        return None
+
+    def _edges(self, address, data):
+        """Cheapest edge to each counterparty of an address"""
+        best = {}
+        graph = self.analyzer.graph
+        for tx in (data or {}).get('txs', []):
+            asset, decimals = tx.get('asset', graph.currency), tx.get('decimals', graph.decimals)
+            for counterparty, direction, value, timestamp, tx_hash in transaction_edges(tx, address):
+                if self.direction != 'both' and direction != self.direction:
+                    continue
+                counterparty = self._normalize(counterparty)
+                cost = self.edge_cost(value, timestamp, decimals)
+                if counterparty not in best or cost < best[counterparty][0]:
+                    best[counterparty] = (cost, {'direction': direction, 'value': value, 'asset': asset,
+                                                 'decimals': decimals, 'timestamp': timestamp, 'hash': tx_hash})
+        return best
+
+    def _path(self, parent, address):
+        hops = []
+        while parent.get(address):
+            previous, edge = parent[address]
+            hops.append({'from': previous, 'to': address, **edge})
+            address = previous
+        return hops[::-1]
+
+    def trace(self, address):
+        """Return the cheapest paths to labeled addresses, cheapest first"""
+        metrics = get_metrics()
+        root = self._normalize(address)
+        best = {root: 0.0}
+        hops = {root: 0}
+        parent = {root: None}
+        fetched = {}
+        queue = [(0.0, root)]
+        found = []
+        unexpanded = set()
+        self.frontier = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while queue and len(found) < self.paths:
+                cost, current = heapq.heappop(queue)
+                if cost > best[current]:
+                    continue  # stale entry, a cheaper route was found later
+                label = self._target(current) if current != root else None
+                if label:
+                    found.append({'target': current, 'category': label[0], 'entity': label[1], 'cost': cost,
+                                  'hops': self._path(parent, current)})
+                    continue
+                if hops[current] >= self.max_hops:
+                    continue
+                left = self.max_calls - self.calls
+                if current not in fetched and left <= 0:
+                    # Out of lookups: keep draining the queue so reachable targets are still
+                    # reported, and record what would have been expanded next
+                    if not self.frontier:
+                        print(f"[!] API call budget of {self.max_calls} used up", file=sys.stderr)
+                    if current not in unexpanded:
+                        unexpanded.add(current)
+                        self.frontier.append({'address': current, 'cost': cost, 'hops': hops[current]})
+                    continue
+                # Fetch the next few unfetched candidates together, cheapest first, as far as the budget allows
+                batch = [current]
+                room = left - (current not in fetched)
+                while queue and len(batch) < self.concurrency and room > 0:
+                    next_cost, candidate = queue[0]
+                    if next_cost > best[candidate]:
+                        heapq.heappop(queue)
+                        continue
+                    if self._target(candidate) or hops[candidate] >= self.max_hops or candidate in fetched:
+                        break
+                    heapq.heappop(queue)
+                    batch.append(candidate)
+                    room -= 1
+                pending = [a for a in batch if a not in fetched]
+                self.calls += len(pending)
+                metrics.count('trace_lookups', len(pending))
+                size = self.analyzer.provider.batch_size
+                groups = [pending[i:i + size] for i in range(0, len(pending), size)]
+                for info in pool.map(self.analyzer.get_addresses_info, groups):
+                    fetched.update(info)
+                for expanded in batch:
+                    if expanded not in fetched:
+                        continue
+                    for counterparty, (step, edge) in self._edges(expanded, fetched[expanded]).items():
+                        total = best[expanded] + step
+                        if counterparty == root or total >= best.get(counterparty, math.inf):
+                            continue
+                        best[counterparty] = total
+                        hops[counterparty] = hops[expanded] + 1
+                        parent[counterparty] = (expanded, edge)
+                        heapq.heappush(queue, (total, counterparty))
+        metrics.gauge('trace_addresses_seen', len(best))
+        return found
+
+
+def print_paths(found, calls, frontier=()):
+    if frontier:
+        print("\n[!] Lookup budget spent; cheapest unexpanded addresses:")
+        for entry in frontier[:FRONTIER_SHOWN]:
+            print(f"  {entry['address']}  {entry['hops']} hop(s), cost {entry['cost']:.2f}")
+        if len(frontier) > FRONTIER_SHOWN:
+            print(f"  ... and {len(frontier) - FRONTIER_SHOWN} more")
+    if not found:
+        print(f"\n[-] No labeled address reached ({calls} lookups)")
+        return
+    print(f"\n[+] {len(found)} path(s) found with {calls} lookups")
+    for number, path in enumerate(found, 1):
+        print(f"\n#{number} {path['entity']} ({path['category']}) at {path['target']}: "
+              f"{len(path['hops'])} hop(s), cost {path['cost']:.2f}")
+        for hop in path['hops']:
+            arrow = '->' if hop['direction'] == 'out' else '<-'
+            near, far = hop['from'], hop['to']
+            print(f"  {near} {arrow} {far}  {hop['value'] / 10 ** hop['decimals']:.4f} {hop['asset']}  "
+                  f"{format_time(hop['timestamp'])}  tx {hop['hash']}")
+
+
+def main(argv=None):
+    """Path search entry point (`crypto_tracker_v3.py trace`)"""
+    parser = argparse.ArgumentParser(prog='crypto_tracker_v3.py trace',
+                                     description='Find the cheapest value-weighted paths from an address '
+                                                 'to known mixers or exchanges')
+    parser.add_argument('address', help='Address to start from')
+    parser.add_argument('--crypto', choices=['btc', 'eth'],
+                        help='Chain of the address (default: the chain of --provider or --index, else btc)')
+    parser.add_argument('--api-key', help='Etherscan API key (required for Ethereum)')
+    parser.add_argument('--targets', default=','.join(DEFAULT_TARGETS),
+                        help='Comma-separated label categories that end a path (default: mixer,exchange)')
+    parser.add_argument('--direction', choices=['both', 'out', 'in'], default='both',
+                        help='Follow outgoing funds, incoming funds or both')
+    parser.add_argument('--max-hops', type=int, default=3)
+    parser.add_argument('--paths', type=int, default=3, help='Stop after reaching this many labeled addresses')
+    parser.add_argument('--max-calls', type=int, default=200, help='Budget of address lookups')
+    parser.add_argument('--value-weight', type=float, default=1.0,
+                        help='How strongly small transfers are penalized')
+    parser.add_argument('--recency-weight', type=float, default=0.5,
+                        help='How strongly old transfers are penalized')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Lookups fetched together from the front of the queue')
+    parser.add_argument('--json', action='store_true', help='Print the paths as JSON')
+    add_provider_arguments(parser)
+    add_cache_arguments(parser)
+    add_http_arguments(parser)
+    add_label_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+
+    metrics_from_args(args)
+
+    http = http_from_args(args, pool_size=args.concurrency)
+    provider = provider_from_args(args, http, parser, args.concurrency)
+    args.crypto = provider.chain or args.crypto
+    if args.crypto == 'eth' and not args.api_key and provider.name == 'etherscan':
+        parser.error("Ethereum analysis requires --api-key")
+    analyzer = BlockchainAnalyzer(args.crypto, api_key=args.api_key, cache=cache_from_args(args), http=http,
+                                  labels=labels_from_args(args), provider=provider)
+    tracer = PathTracer(analyzer, targets=[t.strip() for t in args.targets.split(',') if t.strip()],
+                        direction=args.direction, max_hops=args.max_hops, paths=args.paths,
+                        max_calls=args.max_calls, value_weight=args.value_weight,
+                        recency_weight=args.recency_weight, concurrency=args.concurrency)
+    print(f"[+] Tracing {args.address} toward {args.targets} within {args.max_hops} hops", file=sys.stderr)
+    with get_metrics().stage('trace'):
+        found = tracer.trace(args.address)
+    if args.json:
+        print(json.dumps({'address': args.address, 'lookups': tracer.calls, 'paths': found,
+                          'frontier': tracer.frontier}, indent=2))
+    else:
+        print_paths(found, tracer.calls, tracer.frontier)
+    report_metrics(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,208 +1,91 @@
-import requests
-import networkx as nx
-from pyvis.network import Network
 import argparse
-import importlib.resources as pkg_resources
-from datetime import datetime
-from warnings import filterwarnings
+import contextlib
+import importlib
+import json
+import os
+import sys
 
-filterwarnings('ignore', category=requests.packages.urllib3.exceptions.InsecureRequestWarning)
+from crypto_cache import add_cache_arguments, cache_from_args
+from crypto_checkpoint import CrawlCheckpoint, add_checkpoint_arguments
+from crypto_cluster import add_cluster_arguments, clusters_from_args, collapse_clusters
+from crypto_core import (CRAWL_PARAMS, FAN_OUT, HUB_RECENT_TXS, HUB_TX_COUNT, HUB_WINDOW, BlockchainAnalyzer,
+                         CrawlBudget)
+from crypto_export import add_export_arguments, exporters_from_args
+from crypto_http import add_http_arguments, http_from_args
+from crypto_labels import add_label_arguments, labels_from_args
+from crypto_metrics import add_metrics_arguments, get_metrics, metrics_from_args, report_metrics
+from crypto_providers import add_provider_arguments, provider_from_args
+from crypto_queue import QueueFetcher, WorkQueue, add_queue_arguments
+from crypto_render import LARGE_GRAPH_EDGES, LEAF_THRESHOLD, add_legend, add_render_arguments, render_large_graph
 
-class BlockchainAnalyzer:
-    def __init__(self, crypto_type='btc', api_key=None):
-        """Initialize with configurable API endpoints"""
-        self.crypto_type = crypto_type
-        self.api_key = api_key
-        self.api_base = {
-            'btc': 'https://api.blockcypher.com/v1/btc/main',
-            'eth': 'https://api.etherscan.io/api'
-        }.get(crypto_type, 'btc')
-        self.node_counter = 0
-        self.node_map = {}
-        self.legend = []
+# Animates the edges of a clicked node; runs after pyvis has created `network` and `edges`
+HIGHLIGHT_SCRIPT = """
+<script>
+function highlightConnectedNodes(nodeId) {
+    // Reset all edges
+    edges.update(edges.getIds().map(function(edgeId) {
+        return {id: edgeId, dashes: true, color: {inherit: true}, width: 1};
+    }));
 
-    def _get_node_id(self, identifier, label_type):
-        """Create consistent node IDs with labels"""
-        if identifier not in self.node_map:
-            self.node_counter += 1
-            self.node_map[identifier] = self.node_counter
-            self.legend.append({
-                'id': self.node_counter,
-                'label': f"{self.node_counter}: {identifier[:6]}...{identifier[-4:]}",
-                'type': label_type
-            })
-        return self.node_map[identifier]
+    // Animate connected edges
+    network.getConnectedEdges(nodeId).forEach(function(edgeId) {
+        edges.update({
+            id: edgeId,
+            dashes: [5, 5],
+            color: {color: '#FFA500', highlight: '#FFA500'},
+            width: 3
+        });
+    });
+}
 
-    def get_address_info(self, address):
-        """Fetch address details from appropriate blockchain API"""
-        if self.crypto_type == 'eth':
-            params = {
-                'module': 'account',
-                'action': 'txlist',
-                'address': address,
-                'startblock': 0,
-                'endblock': 99999999,
-                'page': 1,
-                'offset': 10,
-                'sort': 'desc',
-                'apikey': self.api_key
-            }
-            try:
-                response = requests.get(self.api_base, params=params, verify=False)
-                response.raise_for_status()
-                data = response.json()
-                if data['status'] == '1':
-                    txs = []
-                    for tx in data['result']:
-                        converted_tx = {
-                            'hash': tx['hash'],
-                            'confirmed': datetime.fromtimestamp(int(tx['timeStamp'])).strftime("%Y-%m-%dT%H:%M:%SZ"),
-                            'block_height': tx['blockNumber'],
-                            'inputs': [{
-                                'addresses': [tx['from']],
-                                'output_value': int(tx['value'])
-                            }],
-                            'outputs': [{
-                                'addresses': [tx['to']],
-                                'value': int(tx['value'])
-                            }]
-                        }
-                        txs.append(converted_tx)
-                    return {'txs': txs}
-                else:
-                    print(f"Etherscan Error: {data['message']}")
-                    return None
-            except Exception as e:
-                print(f"API Error: {str(e)}")
-                return None
-        else:
-            url = f"{self.api_base}/addrs/{address}/full"
-            try:
-                response = requests.get(url, verify=False)
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                print(f"API Error: {str(e)}")
-                return None
-
-    def get_transaction_graph(self, address, depth=2):
-        """Build transaction graph with metadata"""
-        G = nx.DiGraph()
-        visited = set()
-
-        def process_transaction(tx, current_address, current_depth):
-            tx_id = self._get_node_id(tx['hash'], 'transaction')
-            
-            tx_time = "Unknown"
-            if 'confirmed' in tx:
-                try:
-                    tx_time = datetime.strptime(tx['confirmed'], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M")
-                except:
-                    tx_time = "Invalid timestamp"
-            
-            G.add_node(tx_id, 
-                      label=str(tx_id),
-                      title=f"TX: {tx['hash']}\nTime: {tx_time}\nBlock: {tx.get('block_height', 'N/A')}",
-                      color='yellow',
-                      shape='box')
+// Bind click event
+network.on("click", function(params) {
+    if (params.nodes.length > 0) {
+        highlightConnectedNodes(params.nodes[0]);
+    }
+});
+</script>
+"""
 
-            for inp in tx.get('inputs', []):
-                if inp.get('addresses'):
-                    sender = inp['addresses'][0]
-                    sender_id = self._get_node_id(sender, 'address')
-                    if self.crypto_type == 'btc':
-                        amount = inp.get('output_value', 0) / 1e8
-                        currency = 'BTC'
-                    else:
-                        amount = inp.get('output_value', 0) / 1e18
-                        currency = 'ETH'
-                    G.add_edge(sender_id, tx_id, 
-                              label=f"{amount:.4f} {currency}", 
-                              color='#FF0000',
-                              title=f"From: {sender}\nAmount: {amount:.4f} {currency}")
 
-            for out in tx.get('outputs', []):
-                if out.get('addresses'):
-                    receiver = out['addresses'][0]
-                    receiver_id = self._get_node_id(receiver, 'address')
-                    if self.crypto_type == 'btc':
-                        amount = out.get('value', 0) / 1e8
-                        currency = 'BTC'
-                    else:
-                        amount = out.get('value', 0) / 1e18
-                        currency = 'ETH'
-                    G.add_edge(tx_id, receiver_id, 
-                              label=f"{amount:.4f} {currency}", 
-                              color='#00FF00',
-                              title=f"To: {receiver}\nAmount: {amount:.4f} {currency}")
-
-        def recurse(current_address, current_depth):
-            if current_depth > depth or current_address in visited:
-                return
-            visited.add(current_address)
-
-            addr_id = self._get_node_id(current_address, 'address')
-            G.add_node(addr_id, 
-                      label=str(addr_id),
-                      title=f"Address: {current_address}",
-                      color='red' if current_depth == 0 else 'blue')
+class Visualizer:
+    @staticmethod
+    def plot_interactive(graph, legend, labels=None, large_threshold=LARGE_GRAPH_EDGES,
+                         leaf_threshold=LEAF_THRESHOLD, clusters=None):
+        """Create interactive visualization with animated connections
 
-            data = self.get_address_info(current_address)
-            if not data or 'txs' not in data:
+        With an address → cluster map, every multi-address cluster is drawn as one node.
+        """
+        try:
+            if clusters:
+                graph = collapse_clusters(graph, clusters, labels)
+                legend = graph.legend
+            if graph.edge_count > large_threshold:
+                # Precomputed layout and aggregation keep large graphs responsive
+                html = render_large_graph(graph, labels, leaf_threshold)
+                with get_metrics().stage('html_write'), open('transaction_graph.html', 'w', encoding='utf-8') as f:
+                    f.write(html)
+                print(f"\n[+] Large graph ({graph.edge_count} edges) saved to transaction_graph.html")
                 return
 
-            for tx in data['txs'][:5]:
-                try:
-                    process_transaction(tx, current_address, current_depth)
-                    if current_depth < depth:
-                        for inp in tx.get('inputs', []):
-                            if inp.get('addresses'):
-                                recurse(inp['addresses'][0], current_depth + 1)
-                        for out in tx.get('outputs', []):
-                            if out.get('addresses'):
-                                recurse(out['addresses'][0], current_depth + 1)
-                except Exception as e:
-                    print(f"Error processing transaction: {str(e)}")
-                    continue
-
-        recurse(address, 0)
-        return G, self.legend
+            # pyvis is only imported once a graph is actually drawn
+            from pyvis.network import Network
 
-class Visualizer:
-    @staticmethod
-    def plot_interactive(graph, legend):
-        """Create interactive visualization with animated connections"""
-        try:
             # Initialize network with physics and interaction settings
-            net = Network(height='800px', width='100%', directed=True, notebook=False)
+            net = Network(height='800px', width='100%', directed=True, notebook=False, cdn_resources='remote')
             
             # Add nodes with click event handlers
-            for node, attrs in graph.nodes(data=True):
+            for node, attrs in graph.node_attrs(labels):
                 net.add_node(node, **attrs)
                 
             # Add edges with animation properties
-            for source, target, attrs in graph.edges(data=True):
+            for source, target, attrs in graph.edge_attrs():
                 net.add_edge(source, target, 
                            **attrs,
                            dashes=True,  # Make edges dotted
                            smooth={'type': 'dynamic'})  # Enable smooth animation
 
-            # Add legend
-            legend_html = "<h3>Node Legend:</h3><ul>"
-            for item in legend:
-                legend_html += f"<li><b>{item['id']}</b>: {item['label']} ({item['type']})</li>"
-            legend_html += "</ul>"
-            
-            net.add_node("legend", 
-                        label="Node Legend",
-                        title=legend_html,
-                        color='#FFFFFF',
-                        shape='box',
-                        x=0,
-                        y=0,
-                        fixed=True)
-
-            # Inject custom JavaScript for node click interactions
+            # Configure visualization settings
             net.set_options("""
             {
               "nodes": {
@@ -239,74 +122,194 @@ class Visualizer:
             }
             """)
 
-            # Add custom JavaScript for animated connections
-            net.html = net.html.replace(
-                '</script>',
-                """
-                <script>
-                function highlightConnectedNodes(nodeId) {
-                    // Reset all edges
-                    edges.update({
-                        dashes: true,
-                        color: {inherit: true}
-                    });
-                    
-                    // Get connected edges
-                    var connectedEdges = network.getConnectedEdges(nodeId);
-                    
-                    // Animate connected edges
-                    connectedEdges.forEach(function(edgeId) {
-                        edges.update({
-                            id: edgeId,
-                            dashes: [5, 5],
-                            color: {color: '#FFA500', highlight: '#FFA500'},
-                            width: 3
-                        });
-                    });
-                }
-                
-                // Bind click event
-                network.on("click", function(params) {
-                    if (params.nodes.length > 0) {
-                        highlightConnectedNodes(params.nodes[0]);
-                    }
-                });
-                </script>
-                </script>
-                """
-            )
+            # Highlight the edges of a clicked node, and list every node below the graph
+            with get_metrics().stage('html_generate'):
+                page = net.generate_html()
+            page = add_legend(page.replace('</body>', HIGHLIGHT_SCRIPT + '</body>', 1), legend)
 
             # Save and display the visualization
-            net.save_graph('transaction_graph.html')
+            with get_metrics().stage('html_write'), open('transaction_graph.html', 'w', encoding='utf-8') as f:
+                f.write(page)
             print("\n[+] Interactive graph saved to transaction_graph.html")
             print("[+] Open transaction_graph.html in your browser to view the visualization")
 
         except Exception as e:
             print(f"Visualization error: {str(e)}")
 
-def main():
+
+# Subcommands dispatched before the address argument is parsed, mapped to the
+# module whose main(argv) implements them
+SUBCOMMANDS = {
+    'screen': 'crypto_screen',
+    'trace': 'crypto_trace',
+    'watch': 'crypto_watch',
+    'stub': 'crypto_stub',
+    'bench': 'crypto_bench',
+    'ingest': 'crypto_ingest',
+    'cluster': 'crypto_cluster',
+    'worker': 'crypto_queue',
+    'load': 'crypto_export',
+}
+
+
+def _crawl(args, analyzer, checkpoint, metrics, exporters=()):
+    """Run the crawl selected on the command line, returning the (optionally clustered) graph and legend
+
+    `exporters` stream the crawled graph, before any clustering, and are closed once it is complete.
+    """
+    print(f"\n[+] Analyzing {args.address} at depth {args.depth}")
+
+    try:
+        transaction_graph, legend = analyzer.get_transaction_graph(args.address, args.depth,
+                                                                   concurrency=args.concurrency)
+    except KeyboardInterrupt:
+        if not checkpoint:
+            raise
+        print(f"\n[!] Stopped; continue with --resume {checkpoint.path}", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        if analyzer.work_queue:
+            analyzer.work_queue.close()
+        if checkpoint:
+            checkpoint.close()
+    for exporter in exporters:
+        exporter.close(analyzer.labels)
+        print(f"\n[+] Graph exported to {exporter.path}")
+
+    pruned = analyzer.pruning_report()
+    if pruned:
+        print(f"\n[+] Crawl pruned after {analyzer.budget.calls} lookups:")
+        for line in pruned:
+            print(f"    - {line}")
+
+    clusters = clusters_from_args(args, transaction_graph)
+    if clusters:
+        # Collapse before printing so the legend matches the rendered node numbers
+        before = len(transaction_graph)
+        with metrics.stage('cluster_collapse'):
+            transaction_graph = collapse_clusters(transaction_graph, clusters, analyzer.labels)
+        legend = transaction_graph.legend
+        merged = sum(transaction_graph.cluster_sizes.values())
+        print(f"\n[+] {merged} addresses collapsed into {len(transaction_graph.cluster_sizes)} clusters: "
+              f"{before} -> {len(transaction_graph)} nodes")
+    return transaction_graph, legend
+
+
+def main(argv=None):
     """Main function with updated argument handling"""
-    parser = argparse.ArgumentParser(description='Enhanced Crypto Tracker')
-    parser.add_argument('address', help='Cryptocurrency address to analyze')
-    parser.add_argument('--crypto', choices=['btc', 'eth'], default='btc')
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in SUBCOMMANDS:
+        return importlib.import_module(SUBCOMMANDS[argv[0]]).main(argv[1:])
+
+    parser = argparse.ArgumentParser(description='Enhanced Crypto Tracker',
+                                     epilog=f"Subcommands: {', '.join(SUBCOMMANDS)} "
+                                            "(run '%(prog)s <subcommand> --help' for details)")
+    parser.add_argument('address', nargs='?', help='Cryptocurrency address to analyze (taken from --resume)')
+    parser.add_argument('--crypto', choices=['btc', 'eth'],
+                        help='Chain of the address (default: the chain of --provider or --index, else btc)')
     parser.add_argument('--depth', type=int, default=2)
     parser.add_argument('--api-key', help='Etherscan API key (required for Ethereum)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Maximum number of address lookups in flight per depth level')
+    parser.add_argument('--max-calls', type=int, help='Stop fetching after this many address lookups')
+    parser.add_argument('--max-time', type=float, help='Stop fetching after this many seconds')
+    parser.add_argument('--max-nodes', type=int, help='Stop growing the graph at this many nodes')
+    parser.add_argument('--fan-out', type=int, default=FAN_OUT,
+                        help='Highest-value transactions followed per expanded address')
+    parser.add_argument('--hub-window', type=float, default=HUB_WINDOW,
+                        help=f'Treat an address as a hub when its last {HUB_RECENT_TXS} transactions fall within '
+                             'this many seconds (0 disables)')
+    parser.add_argument('--hub-tx-count', type=int, default=HUB_TX_COUNT,
+                        help='Treat an address reporting at least this many transactions as a hub')
+    add_provider_arguments(parser)
+    add_cache_arguments(parser)
+    add_http_arguments(parser)
+    add_label_arguments(parser)
+    parser.add_argument('--no-render', action='store_true',
+                        help='Skip the HTML graph and print the crawled graph as JSON on stdout')
+    add_render_arguments(parser)
+    add_cluster_arguments(parser)
+    add_checkpoint_arguments(parser)
+    add_queue_arguments(parser)
+    add_export_arguments(parser)
+    add_metrics_arguments(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    metrics = metrics_from_args(args)
+
+    checkpoint = None
+    if args.resume:
+        if not os.path.exists(args.resume):
+            parser.error(f"checkpoint {args.resume} does not exist")
+        checkpoint = CrawlCheckpoint(args.resume)
+        params = checkpoint.params()
+        if params is None:
+            parser.error(f"{args.resume} holds no crawl to resume")
+        for name, value in params.items():
+            setattr(args, name, value)
+    elif args.checkpoint:
+        if os.path.exists(args.checkpoint):
+            parser.error(f"{args.checkpoint} already exists; continue it with --resume {args.checkpoint}")
+        checkpoint = CrawlCheckpoint(args.checkpoint)
+    if not args.address:
+        parser.error("the address argument is required unless resuming")
 
-    if args.crypto == 'eth' and not args.api_key:
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.fan_out < 1:
+        parser.error("--fan-out must be at least 1")
+
+    http = http_from_args(args, pool_size=args.concurrency)
+    provider = provider_from_args(args, http, parser, args.concurrency)
+    args.crypto = provider.chain or args.crypto
+    if args.crypto == 'eth' and not args.api_key and provider.name == 'etherscan':
         parser.error("Ethereum analysis requires --api-key")
+    analyzer = BlockchainAnalyzer(args.crypto, api_key=args.api_key, cache=cache_from_args(args), http=http,
+                                  labels=labels_from_args(args), provider=provider,
+                                  budget=CrawlBudget(args.max_calls, args.max_time, args.max_nodes),
+                                  fan_out=args.fan_out, hub_window=args.hub_window,
+                                  hub_tx_count=args.hub_tx_count, checkpoint=checkpoint)
+    params = {name: getattr(args, name) for name in CRAWL_PARAMS}
+    if checkpoint:
+        checkpoint.start(params)
+    if args.queue:
+        queue = WorkQueue(args.queue)
+        try:
+            queue.start(params)
+        except ValueError as e:
+            parser.error(f"{e}; delete it if its coordinator is no longer running")
+        analyzer.work_queue = QueueFetcher(queue, None if args.no_local_worker else analyzer.get_addresses_info,
+                                           provider.batch_size, args.concurrency)
+        print(f"[+] Distributing lookups through {args.queue}; start workers with "
+              f"'{sys.argv[0]} worker {args.queue}'", file=sys.stderr)
+    exporters = exporters_from_args(args, analyzer.graph, parser)
+    if args.no_render:
+        # Progress and errors go to stderr so stdout carries only the JSON document
+        with contextlib.redirect_stdout(sys.stderr):
+            transaction_graph, legend = _crawl(args, analyzer, checkpoint, metrics, exporters)
+        with metrics.stage('json_write'):
+            json.dump({
+                'address': args.address,
+                'crypto': args.crypto,
+                'depth': args.depth,
+                'lookups': analyzer.budget.calls,
+                'pruned': analyzer.pruned,
+                'graph': transaction_graph.to_dict(analyzer.labels),
+            }, sys.stdout)
+            print()
+        report_metrics(args)
+        return
+    transaction_graph, legend = _crawl(args, analyzer, checkpoint, metrics, exporters)
 
-    analyzer = BlockchainAnalyzer(args.crypto, api_key=args.api_key)
-    print(f"\n[+] Analyzing {args.address} at depth {args.depth}")
-    
-    transaction_graph, legend = analyzer.get_transaction_graph(args.address, args.depth)
-    
     print("\n[+] Generated Node Legend:")
     for item in legend:
         print(f"Node {item['id']}: {item['label']} ({item['type']})")
     
-    Visualizer.plot_interactive(transaction_graph, legend)
+    with metrics.stage('render'):
+        Visualizer.plot_interactive(transaction_graph, legend, analyzer.labels,
+                                    args.large_graph_threshold, args.leaf_threshold)
+    report_metrics(args)
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,251 @@
+import argparse
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from crypto_core import API_KEY, LATEST_BLOCK, analyze_transactions, fetch_txlist_page, iter_transfers
+from crypto_http import add_http_arguments, http_from_args
+from crypto_labels import add_label_arguments, labels_from_args
+from crypto_metrics import add_metrics_arguments, get_metrics, metrics_from_args, report_metrics
+from crypto_screen import read_addresses
+from crypto_providers import TRANSFER_ACTIONS
+
+SAVE_EVERY = 5.0  # seconds between state file writes
+
+
+class WatchState:
+    """Per-address block cursors, persisted as JSON so a restart resumes where it stopped
+
+    Cursors are set from the watcher's pool threads and saved from the main
+    thread, so both hold the lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.cursors = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.cursors = json.load(f).get('cursors', {})
+
+    def get(self, address):
+        with self._lock:
+            return self.cursors.get(address)
+
+    def set(self, address, block):
+        with self._lock:
+            self.cursors[address] = block
+            self.dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self.path or not self.dirty:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'cursors': self.cursors}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+
+class StdoutSink:
+    """Write each alert as one JSON line"""
+
+    def __init__(self, stream=sys.stdout):
+        self.stream = stream
+
+    def emit(self, alert):
+        self.stream.write(json.dumps(alert) + '\n')
+        self.stream.flush()
+
+
+class WebhookSink:
+    """POST each alert as JSON to a webhook URL"""
+
+    def __init__(self, url, http, timeout=10):
+        self.url = url
+        self.session = http.session
+        self.timeout = timeout
+
+    def emit(self, alert):
+        try:
+            response = self.session.post(self.url, json=alert, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Webhook error: {str(e)}", file=sys.stderr)
+
+
+class Watcher:
+    """Poll many addresses for new transactions and alert on flagged counterparties
+
+    Each address keeps a block cursor, so a poll only requests blocks after it;
+    an idle address costs one request per transfer list (normal, internal and
+    token) per interval whatever its history size.
+    Polls are spread evenly over the interval, and the interval is stretched
+    when the address count would exceed the provider rate limit.
+    """
+
+    def __init__(self, addresses, api_key=API_KEY, http=None, sinks=(), state=None, interval=300.0,
+                 concurrency=4, categories=None, backfill=False, actions=TRANSFER_ACTIONS):
+        self.addresses = [address.lower() for address in addresses]
+        self.api_key = api_key
+        self.http = http
+        self.sinks = list(sinks)
+        self.state = state or WatchState(None)
+        self.categories = set(categories) if categories else None
+        self.backfill = backfill
+        self.actions = tuple(actions)
+        self.concurrency = max(1, concurrency)
+        rate = http.buckets['etherscan'].max_rate if http else None
+        minimum = len(self.addresses) * len(self.actions) / rate if rate else 0
+        if interval < minimum:
+            print(f"[!] {len(self.addresses)} addresses need at least {minimum:.0f}s per round at "
+                  f"{rate:g} requests/s; using that interval", file=sys.stderr)
+        self.interval = max(interval, minimum)
+        self.polls = self.alerts = 0
+
+    def _flagged(self, df):
+        if self.categories is None:
+            return df[df['risk_category'] != 'regular']
+        return df[df['risk_category'].isin(self.categories)]
+
+    def poll(self, address):
+        """Fetch blocks past the address cursor and return (new transactions, alerts)"""
+        cursor = self.state.get(address)
+        if cursor is None and not self.backfill:
+            # Start watching from the latest transaction rather than alerting on history
+            latest = [int(row["blockNumber"]) for action in self.actions
+                      for row in fetch_txlist_page(address, self.api_key, 0, LATEST_BLOCK, 1, 1, self.http,
+                                                    sort="desc", action=action)]
+            self.state.set(address, max(latest, default=0))
+            return 0, []
+        startblock = 0 if cursor is None else cursor + 1
+        txs = [tx for batch in iter_transfers(address, self.api_key, startblock, self.http, self.actions)
+               for tx in batch]
+        if not txs:
+            if cursor is None:
+                self.state.set(address, 0)
+            return 0, []
+        self.state.set(address, max(int(tx["blockNumber"]) for tx in txs))
+        df, _, _ = analyze_transactions(txs, address)
+        seen_at = datetime.now(timezone.utc).isoformat()
+        alerts = [{
+            'seen_at': seen_at,
+            'address': address,
+            'hash': row['hash'],
+            'block': int(row['blockNumber']),
+            'timestamp': row['timestamp'].isoformat(),
+            'direction': row['direction'],
+            'counterparty': row['counterparty'],
+            'category': row['risk_category'],
+            'entity': row['entity'],
+            'kind': row['kind'],
+            'asset': row['asset'],
+            'amount': float(row['amount']),
+            'value_eth': float(row['value_eth']),
+        } for _, row in self._flagged(df).iterrows()]
+        return len(txs), alerts
+
+    def emit(self, alert):
+        self.alerts += 1
+        get_metrics().count('watch_alerts', category=alert['category'])
+        for sink in self.sinks:
+            sink.emit(alert)
+
+    def run(self, once=False):
+        """Poll until interrupted, or a single round when once is set"""
+        metrics = get_metrics()
+        start = time.monotonic()
+        spacing = 0 if once else self.interval / max(1, len(self.addresses))
+        schedule = [(start + i * spacing, i, address) for i, address in enumerate(self.addresses)]
+        heapq.heapify(schedule)
+        last_save = start
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            try:
+                while schedule or running:
+                    now = time.monotonic()
+                    while schedule and schedule[0][0] <= now and len(running) < self.concurrency:
+                        due, i, address = heapq.heappop(schedule)
+                        running[pool.submit(self.poll, address)] = (due, i, address)
+                    timeout = max(0.0, schedule[0][0] - now) if schedule else None
+                    if running:
+                        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    else:
+                        time.sleep(timeout)
+                        done = ()
+                    for future in done:
+                        due, i, address = running.pop(future)
+                        self.polls += 1
+                        metrics.count('watch_polls')
+                        try:
+                            new, alerts = future.result()
+                            metrics.count('watch_new_transactions', new)
+                            for alert in alerts:
+                                self.emit(alert)
+                        except Exception as e:
+                            print(f"Poll error for {address}: {str(e)}", file=sys.stderr)
+                        if not once:
+                            # Keep the even spacing, but never queue up missed rounds
+                            heapq.heappush(schedule, (max(due + self.interval, time.monotonic()), i, address))
+                    if time.monotonic() - last_save >= SAVE_EVERY:
+                        self.state.save()
+                        last_save = time.monotonic()
+            finally:
+                self.state.save()
+
+
+def main(argv=None):
+    """Watch mode entry point (`crypto_tracker_v3.py watch`)"""
+    parser = argparse.ArgumentParser(prog='crypto_tracker_v3.py watch',
+                                     description='Keep polling Ethereum addresses and alert on new mixer or '
+                                                 'exchange activity')
+    parser.add_argument('input', help="File with one address per line, or '-' for stdin")
+    parser.add_argument('--api-key', default=API_KEY, help='Etherscan API key')
+    parser.add_argument('--interval', type=float, default=300.0, help='Seconds between polls of the same address')
+    parser.add_argument('--state', default='watch_state.json',
+                        help='JSON file holding the per-address block cursors (default: watch_state.json)')
+    parser.add_argument('--categories',
+                        help='Comma-separated risk categories to alert on (default: anything not regular)')
+    parser.add_argument('--webhook', help='POST alerts as JSON to this URL as well as printing them')
+    parser.add_argument('--quiet', action='store_true', help='Do not print alerts to stdout')
+    parser.add_argument('--backfill', action='store_true',
+                        help='Alert on the full history of newly added addresses instead of starting at their '
+                             'latest transaction')
+    parser.add_argument('--once', action='store_true', help='Poll every address once and exit')
+    parser.add_argument('--concurrency', type=int, default=4, help='Polls in flight at once')
+    add_http_arguments(parser)
+    add_label_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    metrics_from_args(args)
+    labels_from_args(args)
+    http = http_from_args(args, pool_size=args.concurrency)
+    sinks = [] if args.quiet else [StdoutSink()]
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook, http))
+    categories = [c.strip() for c in args.categories.split(',') if c.strip()] if args.categories else None
+
+    watcher = Watcher(list(read_addresses(args.input)), args.api_key, http, sinks, WatchState(args.state),
+                      args.interval, args.concurrency, categories, args.backfill)
+    print(f"[+] Watching {len(watcher.addresses)} addresses every {watcher.interval:g}s "
+          f"(cursors in {args.state})", file=sys.stderr)
+    try:
+        watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        print("\n[!] Stopped; cursors saved, re-run to resume", file=sys.stderr)
+    print(f"[+] {watcher.polls} polls, {watcher.alerts} alerts", file=sys.stderr)
+    report_metrics(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import os
+import random
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto_providers import Provider  # noqa: E402
+
+
+def btc_tx(tx_hash, block, inputs, outputs, timestamp=1600000000):
+    """A BlockCypher-style transaction from [(address, value)] inputs and outputs"""
+    return {
+        'hash': tx_hash,
+        'block_height': block,
+        'confirmed': datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'inputs': [{'addresses': [address], 'output_value': value} for address, value in inputs],
+        'outputs': [{'addresses': [address], 'value': value} for address, value in outputs],
+    }
+
+
+def synthetic_histories(addresses=40, txs_per_address=8, seed=7):
+    """Deterministic BlockCypher-style histories over a small pool of addresses, newest first"""
+    rng = random.Random(seed)
+    pool = [f'addr{i:03d}' for i in range(addresses)]
+    histories = {address: [] for address in pool}
+    for number in range(addresses * txs_per_address // 2):
+        senders = rng.sample(pool, rng.choice((1, 1, 2)))
+        receivers = rng.sample([a for a in pool if a not in senders], 2)
+        block = 1000 + number
+        tx = btc_tx(f'tx{number:05d}', block,
+                    [(sender, rng.randrange(10 ** 6, 10 ** 9)) for sender in senders],
+                    [(receiver, rng.randrange(10 ** 6, 10 ** 9)) for receiver in receivers],
+                    timestamp=1600000000 + number * 86400)
+        for address in set(senders + receivers):
+            histories[address].append(tx)
+    return {address: txs[::-1] for address, txs in histories.items()}
+
+
+class FakeProvider(Provider):
+    """Serves fixed histories without any network access, counting lookups"""
+
+    name = 'fake'
+    chain = 'btc'
+    local = True
+
+    def __init__(self, histories, fail_after=None):
+        super().__init__(http=object())
+        self.histories = histories
+        self.fail_after = fail_after
+        self.lookups = 0
+
+    def fetch(self, address, cursor=None):
+        if self.fail_after is not None and self.lookups >= self.fail_after:
+            raise KeyboardInterrupt
+        self.lookups += 1
+        return {'txs': [dict(tx) for tx in self.histories.get(address, [])]}
+
+
+@pytest.fixture
+def histories():
+    return synthetic_histories()
@@ -0,0 +1,113 @@
+import sys
+
+import pytest
+
+pytest.importorskip('streamlit')
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import crypto_tracker_v7  # noqa: E402
+from crypto_stub import StubServer, SyntheticChain  # noqa: E402
+from crypto_tracker_v7 import (BUCKET_WIDTHS, PAGE_SIZE, bucket_width, downsample,  # noqa: E402
+                               timeline_buckets)
+
+
+@pytest.fixture
+def server():
+    chain = SyntheticChain(addresses=50, txs_per_address=20, label_rate=0.2)
+    chain.sizes[chain.address(0)] = 250
+    server = StubServer(chain).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def app(server, monkeypatch):
+    import streamlit as st
+
+    # The app reads its options from the command line after `--`
+    monkeypatch.setattr(sys, 'argv', ['crypto_tracker_v7.py', '--no-cache', '--max-retries', '0',
+                                      '--api-url', f"etherscan={server.urls['etherscan']}"])
+    st.cache_data.clear()
+    app = AppTest.from_file(crypto_tracker_v7.__file__, default_timeout=60)
+    app.run()
+    yield app
+    st.cache_data.clear()
+
+
+def analyze(app, address):
+    app.sidebar.text_input[0].input(address)
+    app.sidebar.text_input[1].input('test')
+    return app.sidebar.button[0].click().run()
+
+
+def test_reruns_and_repeated_queries_are_served_from_the_cache(app, server):
+    address = server.source.address(1)
+    analyze(app, address)
+    assert not app.exception and not app.error
+    requests = server.snapshot()['etherscan_requests']
+    assert requests and app.metric[0].value == str(len(server.source.txlist(address))
+                                                   + len(server.source.internal(address))
+                                                   + len(server.source.tokens(address)))
+
+    # Filtering only reruns the script, and asking for the same address again hits the cache
+    app.multiselect[0].unselect('regular').run()
+    analyze(app, address.upper().replace('0X', '0x'))
+    assert not app.exception
+    assert server.snapshot()['etherscan_requests'] == requests
+
+    analyze(app, server.source.address(2))
+    assert server.snapshot()['etherscan_requests'] > requests
+
+
+def test_history_is_sent_one_page_at_a_time(app, server):
+    analyze(app, server.source.address(0))
+    assert not app.exception
+    total = int(app.metric[0].value)
+    assert total > 2 * PAGE_SIZE
+    page = app.number_input(key='history_page')
+    assert page.max == -(-total // PAGE_SIZE)
+    history = app.dataframe[-1].value
+    assert len(history) == PAGE_SIZE
+
+    page.set_value(page.max).run()
+    history = app.dataframe[-1].value
+    assert len(history) == total - (page.max - 1) * PAGE_SIZE
+    assert not app.exception
+
+
+@pytest.fixture
+def transfers():
+    import pandas as pd
+
+    day = 86400
+    return pd.DataFrame({
+        'timeStamp': [0, 10, day - 1, day, day + 5, 3 * day],
+        'hash': [f'0x{i}' for i in range(6)],
+        'risk_category': ['regular', 'mixer', 'regular', 'regular', 'exchange', 'regular'],
+        'value_eth': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        'amount': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+    })
+
+
+def test_bucket_width_is_the_narrowest_that_fits():
+    assert bucket_width(0, 3600, buckets=200) == 60
+    assert bucket_width(0, 30 * 86400, buckets=200) == 6 * 3600
+    assert bucket_width(0, 200 * 86400, buckets=200) == 86400
+    assert bucket_width(0, 10 ** 12) == BUCKET_WIDTHS[-1]
+
+
+def test_timeline_buckets_sum_per_period_and_category(transfers):
+    buckets = timeline_buckets(transfers, 86400)
+    rows = {(row.bucket, row.risk_category): (row.transfers, row.volume_eth) for row in buckets.itertuples()}
+    assert rows == {(0, 'regular'): (2, 4.0), (0, 'mixer'): (1, 2.0), (86400, 'regular'): (1, 4.0),
+                    (86400, 'exchange'): (1, 5.0), (3 * 86400, 'regular'): (1, 6.0)}
+    assert buckets['transfers'].sum() == len(transfers)
+    assert str(buckets['timestamp'].iloc[-1]) == '1970-01-04 00:00:00'
+
+
+def test_downsample_keeps_the_largest_transfers_of_every_period(transfers):
+    sample = downsample(transfers, 86400, points=3)
+    # Three periods share three points: the largest transfer of each survives
+    assert sorted(sample['hash']) == ['0x2', '0x4', '0x5']
+    assert len(downsample(transfers, 86400, points=100)) == len(transfers)
@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import FakeProvider
+from crypto_checkpoint import CrawlCheckpoint
+from crypto_core import BlockchainAnalyzer
+
+
+def crawl(histories, checkpoint=None, fail_after=None):
+    provider = FakeProvider(histories, fail_after)
+    analyzer = BlockchainAnalyzer('btc', provider=provider, checkpoint=checkpoint)
+    graph, _ = analyzer.get_transaction_graph('addr000', depth=2, concurrency=1)
+    return graph, analyzer, provider
+
+
+@pytest.mark.parametrize('fail_after', [1, 5, 20])
+def test_resumed_crawl_numbers_nodes_like_an_uninterrupted_one(tmp_path, histories, fail_after):
+    expected, _, full = crawl(histories)
+    path = str(tmp_path / 'crawl.ckpt')
+
+    checkpoint = CrawlCheckpoint(path)
+    checkpoint.start({'address': 'addr000', 'depth': 2})
+    with pytest.raises(KeyboardInterrupt):
+        crawl(histories, checkpoint, fail_after)
+    checkpoint.close()
+
+    checkpoint = CrawlCheckpoint(path)
+    assert checkpoint.params() == {'address': 'addr000', 'depth': 2}
+    graph, analyzer, provider = crawl(histories, checkpoint)
+    checkpoint.close()
+    assert graph.to_dict() == expected.to_dict()
+    assert graph.keys == expected.keys
+    # Only the addresses the interrupted run had not fetched are looked up again
+    assert provider.lookups == full.lookups - fail_after
+    assert analyzer.budget.calls == full.lookups
+
+
+def test_finished_checkpoint_replays_without_lookups(tmp_path, histories):
+    path = str(tmp_path / 'crawl.ckpt')
+    checkpoint = CrawlCheckpoint(path)
+    expected, _, _ = crawl(histories, checkpoint)
+    checkpoint.close()
+
+    checkpoint = CrawlCheckpoint(path)
+    graph, _, provider = crawl(histories, checkpoint)
+    checkpoint.close()
+    assert provider.lookups == 0
+    assert graph.to_dict() == expected.to_dict()
+
+
+def test_checkpoint_holds_one_crawl(tmp_path):
+    checkpoint = CrawlCheckpoint(str(tmp_path / 'crawl.ckpt'))
+    checkpoint.start({'address': 'a', 'depth': 2})
+    checkpoint.close()
+    checkpoint = CrawlCheckpoint(str(tmp_path / 'crawl.ckpt'))
+    checkpoint.start({'address': 'a', 'depth': 2})
+    with pytest.raises(ValueError):
+        checkpoint.start({'address': 'b', 'depth': 2})
+    checkpoint.close()
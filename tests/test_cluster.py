@@ -0,0 +1,70 @@
+from crypto_cluster import AddressClusterer, UnionFind, cluster_index
+from crypto_index import AddressIndex
+
+from conftest import btc_tx
+
+
+def test_union_find_merges_sets():
+    sets = UnionFind(5)
+    assert sets.union(0, 1)
+    assert sets.union(3, 4)
+    assert not sets.union(1, 0)
+    assert sets.find(0) == sets.find(1)
+    assert sets.find(2) not in (sets.find(0), sets.find(3))
+    assert sets.add() == 5
+
+
+def test_common_inputs_join_one_cluster():
+    clusterer = AddressClusterer()
+    clusterer.add(['a', 'b'], ['x', 'y'])
+    clusterer.add(['c'], ['a'])
+    clusterer.add(['b', 'c'], ['z'])
+    clusterer.add(['d'], ['x'])
+    clusters = clusterer.clusters()
+    assert clusters['a'] == clusters['b'] == clusters['c'] == 0
+    # Receivers are never joined by common-input ownership
+    assert len({clusters['x'], clusters['y'], clusters['z'], clusters['d'], 0}) == 5
+    stats = clusterer.stats()
+    assert stats['clusters'] == 5
+    assert stats['largest'] == 3
+    assert stats['input_links'] == 2
+    assert stats['change_links'] == 0
+
+
+def test_clusters_are_numbered_by_first_appearance():
+    clusterer = AddressClusterer()
+    clusterer.add(['p'], ['q'])
+    clusterer.add(['r', 'p'], [])
+    assert clusterer.clusters() == {'p': 0, 'q': 1, 'r': 0}
+
+
+def test_multisig_inputs_join_all_their_addresses():
+    clusterer = AddressClusterer()
+    clusterer.add_transaction({'inputs': [{'addresses': ['m1', 'm2']}, {'addresses': ['s']}],
+                               'outputs': [{'addresses': ['out']}]})
+    clusters = clusterer.clusters()
+    assert clusters['m1'] == clusters['m2'] == clusters['s'] != clusters['out']
+
+
+def test_change_heuristic_joins_the_single_fresh_output():
+    clusterer = AddressClusterer(change=True)
+    clusterer.add(['shop'], ['payee'])
+    clusterer.add(['wallet'], ['payee', 'change1'])
+    # Two fresh outputs are ambiguous, and paying back to an input is no change output
+    clusterer.add(['other'], ['fresh1', 'fresh2'])
+    clusterer.add(['third'], ['third', 'fresh3'])
+    clusters = clusterer.clusters()
+    assert clusters['wallet'] == clusters['change1']
+    assert clusters['payee'] != clusters['wallet']
+    assert len({clusters['other'], clusters['fresh1'], clusters['fresh2']}) == 3
+    assert clusters['third'] != clusters['fresh3']
+    assert clusterer.stats()['change_links'] == 1
+
+
+def test_cluster_index_reads_transactions_in_block_order(tmp_path):
+    index = AddressIndex(str(tmp_path / 'btc.db'), 'btc')
+    index.add([btc_tx('t2', 11, [('b', 5), ('c', 5)], [('d', 9)]),
+               btc_tx('t1', 10, [('a', 5), ('b', 5)], [('c', 9)])])
+    clusters = cluster_index(index).clusters()
+    index.close()
+    assert clusters == {'a': 0, 'b': 0, 'c': 0, 'd': 1}
@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import FakeProvider, btc_tx
+from crypto_core import BlockchainAnalyzer, CrawlBudget
+from crypto_labels import LabelIndex
+
+
+def crawl(histories, depth=2, **options):
+    provider = FakeProvider(histories)
+    analyzer = BlockchainAnalyzer('btc', provider=provider, **options)
+    graph, _ = analyzer.get_transaction_graph('addr000', depth=depth, concurrency=2)
+    return analyzer, graph, provider
+
+
+def test_call_budget_caps_lookups(histories):
+    analyzer, graph, provider = crawl(histories, budget=CrawlBudget(max_calls=5))
+    assert provider.lookups == analyzer.budget.calls == 5
+    assert analyzer.pruned['max_calls'] > 0
+    assert any('call budget of 5 reached' in line for line in analyzer.pruning_report())
+
+
+@pytest.mark.parametrize('max_nodes', [10, 40])
+def test_node_budget_caps_the_graph(histories, max_nodes):
+    _, unlimited, _ = crawl(histories, fan_out=None)
+    analyzer, graph, provider = crawl(histories, fan_out=None, budget=CrawlBudget(max_nodes=max_nodes))
+    assert len(unlimited) > len(graph)
+    # A transaction is added whole once started, so the graph ends at most one transaction past the budget
+    assert len(graph) <= max_nodes + 5
+    assert analyzer.pruned['max_nodes'] > 0
+    assert any(f'node budget of {max_nodes} reached' in line for line in analyzer.pruning_report())
+
+
+def test_fan_out_follows_the_largest_transactions(histories):
+    analyzer, graph, _ = crawl(histories, depth=1, fan_out=2)
+    txs = histories['addr000']
+    largest = sorted(txs, key=lambda tx: sum(out['value'] for out in tx['outputs']), reverse=True)[:2]
+    followed = {key for key in graph.keys if key.startswith('tx')} & {tx['hash'] for tx in txs}
+    assert followed == {tx['hash'] for tx in largest}
+    assert analyzer.pruned['fan_out'] >= len(txs) - 2
+
+
+def test_hubs_and_labeled_addresses_are_terminal():
+    burst = [btc_tx(f'hub{i}', 200 + i, [('hub', 1000)], [(f'customer{i}', 1000)], timestamp=1600000000 + i * 60)
+             for i in range(12)]
+    histories = {
+        'addr000': [btc_tx('t1', 100, [('addr000', 500)], [('hub', 300), ('exchange', 200)])],
+        'hub': burst + [btc_tx('t1', 100, [('addr000', 500)], [('hub', 300), ('exchange', 200)])],
+    }
+    labels = LabelIndex([('exchange', 'exchange', 'Exchange')])
+    analyzer, graph, provider = crawl(histories, labels=labels)
+    assert analyzer.pruned['hubs'] == ['hub'] and analyzer.pruned['labeled'] == ['exchange']
+    assert provider.lookups == 2  # the root and the hub; the exchange is never looked up
+    assert 'customer0' not in graph
+    assert {'hub', 'exchange'} <= set(graph.keys)
@@ -0,0 +1,119 @@
+from array import array
+
+import pytest
+
+import crypto_graph
+from conftest import FakeProvider
+from crypto_cluster import cluster_graph, collapse_clusters
+from crypto_core import BlockchainAnalyzer
+from crypto_export import EXPORTERS, export_graph, exporter_for, load_graph
+from crypto_graph import ROLE_ROOT, TransactionGraph
+
+pytest.importorskip('pyarrow')
+
+FORMATS = ('.arrow', '.parquet', '.jsonl', '.jsonl.gz', '.graphml')
+
+
+@pytest.fixture
+def crawled(histories):
+    analyzer = BlockchainAnalyzer('btc', provider=FakeProvider(histories))
+    graph, _ = analyzer.get_transaction_graph('addr000', depth=2, concurrency=2)
+    return graph
+
+
+@pytest.fixture
+def token_graph():
+    graph = TransactionGraph('ETH', 18)
+    usdt = graph.asset('USDT', 6)
+    sender, receiver = graph.add_address('0xsender'), graph.add_address('0xreceiver')
+    graph.mark(sender, ROLE_ROOT)
+    transfer = graph.add_transaction('0xtransfer', 17000000, 1690000000)
+    token = graph.add_transaction('0xtoken:3', 17000001, 1690000012, usdt)
+    unconfirmed = graph.add_transaction('0xpending')
+    graph.add_edge(sender, transfer, 2 ** 70 + 1, 1690000000)
+    graph.add_edge(transfer, receiver, 2 ** 70 + 1, 1690000000)
+    graph.add_edge(sender, token, 5 * 10 ** 6, 1690000012)
+    graph.add_edge(token, receiver, 5 * 10 ** 6, 1690000012)
+    graph.add_edge(receiver, unconfirmed, 1)
+    graph.add_edge(unconfirmed, sender, 2 ** 200 + 3)
+    return graph
+
+
+def test_every_format_is_covered():
+    assert set(FORMATS) == set(EXPORTERS)
+
+
+@pytest.mark.parametrize('ext', FORMATS)
+def test_round_trip_of_a_crawl(tmp_path, crawled, ext):
+    path = str(tmp_path / f'graph{ext}')
+    export_graph(crawled, path)
+    assert load_graph(path).to_dict() == crawled.to_dict()
+
+
+@pytest.mark.parametrize('ext', FORMATS)
+def test_round_trip_keeps_assets_and_wide_values(tmp_path, token_graph, ext):
+    path = str(tmp_path / f'graph{ext}')
+    export_graph(token_graph, path)
+    loaded = load_graph(path)
+    assert loaded.assets == token_graph.assets
+    assert loaded.value(0) == 2 ** 70 + 1
+    assert loaded.value(5) == 2 ** 200 + 3
+    assert loaded.to_dict() == token_graph.to_dict()
+
+
+@pytest.mark.parametrize('ext', FORMATS)
+def test_round_trip_keeps_cluster_sizes(tmp_path, crawled, ext):
+    collapsed = collapse_clusters(crawled, cluster_graph(crawled).clusters())
+    assert collapsed.cluster_sizes
+    path = str(tmp_path / f'graph{ext}')
+    export_graph(collapsed, path)
+    assert load_graph(path).to_dict() == collapsed.to_dict()
+
+
+def stream(crawled, path):
+    """Export a copy of a graph while it is being rebuilt, edge by edge"""
+    graph = TransactionGraph('BTC', 8)
+    exporter = exporter_for(path).attach(graph)
+    for node_id in range(1, len(crawled) + 1):
+        index = node_id - 1
+        graph.node_id(crawled.keys[index], crawled.kinds[index], crawled.blocks[index], crawled.times[index])
+        graph.mark(node_id, crawled.roles[index])
+    for edge in range(crawled.edge_count):
+        graph.add_edge(crawled.sources[edge], crawled.targets[edge], crawled.value(edge), crawled.edge_times[edge])
+    exporter.close()
+
+
+@pytest.mark.parametrize('ext', FORMATS)
+def test_streamed_export_matches_a_finished_one(tmp_path, crawled, monkeypatch, ext):
+    monkeypatch.setattr(crypto_graph, 'LISTENER_CHUNK', 7)
+    stream(crawled, str(tmp_path / f'streamed{ext}'))
+    assert load_graph(str(tmp_path / f'streamed{ext}')).to_dict() == crawled.to_dict()
+
+
+@pytest.mark.parametrize('chunk', [7, 10 ** 6])
+def test_arrow_reload_is_memory_mapped(tmp_path, crawled, monkeypatch, chunk):
+    import pyarrow as pa
+
+    monkeypatch.setattr(crypto_graph, 'LISTENER_CHUNK', chunk)
+    path = str(tmp_path / 'graph.arrow')
+    stream(crawled, path)
+    allocated = pa.total_allocated_bytes()
+    loaded = load_graph(path)
+    # The columns are views of the mapped file, not copies
+    assert pa.total_allocated_bytes() - allocated < crawled.edge_count * 8
+    assert not isinstance(loaded.sources, array)
+    assert not isinstance(loaded.kinds, array)
+    assert list(loaded.sources) == list(crawled.sources)
+    assert loaded.sources[-1] == crawled.sources[-1]
+    assert list(loaded.values_lo[3:40:3]) == list(crawled.values_lo[3:40:3])
+    assert loaded.to_dict() == crawled.to_dict()
+    # Reloaded graphs can still be clustered and re-exported
+    collapsed = collapse_clusters(loaded, cluster_graph(loaded).clusters())
+    assert collapsed.to_dict() == collapse_clusters(crawled, cluster_graph(crawled).clusters()).to_dict()
+    export_graph(loaded, str(tmp_path / 'copy.jsonl'))
+    assert load_graph(str(tmp_path / 'copy.jsonl')).to_dict() == crawled.to_dict()
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        load_graph(str(tmp_path / 'graph.csv'))
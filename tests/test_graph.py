@@ -0,0 +1,68 @@
+from crypto_core import add_transfers
+from crypto_graph import LISTENER_CHUNK, TRANSACTION, TransactionGraph
+
+
+def test_values_above_64_bits_are_exact():
+    graph = TransactionGraph('ETH', 18)
+    sender = graph.add_address('0xsender')
+    tx = graph.add_transaction('0xhash', 100, 1600000000)
+    receiver = graph.add_address('0xreceiver')
+    huge = 2 ** 64 + 12345
+    whale = 123456789 * 10 ** 18 + 1  # more wei than 64 bits hold, down to the last unit
+    graph.add_edge(sender, tx, huge)
+    graph.add_edge(tx, receiver, whale)
+    graph.add_edge(tx, sender, 2 ** 64 - 1)
+    assert graph.value(0) == huge
+    assert graph.value(1) == whale
+    assert graph.value(2) == 2 ** 64 - 1
+    edges = graph.to_dict()['edges']
+    assert [edge['value'] for edge in edges] == [str(huge), str(whale), str(2 ** 64 - 1)]
+
+
+def test_uint256_values_are_exact():
+    graph = TransactionGraph('ETH', 18)
+    spam = graph.asset('SPAM', 18)
+    sender, receiver = graph.add_address('0xsender'), graph.add_address('0xreceiver')
+    tx = graph.add_transaction('0xspam:0', 100, 1600000000, spam)
+    for value in (2 ** 200 + 7, 2 ** 256 - 1, 2 ** 128, 2 ** 128 - 1):
+        graph.add_edge(sender, tx, value)
+        graph.add_edge(tx, receiver, value)
+    assert [graph.value(edge) for edge in range(graph.edge_count)] == \
+        [2 ** 200 + 7] * 2 + [2 ** 256 - 1] * 2 + [2 ** 128] * 2 + [2 ** 128 - 1] * 2
+    assert sorted(graph.wide_values) == [0, 1, 2, 3, 4, 5]
+
+
+def test_token_transfers_beyond_128_bits_get_their_edges():
+    graph = TransactionGraph('ETH', 18)
+    add_transfers(graph, [{'hash': '0xspam', 'id': '0xspam:0', 'from': '0xA', 'to': '0xB', 'value': str(2 ** 200),
+                           'timeStamp': '1600000000', 'blockNumber': '100', 'asset': 'SPAM', 'decimals': 18}], '0xa')
+    assert graph.edge_count == 2
+    assert [edge['value'] for edge in graph.to_dict()['edges']] == [str(2 ** 200)] * 2
+
+
+def test_node_ids_are_interned_in_order():
+    graph = TransactionGraph('BTC', 8)
+    assert graph.add_address('a') == 1
+    assert graph.add_transaction('t', 5) == 2
+    assert graph.add_address('a') == 1
+    assert len(graph) == 2
+    assert graph.kinds[1] == TRANSACTION
+    assert graph.blocks[1] == 5
+
+
+def test_listeners_see_every_edge_once():
+    class Recorder:
+        def __init__(self):
+            self.ranges = []
+
+        def on_edges(self, graph, start, stop):
+            self.ranges.append((start, stop))
+
+    graph = TransactionGraph()
+    recorder = Recorder()
+    graph.listeners.append(recorder)
+    a, b = graph.add_address('a'), graph.add_transaction('t')
+    for _ in range(LISTENER_CHUNK + 10):
+        graph.add_edge(a, b, 1)
+    graph.notify()
+    assert recorder.ranges == [(0, LISTENER_CHUNK), (LISTENER_CHUNK, LISTENER_CHUNK + 10)]
@@ -0,0 +1,53 @@
+import argparse
+
+import pytest
+
+from crypto_http import HttpClient, TokenBucket, add_http_arguments, http_from_args
+
+
+@pytest.fixture
+def parser():
+    parser = argparse.ArgumentParser()
+    add_http_arguments(parser)
+    return parser
+
+
+def test_rate_limits_and_retries_are_parsed(parser):
+    args = parser.parse_args(['--rate-limit', 'etherscan=2.5', '--max-retries', '0',
+                              '--api-url', 'rpc=http://127.0.0.1:8545/rpc/'])
+    http = http_from_args(args)
+    assert http.buckets['etherscan'].rate == 2.5
+    assert http.max_retries == 0
+    assert http.urls['rpc'] == 'http://127.0.0.1:8545/rpc'
+
+
+def test_bad_values_get_specific_messages(parser, capsys):
+    for argv, message in ((['--api-url', 'nobody=x'], 'expected PROVIDER=URL'),
+                          (['--rate-limit', 'etherscan=0'], 'must be above 0'),
+                          (['--max-retries', 'many'], "invalid retry count 'many'")):
+        with pytest.raises(SystemExit):
+            parser.parse_args(argv)
+        assert message in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('argv', [
+    ['--rate-limit', 'etherscan=0'],
+    ['--rate-limit', 'etherscan=-1'],
+    ['--rate-limit', 'etherscan=fast'],
+    ['--rate-limit', 'nobody=1'],
+    ['--max-retries', '-1'],
+    ['--max-retries', 'many'],
+    ['--api-url', 'nobody=http://127.0.0.1/api'],
+    ['--api-url', 'etherscan='],
+    ['--api-url', 'etherscan=127.0.0.1/api'],
+])
+def test_bad_values_are_usage_errors(parser, argv):
+    with pytest.raises(SystemExit):
+        parser.parse_args(argv)
+
+
+def test_bad_values_are_rejected_without_the_parser():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+    with pytest.raises(ValueError):
+        HttpClient(max_retries=-1)
@@ -0,0 +1,95 @@
+import pytest
+
+from conftest import FakeProvider, btc_tx, synthetic_histories
+from crypto_core import BlockchainAnalyzer
+from crypto_index import AddressIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = AddressIndex(str(tmp_path / 'index.db'), 'btc')
+    yield index
+    index.close()
+
+
+def sample_txs():
+    return [
+        btc_tx('t1', 10, [('alice', 50)], [('bob', 30), ('alice', 19)]),
+        btc_tx('t2', 12, [('bob', 30)], [('carol', 29)]),
+        btc_tx('t3', 15, [('alice', 10), ('alice', 9)], [('carol', 18)]),
+    ]
+
+
+def test_ingest_then_lookup(index):
+    assert index.add(sample_txs()) == 3
+    assert [tx['hash'] for tx in index.transactions('alice')] == ['t3', 't1']
+    assert [tx['hash'] for tx in index.transactions('alice', descending=False)] == ['t1', 't3']
+    assert [tx['hash'] for tx in index.transactions('carol', after=12)] == ['t3']
+    assert index.transactions('nobody') == []
+    assert index.count('alice') == 2
+    assert index.count('bob') == 2
+
+
+def test_one_posting_per_address_and_direction(index):
+    index.add(sample_txs())
+    assert index.postings('alice') == [(10, 't1', 'in', 19, 'alice'), (10, 't1', 'out', 50, 'bob'),
+                                       (15, 't3', 'out', 19, 'carol')]
+    assert index.postings('bob', after=10) == [(12, 't2', 'out', 30, 'carol')]
+    wide = btc_tx('wide', 20, [(f'in{i}', 1) for i in range(100)], [(f'out{i}', 1) for i in range(100)])
+    before = index.stats()['postings']
+    index.add([wide])
+    assert index.stats()['postings'] - before == 200
+    # Many addresses on the other side: the counterparties are read from the transaction
+    assert index.postings('in7') == [(20, 'wide', 'out', 1, None)]
+    assert index.postings('carol') == [(12, 't2', 'in', 29, 'bob'), (15, 't3', 'in', 18, 'alice')]
+
+
+def test_reingesting_is_harmless(index):
+    index.add(sample_txs())
+    assert index.add(sample_txs()) == 0
+    assert index.stats()['transactions'] == 3
+    assert index.count('alice') == 2
+
+
+def test_unconfirmed_transactions_are_skipped(index):
+    assert index.add([btc_tx('pending', -1, [('alice', 1)], [('bob', 1)])]) == 0
+    assert index.transactions('alice') == []
+
+
+def test_ranges_merge(index):
+    index.add_range(0, 99)
+    index.add_range(200, 299)
+    index.add_range(100, 149)
+    assert index.ranges() == [(0, 149), (200, 299)]
+    assert index.last_block() == 299
+
+
+def test_batches_and_scan_cover_everything(index):
+    index.add(sample_txs())
+    assert [[tx['hash'] for tx in batch] for batch in index.iter_batches('alice', batch_size=1)] == [['t1'], ['t3']]
+    assert [tx['hash'] for batch in index.scan(batch_size=2) for tx in batch] == ['t1', 't2', 't3']
+
+
+def test_chain_is_checked(tmp_path):
+    AddressIndex(str(tmp_path / 'index.db'), 'btc').close()
+    with pytest.raises(ValueError):
+        AddressIndex(str(tmp_path / 'index.db'), 'eth')
+
+
+def test_eth_addresses_are_case_insensitive(tmp_path):
+    index = AddressIndex(str(tmp_path / 'eth.db'), 'eth')
+    index.add([btc_tx('0xh', 5, [('0xABC', 1)], [('0xDEF', 1)])])
+    assert [tx['hash'] for tx in index.transactions('0xabc')] == ['0xh']
+    assert index.postings('0xAbc') == [(5, '0xh', 'out', 1, '0xdef')]
+    index.close()
+
+
+def test_index_answers_a_crawl_like_the_provider(tmp_path):
+    histories = synthetic_histories()
+    index = AddressIndex(str(tmp_path / 'index.db'), 'btc')
+    index.add([tx for txs in histories.values() for tx in txs])
+    from_index = {address: index.transactions(address) for address in histories}
+    index.close()
+    expected, _ = BlockchainAnalyzer('btc', provider=FakeProvider(histories)).get_transaction_graph('addr000')
+    graph, _ = BlockchainAnalyzer('btc', provider=FakeProvider(from_index)).get_transaction_graph('addr000')
+    assert graph.to_dict() == expected.to_dict()
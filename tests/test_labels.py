@@ -0,0 +1,65 @@
+import csv
+
+import pytest
+
+from crypto_labels import LabelStore, address_key, build_label_store
+
+
+def write_labels(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['address', 'category', 'entity'])
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path):
+    rows = [(f'0x{i:040x}', 'exchange' if i % 2 else 'mixer', f'Entity {i % 7}') for i in range(1, 501)]
+    rows.append(('bc1qEXAMPLEmixer0000000000000000000000000', 'mixer', 'Wasabi'))
+    rows.append(('1BoatSLRHtKNngkdXEeobR76b53LETtpyT', 'scam', 'Boat'))
+    source = write_labels(tmp_path / 'labels.csv', rows)
+    path = str(tmp_path / 'labels.store')
+    assert build_label_store([source], path) == len(rows)
+    store = LabelStore(path)
+    yield store
+    store.close()
+
+
+def test_lookup_finds_every_label(store):
+    assert len(store) == 502
+    assert store.lookup(f'0x{1:040x}') == ('exchange', 'Entity 1')
+    assert store.lookup(f'0x{14:040x}') == ('mixer', 'Entity 0')
+    assert store.lookup('1BoatSLRHtKNngkdXEeobR76b53LETtpyT') == ('scam', 'Boat')
+
+
+def test_lookup_normalizes_case(store):
+    assert store.lookup(f'0x{255:040X}') == ('exchange', 'Entity 3')
+    assert store.lookup('BC1QexampleMIXER0000000000000000000000000') == ('mixer', 'Wasabi')
+    # Base58 addresses are case-sensitive
+    assert store.lookup('1boatslrhtknngkdxeeobr76b53lettpyt') is None
+
+
+def test_unknown_addresses_miss(store):
+    unknown = [f'0x{i:040x}' for i in range(10000, 12000)]
+    assert not any(address in store for address in unknown)
+    # The Bloom filter answers nearly all misses without touching the records
+    passed = sum(store._maybe_contains(address_key(address)) for address in unknown)
+    assert passed < len(unknown) * 0.05
+
+
+def test_later_sources_override_earlier_ones(tmp_path):
+    first = write_labels(tmp_path / 'first.csv', [('0x' + '1' * 40, 'exchange', 'Old')])
+    second = write_labels(tmp_path / 'second.csv', [('0x' + '1' * 40, 'mixer', 'New')])
+    path = str(tmp_path / 'labels.store')
+    assert build_label_store([first, second], path) == 1
+    store = LabelStore(path)
+    assert store.lookup('0x' + '1' * 40) == ('mixer', 'New')
+    store.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'not-a-store'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        LabelStore(str(path))
@@ -0,0 +1,80 @@
+import argparse
+import json
+
+import pytest
+
+import crypto_metrics
+from crypto_core import iter_transaction_batches
+from crypto_http import HttpClient
+from crypto_metrics import (Metrics, NullMetrics, add_metrics_arguments, get_metrics, metrics_from_args,
+                            report_metrics)
+from crypto_stub import StubServer, SyntheticChain
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(crypto_metrics, '_metrics', metrics)
+    return metrics
+
+
+def test_series_are_exported_as_json_and_prometheus(metrics):
+    with metrics.stage('fetch'):
+        pass
+    with metrics.stage('fetch'):
+        pass
+    metrics.count('api_requests', provider='etherscan', status=200)
+    metrics.count('api_requests', 2, provider='etherscan', status=200)
+    metrics.gauge('graph_nodes', 42)
+    for seconds in (0.001, 0.2, 30):
+        metrics.observe('api_latency_seconds', seconds, provider='etherscan')
+
+    snapshot = json.loads(json.dumps(metrics.snapshot()))
+    assert snapshot['stages']['fetch']['calls'] == 2
+    assert snapshot['counters'] == [{'name': 'api_requests', 'labels': {'provider': 'etherscan', 'status': 200},
+                                     'value': 3}]
+    assert snapshot['gauges'][0]['value'] == 42
+    buckets = snapshot['histograms'][0]['value']['buckets']
+    assert (buckets['0.005'], buckets['0.25'], buckets['10.0'], buckets['+Inf']) == (1, 2, 2, 3)
+
+    text = metrics.to_prometheus()
+    assert 'crypto_tracker_stage_calls_total{stage="fetch"} 2' in text
+    assert 'crypto_tracker_api_requests_total{provider="etherscan",status="200"} 3' in text
+    assert 'crypto_tracker_graph_nodes 42' in text
+    assert 'crypto_tracker_api_latency_seconds_bucket{provider="etherscan",le="+Inf"} 3' in text
+    assert text.count('# TYPE crypto_tracker_api_latency_seconds histogram') == 1
+
+
+def test_profiling_is_off_unless_asked_for(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(crypto_metrics, '_metrics', NullMetrics())
+    parser = argparse.ArgumentParser()
+    add_metrics_arguments(parser)
+    assert not metrics_from_args(parser.parse_args([])).enabled
+
+    args = parser.parse_args(['--metrics-json', str(tmp_path / 'profile.json'),
+                              '--metrics-prom', str(tmp_path / 'profile.prom')])
+    metrics = metrics_from_args(args)
+    assert metrics.enabled and get_metrics() is metrics
+    metrics.count('addresses_screened', status='ok')
+    report_metrics(args)
+    assert 'addresses_screened[status=ok]' in capsys.readouterr().err
+    assert json.loads((tmp_path / 'profile.json').read_text())['counters'][0]['value'] == 1
+    assert 'crypto_tracker_addresses_screened_total{status="ok"} 1' in (tmp_path / 'profile.prom').read_text()
+
+
+def test_api_calls_are_counted(metrics):
+    chain = SyntheticChain(addresses=20, txs_per_address=10)
+    server = StubServer(chain).start()
+    try:
+        http = HttpClient(urls=server.urls, max_retries=0)
+        for _ in iter_transaction_batches(chain.address(0), 'test', http=http):
+            pass
+    finally:
+        server.stop()
+    counters = {(item['name'], tuple(sorted(item['labels'].items()))): item['value']
+                for item in metrics.snapshot()['counters']}
+    requests = counters[('api_requests', (('provider', 'etherscan'), ('status', 200)))]
+    assert requests == server.snapshot()['etherscan_requests']
+    assert counters[('api_bytes', (('provider', 'etherscan'),))] == server.snapshot()['bytes']
+    latency, = metrics.snapshot()['histograms']
+    assert latency['value']['count'] == requests
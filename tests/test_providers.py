@@ -0,0 +1,137 @@
+import argparse
+
+import pytest
+
+from crypto_http import HttpClient
+from crypto_providers import (BlockCypherProvider, EtherscanProvider, JsonRpcProvider, ProviderError,
+                              add_provider_arguments, make_provider, provider_from_args)
+from crypto_stub import LATEST_BLOCK, StubServer, SyntheticChain
+
+WINDOW = 60
+
+
+@pytest.fixture
+def chain():
+    return SyntheticChain(addresses=20, txs_per_address=5)
+
+
+def serve(chain, **options):
+    return StubServer(chain, **options).start()
+
+
+def scanned(chain, address):
+    """Hashes of the window's block transactions sent or received by an address"""
+    return sorted(tx['hash'] for number in range(LATEST_BLOCK - WINDOW + 1, LATEST_BLOCK + 1)
+                  for tx in chain.block(number)['transactions'] if address in (tx['from'], tx['to']))
+
+
+@pytest.mark.parametrize('hashes_only', [False, True])
+def test_rpc_lookups_scan_the_window_once(chain, hashes_only):
+    server = serve(chain, hashes_only=hashes_only)
+    try:
+        provider = JsonRpcProvider(HttpClient(urls=server.urls), window=WINDOW, batch=20, concurrency=2)
+        address = chain.block(LATEST_BLOCK)['transactions'][0]['from']
+        txs = provider.fetch(address.upper().replace('0X', '0x'))['txs']
+        assert sorted(tx['hash'] for tx in txs) == scanned(chain, address)
+        heights = [tx['block_height'] for tx in txs]
+        assert heights == sorted(heights, reverse=True)
+        requests = server.snapshot()['rpc_requests']
+        # One eth_blockNumber and three block batches, plus the hash lookups of bare-hash nodes
+        assert requests == (7 if hashes_only else 4)
+
+        other = chain.block(LATEST_BLOCK - 1)['transactions'][0]['to']
+        assert sorted(tx['hash'] for tx in provider.fetch(other)['txs']) == scanned(chain, other)
+        cursor = heights[len(heights) // 2]
+        assert all(tx['block_height'] > cursor for tx in provider.fetch(address, cursor)['txs'])
+        assert server.snapshot()['rpc_requests'] == requests
+    finally:
+        server.stop()
+
+
+def test_rpc_errors_are_provider_errors(chain):
+    server = serve(chain)
+    try:
+        provider = JsonRpcProvider(HttpClient(urls=server.urls))
+        with pytest.raises(ProviderError, match='eth_nothing'):
+            provider.call([('eth_nothing', [])])
+    finally:
+        server.stop()
+
+
+def test_providers_follow_the_chain():
+    assert isinstance(make_provider('eth'), EtherscanProvider)
+    assert isinstance(make_provider('btc'), BlockCypherProvider)
+    assert isinstance(make_provider('eth', name='rpc'), JsonRpcProvider)
+    for crypto_type, name, message in (('btc', 'rpc', 'serves eth, not btc'), ('eth', 'nobody', 'unknown provider'),
+                                       ('eth', 'index', 'local index')):
+        with pytest.raises(ValueError, match=message):
+            make_provider(crypto_type, name=name)
+
+
+@pytest.fixture
+def parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--crypto', choices=['btc', 'eth'])
+    parser.add_argument('--api-key')
+    add_provider_arguments(parser)
+    return parser
+
+
+@pytest.mark.parametrize('argv, expected', [
+    ([], BlockCypherProvider),
+    (['--crypto', 'eth'], EtherscanProvider),
+    (['--provider', 'rpc'], JsonRpcProvider),
+    (['--provider', 'rpc', '--crypto', 'eth', '--rpc-window', '10'], JsonRpcProvider),
+    (['--provider', 'blockcypher', '--blockcypher-batch', '5'], BlockCypherProvider),
+])
+def test_provider_selection(parser, argv, expected):
+    provider = provider_from_args(parser.parse_args(argv), HttpClient(), parser)
+    assert type(provider) is expected
+
+
+def test_provider_for_another_chain_is_a_usage_error(parser, capsys):
+    with pytest.raises(SystemExit):
+        provider_from_args(parser.parse_args(['--provider', 'rpc', '--crypto', 'btc']), HttpClient(), parser)
+    assert '--provider rpc serves eth, not --crypto btc' in capsys.readouterr().err
+
+
+def test_blockcypher_batches_and_pages_histories():
+    big = '0x' + 'b' * 40
+    chain = SyntheticChain(addresses=20, txs_per_address=5, sizes={big: 130})
+    server = serve(chain)
+    try:
+        provider = BlockCypherProvider(HttpClient(urls=server.urls), batch_size=3)
+        addresses = [chain.address(i) for i in range(7)]
+        results = provider.fetch_many(dict.fromkeys(addresses))
+        counters = server.snapshot()
+        assert (counters['blockcypher_requests'], counters['blockcypher_addresses']) == (3, 7)
+        for address in addresses:
+            assert [tx['hash'] for tx in results[address]['txs']] == [tx['hash'] for tx in chain.full(address)]
+
+        # Long histories are followed page by page, without duplicates at page edges
+        history = provider.fetch(big)
+        assert [tx['hash'] for tx in history['txs']] == [tx['hash'] for tx in chain.full(big)]
+        assert not history['hasMore']
+        assert server.snapshot()['blockcypher_requests'] == 3 + 3
+
+        truncated = BlockCypherProvider(HttpClient(urls=server.urls), max_pages=2).fetch(big)
+        assert truncated['hasMore'] and 50 < len(truncated['txs']) <= 100
+    finally:
+        server.stop()
+
+
+def test_blockcypher_cursors_only_return_newer_blocks():
+    chain = SyntheticChain(addresses=20, txs_per_address=30)
+    server = serve(chain)
+    try:
+        provider = BlockCypherProvider(HttpClient(urls=server.urls))
+        first, second = chain.address(0), chain.address(1)
+        cursors = {first: chain.full(first)[10]['block_height'], second: chain.full(second)[20]['block_height']}
+        results = provider.fetch_many(cursors)
+        # Both share one request from the lower cursor, then each is cut at its own
+        assert server.snapshot()['blockcypher_requests'] == 1
+        for address, cursor in cursors.items():
+            assert [tx['hash'] for tx in results[address]['txs']] == \
+                [tx['hash'] for tx in chain.full(address) if tx['block_height'] > cursor]
+    finally:
+        server.stop()
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from crypto_queue import MAX_ATTEMPTS, WorkQueue
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def work_queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'), lease=60)
+    queue.start({'address': 'root', 'depth': 2})
+    yield queue
+    queue.close()
+
+
+def test_submit_deduplicates_addresses(work_queue):
+    assert work_queue.submit(0, ['a', 'b', 'c']) == 3
+    assert work_queue.submit(1, ['c', 'd']) == 1
+    assert work_queue.outstanding(0) == 3
+    assert work_queue.outstanding(1) == 1
+
+
+def test_claims_never_overlap(work_queue, tmp_path):
+    work_queue.submit(0, [f'addr{i}' for i in range(10)])
+    other = WorkQueue(str(tmp_path / 'queue.db'), lease=60)
+    first = work_queue.claim('w1', 4)
+    second = other.claim('w2', 4)
+    third = work_queue.claim('w1', 4)
+    other.close()
+    assert first == ['addr0', 'addr1', 'addr2', 'addr3']
+    assert second == ['addr4', 'addr5', 'addr6', 'addr7']
+    assert third == ['addr8', 'addr9']
+    assert work_queue.claim('w1', 4) == []
+
+
+def test_lower_levels_are_claimed_first(work_queue):
+    work_queue.submit(1, ['deep'])
+    work_queue.submit(0, ['shallow'])
+    assert work_queue.claim('w1', 1) == ['shallow']
+
+
+def test_completed_results_are_stored(work_queue):
+    work_queue.submit(0, ['a', 'b'])
+    work_queue.claim('w1', 2)
+    work_queue.complete('w1', {'a': {'txs': [{'hash': 'h'}]}, 'b': {'txs': []}})
+    assert work_queue.outstanding(0) == 0
+    assert work_queue.results(0) == {'a': {'txs': [{'hash': 'h'}]}, 'b': {'txs': []}}
+    assert work_queue.workers() == {'w1': 2}
+
+
+def test_expired_claims_go_to_another_worker(work_queue, clock):
+    work_queue.submit(0, ['a'])
+    assert work_queue.claim('crashed', 1) == ['a']
+    clock[0] += 59
+    assert work_queue.claim('w2', 1) == []
+    clock[0] += 2
+    assert work_queue.claim('w2', 1) == ['a']
+    # The late worker's answer is ignored; the new claim owns the address
+    work_queue.complete('crashed', {'a': {'txs': ['stale']}})
+    assert work_queue.outstanding(0) == 1
+    work_queue.complete('w2', {'a': {'txs': []}})
+    assert work_queue.results(0) == {'a': {'txs': []}}
+    assert work_queue.workers() == {'w2': 1}
+
+
+def test_failed_lookups_are_retried_up_to_the_limit(work_queue):
+    work_queue.submit(0, ['flaky', 'broken'])
+    assert work_queue.claim('w1', 2) == ['flaky', 'broken']
+    work_queue.complete('w1', {'flaky': None, 'broken': None})
+    assert work_queue.outstanding(0) == 2
+    assert work_queue.claim('w1', 2) == ['flaky', 'broken']
+    work_queue.complete('w1', {'flaky': {'txs': []}, 'broken': None})
+    assert work_queue.outstanding(0) == 1
+    for _ in range(MAX_ATTEMPTS - 2):
+        assert work_queue.claim('w1', 2) == ['broken']
+        work_queue.complete('w1', {'broken': None})
+    assert work_queue.outstanding(0) == 0
+    assert work_queue.claim('w1', 2) == []
+    assert work_queue.results(0) == {'flaky': {'txs': []}, 'broken': None}
+
+
+def test_cancel_drops_only_pending_addresses(work_queue):
+    work_queue.submit(0, ['a', 'b', 'c'])
+    work_queue.claim('w1', 1)
+    assert work_queue.cancel(0) == 2
+    assert work_queue.outstanding(0) == 1
+
+
+def test_one_crawl_at_a_time(work_queue, tmp_path):
+    with pytest.raises(ValueError):
+        work_queue.start({'address': 'other', 'depth': 1})
+    work_queue.submit(0, ['a'])
+    work_queue.finish()
+    assert work_queue.finished()
+    work_queue.start({'address': 'other', 'depth': 1})
+    assert not work_queue.finished()
+    assert work_queue.params() == {'address': 'other', 'depth': 1}
+    assert work_queue.outstanding(0) == 0
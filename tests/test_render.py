@@ -0,0 +1,100 @@
+import math
+
+import pytest
+
+from conftest import FakeProvider
+from crypto_core import BlockchainAnalyzer
+from crypto_graph import ROLE_ROOT, TransactionGraph
+from crypto_labels import LabelIndex
+from crypto_render import aggregate_graph, radial_layout
+
+pytest.importorskip('pyvis')
+
+from crypto_tracker_v3 import Visualizer  # noqa: E402
+
+
+@pytest.fixture
+def crawled(histories):
+    analyzer = BlockchainAnalyzer('btc', provider=FakeProvider(histories))
+    graph, _ = analyzer.get_transaction_graph('addr000', depth=2, concurrency=2)
+    return graph
+
+
+@pytest.mark.parametrize('threshold', [10 ** 6, 10])
+def test_both_render_paths_use_the_legend_table(tmp_path, monkeypatch, crawled, threshold):
+    monkeypatch.chdir(tmp_path)
+    Visualizer.plot_interactive(crawled, crawled.legend, large_threshold=threshold)
+    page = (tmp_path / 'transaction_graph.html').read_text(encoding='utf-8')
+    assert page.count('id="legend-table"') == 1
+    assert '</script></script>' not in ''.join(page.split())
+    assert page.count('<script') == page.count('</script>')
+    if threshold > crawled.edge_count:
+        assert f'Node Legend ({len(crawled)} nodes)' in page
+        assert 'addr000' in page
+        assert 'highlightConnectedNodes' in page
+
+
+@pytest.fixture
+def fanout():
+    """A root paying three times to one friend and once to eight leaves, one of them an exchange"""
+    graph = TransactionGraph('ETH', 18)
+    root = graph.add_address('0xroot')
+    graph.mark(root, ROLE_ROOT)
+    friend = graph.add_address('0xfriend')
+    for i in range(3):
+        tx = graph.add_transaction(f'0xpay{i}', 100 + i, 1600000000 + i)
+        graph.add_edge(root, tx, 10 ** 18)
+        graph.add_edge(tx, friend, 10 ** 18)
+    tx = graph.add_transaction('0xfanout', 200, 1600001000)
+    graph.add_edge(root, tx, 9 * 10 ** 18)
+    for i in range(8):
+        graph.add_edge(tx, graph.add_address(f'0xleaf{i}'), 10 ** 18)
+    graph.add_edge(tx, graph.add_address('0xexchange'), 10 ** 18)
+    return graph
+
+
+@pytest.fixture
+def labels():
+    return LabelIndex([('0xexchange', 'exchange', 'Some Exchange')])
+
+
+def test_parallel_transfers_and_leaves_are_aggregated(fanout, labels):
+    rendered = aggregate_graph(fanout, labels, leaf_threshold=5)
+    aggregates = {node_id: node for node_id, node in rendered.nodes.items() if str(node_id).startswith('a')}
+    assert sorted(node['label'] for node in aggregates.values()) == ['3 txs', '8 addresses']
+    # Kept nodes keep their IDs, labeled leaves are never collapsed
+    kept = {fanout.keys[node_id - 1] for node_id in rendered.nodes if node_id not in aggregates}
+    assert kept == {'0xroot', '0xfriend', '0xfanout', '0xexchange'}
+    amounts = sorted(attrs['value'] for _, _, attrs in rendered.edges)
+    assert amounts == [1.0, 3.0, 3.0, 8.0, 9.0]
+    assert len(rendered.legend) == len(rendered.nodes)
+
+
+def test_small_fanouts_are_kept(fanout, labels):
+    rendered = aggregate_graph(fanout, labels, leaf_threshold=8)
+    assert sum(1 for node_id in rendered.nodes if str(node_id).startswith('a')) == 1
+    assert len(rendered.nodes) == len(fanout) - 3 + 1
+
+
+def test_radial_layout_rings_follow_hop_distance(fanout, labels):
+    rendered = aggregate_graph(fanout, labels, leaf_threshold=8)
+    positions = radial_layout(rendered, [fanout.ids['0xroot']])
+    assert set(positions) == set(rendered.nodes)
+    assert positions[fanout.ids['0xroot']] == (0.0, 0.0)
+    radius = {node_id: math.hypot(*position) for node_id, position in positions.items()}
+    assert radius[fanout.ids['0xfanout']] < radius[fanout.ids['0xleaf0']]
+    # Leaves on the same ring are spread apart rather than stacked
+    leaves = [positions[fanout.ids[f'0xleaf{i}']] for i in range(8)]
+    assert len({(round(x), round(y)) for x, y in leaves}) == 8
+
+
+def test_radial_layout_places_unreached_components():
+    graph = TransactionGraph('ETH', 18)
+    graph.mark(graph.add_address('0xroot'), ROLE_ROOT)
+    tx = graph.add_transaction('0xelsewhere', 100, 1600000000)
+    graph.add_edge(graph.add_address('0xa'), tx, 1)
+    graph.add_edge(tx, graph.add_address('0xb'), 1)
+    rendered = aggregate_graph(graph, LabelIndex([('0xnobody', 'exchange', 'None')]))
+    positions = radial_layout(rendered, [graph.ids['0xroot']])
+    assert set(positions) == set(rendered.nodes)
+    assert len(set(positions.values())) == len(positions)
@@ -0,0 +1,55 @@
+import io
+import json
+
+import pytest
+
+from crypto_http import HttpClient
+from crypto_screen import completed_addresses, read_addresses, screen
+from crypto_stub import StubServer, SyntheticChain
+
+
+@pytest.fixture
+def server():
+    server = StubServer(SyntheticChain(addresses=50, txs_per_address=20, label_rate=0.2)).start()
+    yield server
+    server.stop()
+
+
+def test_addresses_are_read_once_without_comments(tmp_path):
+    path = tmp_path / 'addresses.txt'
+    path.write_text('0xAbC  # first\n\n# a comment\n0xabc\n0xdef\n')
+    assert list(read_addresses(str(path))) == ['0xAbC', '0xdef']
+
+
+def test_failed_and_partial_lines_are_not_completed(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    path.write_text(json.dumps({'address': '0xAAA', 'transactions': 3}) + '\n'
+                    + json.dumps({'address': '0xbbb', 'error': 'timed out'}) + '\n'
+                    + '{"address": "0xccc", "transa')
+    assert completed_addresses(str(path)) == {'0xaaa'}
+    assert completed_addresses(str(tmp_path / 'missing.jsonl')) == set()
+
+
+def test_every_address_gets_one_result_line(server):
+    chain = server.source
+    addresses = [chain.address(i) for i in range(5)]
+    output = io.StringIO()
+    screen(addresses, output, api_key='test', http=HttpClient(urls=server.urls), concurrency=2, workers=1)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted(result['address'] for result in results) == sorted(addresses)
+    for result in results:
+        assert 'error' not in result
+        address = result['address']
+        transfers = chain.txlist(address) + chain.internal(address) + chain.tokens(address)
+        assert result['transactions'] == len(transfers)
+        assert result['first_seen'] <= result['last_seen']
+    assert any(result['exchange_hits'] + result['mixer_hits'] for result in results)
+
+
+def test_fetch_failures_are_recorded_and_not_fatal(server):
+    output = io.StringIO()
+    http = HttpClient(urls={'etherscan': server.base_url + '/missing'}, max_retries=0)
+    screen(['0x' + '1' * 40], output, api_key='test', http=http, concurrency=1, workers=1)
+    result, = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert result['error']
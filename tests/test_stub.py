@@ -0,0 +1,83 @@
+import json
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import pytest
+
+from crypto_bench import bench_crawl, compare
+from crypto_core import iter_transaction_batches
+from crypto_http import HttpClient
+from crypto_providers import RESULT_CAP
+from crypto_stub import StubServer, SyntheticChain
+
+BIG = '0x' + 'b' * 40
+
+
+@pytest.fixture
+def chain():
+    return SyntheticChain(addresses=50, txs_per_address=20, sizes={BIG: RESULT_CAP + 500})
+
+
+@pytest.fixture
+def server(chain):
+    server = StubServer(chain, rate_limits={'blockcypher': 2}).start()
+    yield server
+    server.stop()
+
+
+def get(url, **params):
+    with urlopen(f'{url}?{urlencode(params)}' if params else url) as response:
+        return json.load(response)
+
+
+def test_histories_are_deterministic(chain):
+    again = SyntheticChain(addresses=50, txs_per_address=20)
+    assert chain.txlist(chain.address(3)) == again.txlist(again.address(3))
+    assert len(chain.txlist(BIG)) == RESULT_CAP + 500
+    blocks = [int(row['blockNumber']) for row in chain.txlist(chain.address(3))]
+    assert blocks == sorted(blocks)
+
+
+def test_etherscan_result_window_is_capped(server):
+    api = server.urls['etherscan']
+    reply = get(api, module='account', action='txlist', address=BIG, page=2, offset=RESULT_CAP)
+    assert reply['status'] == '0' and 'Result window is too large' in reply['result']
+    reply = get(api, module='account', action='txlist', address=BIG, page=1, offset=RESULT_CAP)
+    assert len(reply['result']) == RESULT_CAP
+
+
+def test_histories_past_the_cap_are_fetched_in_full(server, chain):
+    http = HttpClient(urls=server.urls, max_retries=0)
+    txs = [tx for batch in iter_transaction_batches(BIG, 'test', http=http, actions=('txlist',)) for tx in batch]
+    assert sorted(tx['hash'] for tx in txs) == sorted(row['hash'] for row in chain.txlist(BIG))
+
+
+def test_blockcypher_batches_and_throttles(server, chain):
+    first, second = chain.address(1), chain.address(2)
+    replies = get(f"{server.urls['blockcypher']}/addrs/{first};{second}/full", limit=50)
+    assert [reply['address'] for reply in replies] == [first, second]
+    assert replies[0]['n_tx'] == len(chain.txlist(first))
+    with pytest.raises(HTTPError) as error:
+        for _ in range(3):
+            get(f"{server.urls['blockcypher']}/addrs/{first}/full")
+    assert error.value.code == 429
+    counters = server.snapshot()
+    assert counters['blockcypher_throttled'] == 1
+    assert counters['blockcypher_addresses'] == 3
+
+
+def test_bench_crawl_reports_traffic(server, chain):
+    result, = bench_crawl(server, chain.address(0), [1], concurrency=2, repeat=1, chains=('eth',))
+    assert result['params'] == {'chain': 'eth', 'depth': 1, 'concurrency': 2}
+    assert result['metrics']['nodes'] > 1 and result['metrics']['requests'] > 0
+    assert result['metrics']['throttled'] == 0
+
+
+def test_regressions_are_reported_against_the_baseline():
+    baseline = {'results': [{'name': 'crawl', 'params': {'depth': 1}, 'seconds': 1.0},
+                            {'name': 'crawl', 'params': {'depth': 2}, 'seconds': 1.0}]}
+    results = [{'name': 'crawl', 'params': {'depth': 1}, 'seconds': 1.1},
+               {'name': 'crawl', 'params': {'depth': 2}, 'seconds': 2.0},
+               {'name': 'render', 'params': {}, 'seconds': 9.0}]
+    assert compare(results, baseline, 1.25) == [results[1]]
@@ -0,0 +1,75 @@
+import pytest
+
+from conftest import FakeProvider, btc_tx
+from crypto_core import BlockchainAnalyzer
+from crypto_labels import LabelIndex
+from crypto_trace import PathTracer, print_paths
+
+BTC = 10 ** 8
+
+
+@pytest.fixture
+def chain():
+    """root pays 5 BTC toward a mixer through big, 0.01 BTC toward an exchange through small"""
+    txs = [
+        btc_tx('t1', 100, [('root', 5 * BTC)], [('big', 5 * BTC)], timestamp=1700000000),
+        btc_tx('t2', 101, [('big', 5 * BTC)], [('mixer', 5 * BTC)], timestamp=1700000100),
+        btc_tx('t3', 102, [('root', BTC // 100)], [('small', BTC // 100)], timestamp=1700000200),
+        btc_tx('t4', 103, [('small', BTC // 100)], [('exchange', BTC // 100)], timestamp=1700000300),
+        btc_tx('t5', 104, [('mixer', BTC)], [('beyond', BTC)], timestamp=1700000400),
+    ]
+    histories = {}
+    for tx in txs:
+        for address in {a for side in ('inputs', 'outputs') for io in tx[side] for a in io['addresses']}:
+            histories.setdefault(address, []).insert(0, tx)
+    return histories
+
+
+@pytest.fixture
+def labels():
+    return LabelIndex([('mixer', 'mixer', 'Tumbler'), ('exchange', 'exchange', 'Exchange')])
+
+
+def tracer(chain, labels, **options):
+    provider = FakeProvider(chain)
+    return PathTracer(BlockchainAnalyzer('btc', provider=provider, labels=labels), **options), provider
+
+
+def test_cheapest_paths_come_first(chain, labels):
+    paths, provider = tracer(chain, labels)
+    found = paths.trace('root')
+    assert [path['entity'] for path in found] == ['Tumbler', 'Exchange']
+    assert found[0]['cost'] < found[1]['cost']
+    assert [(hop['from'], hop['to'], hop['hash']) for hop in found[0]['hops']] == \
+        [('root', 'big', 't1'), ('big', 'mixer', 't2')]
+    assert found[0]['hops'][0]['direction'] == 'out' and found[0]['hops'][0]['value'] == 5 * BTC
+    # Labeled addresses end a path and are never looked up
+    assert provider.lookups == paths.calls == 3
+    assert paths.frontier == []
+
+
+def test_search_stops_at_the_requested_number_of_paths(chain, labels):
+    paths, provider = tracer(chain, labels, paths=1, concurrency=1)
+    assert [path['target'] for path in paths.trace('root')] == ['mixer']
+    assert provider.lookups == 3
+
+
+def test_spent_budget_reports_the_frontier(chain, labels, capsys):
+    paths, provider = tracer(chain, labels, max_calls=1)
+    found = paths.trace('root')
+    assert found == [] and provider.lookups == 1
+    assert [entry['address'] for entry in paths.frontier] == ['big', 'small']
+    assert paths.frontier[0]['cost'] < paths.frontier[1]['cost']
+    assert 'budget of 1 used up' in capsys.readouterr().err
+    print_paths(found, paths.calls, paths.frontier)
+    out = capsys.readouterr().out
+    assert 'cheapest unexpanded addresses' in out and 'No labeled address reached (1 lookups)' in out
+
+
+def test_direction_and_hop_limits(chain, labels):
+    paths, _ = tracer(chain, labels, direction='in')
+    assert paths.trace('root') == []
+    paths, _ = tracer(chain, labels, max_hops=1)
+    assert paths.trace('root') == []
+    paths, _ = tracer(chain, labels, direction='in')
+    assert [path['target'] for path in paths.trace('beyond')] == ['mixer']
@@ -0,0 +1,54 @@
+import crypto_core
+from crypto_cache import TransactionCache
+from crypto_core import iter_transaction_batches, iter_transfers
+from crypto_http import HttpClient
+from crypto_providers import etherscan_transfer, transfer_order
+from crypto_stub import StubServer, SyntheticChain
+
+ADDRESS = '0x' + 'a' * 40
+
+
+def token_row(block, log_index, tx_hash=None):
+    return etherscan_transfer({'hash': tx_hash or f'0xh{block}', 'blockNumber': str(block), 'logIndex': str(log_index),
+                               'timeStamp': str(1600000000 + block), 'from': ADDRESS, 'to': '0x' + 'b' * 40,
+                               'value': '1', 'tokenSymbol': 'USDT', 'tokenDecimal': '6'}, 'tokentx')
+
+
+def test_cached_transfers_keep_block_order_across_cache_pages(tmp_path, monkeypatch):
+    cache = TransactionCache(str(tmp_path))
+    # 998 rows fill most of the first 1000-row cache page; block 2 then straddles two pages,
+    # and its ids ('0xh2:10' < '0xh2:8') sort differently from its log indexes
+    rows = [token_row(1, i, f'0x{i:04d}') for i in range(998)] + [token_row(2, i) for i in (8, 9, 10, 11)]
+    rows.append(token_row(3, 0))
+    cache.merge('eth:transfers', ADDRESS, rows, lambda tx: tx['blockNumber'], lambda tx: tx['id'])
+    monkeypatch.setattr(crypto_core, 'iter_transfers', lambda *args, **kwargs: iter(()))
+
+    batches = list(iter_transaction_batches(ADDRESS, 'key', cache=cache))
+    streamed = [row for batch in batches for row in batch]
+    assert [row['id'] for row in streamed] == [row['id'] for row in sorted(rows, key=transfer_order)]
+    for batch, following in zip(batches, batches[1:]):
+        # No block continues into the next batch
+        assert batch[-1]['blockNumber'] != following[0]['blockNumber']
+
+
+def test_transfer_lists_are_merged_in_block_order():
+    chain = SyntheticChain(addresses=50, sizes={ADDRESS: 3000})
+    server = StubServer(chain).start()
+    try:
+        http = HttpClient(urls=server.urls)
+        batches = list(iter_transfers(ADDRESS, 'key', http=http))
+        startblock = int(chain.txlist(ADDRESS)[1500]['blockNumber'])
+        later = [row for batch in iter_transfers(ADDRESS, 'key', startblock, http=http) for row in batch]
+    finally:
+        server.stop()
+    streamed = [row for batch in batches for row in batch]
+    assert streamed == sorted(streamed, key=transfer_order)
+    expected = [etherscan_transfer(row, action)['id'] for action, rows in
+                (('txlist', chain.txlist(ADDRESS)), ('txlistinternal', chain.internal(ADDRESS)),
+                 ('tokentx', chain.tokens(ADDRESS))) for row in rows]
+    assert sorted(row['id'] for row in streamed) == sorted(expected)
+    assert {row['kind'] for row in streamed} == {'normal', 'internal', 'token'}
+    assert len(batches) > 1
+    for batch, following in zip(batches, batches[1:]):
+        assert batch[-1]['blockNumber'] != following[0]['blockNumber']
+    assert later == [row for row in streamed if int(row['blockNumber']) >= startblock]
@@ -0,0 +1,110 @@
+import json
+import threading
+
+import pytest
+
+from crypto_http import HttpClient
+from crypto_labels import get_label_index
+from crypto_stub import StubServer, SyntheticChain
+from crypto_watch import Watcher, WatchState
+
+
+class ListSink:
+    def __init__(self):
+        self.alerts = []
+
+    def emit(self, alert):
+        self.alerts.append(alert)
+
+
+@pytest.fixture
+def server():
+    server = StubServer(SyntheticChain(addresses=50, txs_per_address=30, label_rate=0.3)).start()
+    yield server
+    server.stop()
+
+
+def flagged(chain, address, after=-1):
+    """Hashes of the labeled transfers of an address past a block"""
+    labels = get_label_index()
+    rows = chain.txlist(address) + chain.internal(address) + chain.tokens(address)
+    return sorted(row['hash'] for row in rows if int(row['blockNumber']) > after
+                  and (row['from'] in labels or row['to'] in labels))
+
+
+def test_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'watch.json')
+    state = WatchState(path)
+    state.set('0xabc', 100)
+    state.save()
+    assert WatchState(path).get('0xabc') == 100
+    assert WatchState(str(tmp_path / 'missing.json')).get('0xabc') is None
+
+
+def test_cursors_set_while_saving_are_never_lost(tmp_path):
+    path = str(tmp_path / 'watch.json')
+    state = WatchState(path)
+    done = threading.Event()
+
+    def saver():
+        while not done.is_set():
+            state.save()
+
+    thread = threading.Thread(target=saver)
+    thread.start()
+    workers = [threading.Thread(target=lambda w=w: [state.set(f'{w}:{i}', i) for i in range(2000)])
+               for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    done.set()
+    thread.join()
+    state.save()
+    with open(path, encoding='utf-8') as f:
+        assert len(json.load(f)['cursors']) == 8000
+
+
+def test_backfill_alerts_on_the_whole_history_once(tmp_path, server):
+    chain = server.source
+    addresses = [chain.address(i) for i in range(3)]
+    sink, path = ListSink(), str(tmp_path / 'watch.json')
+    watcher = Watcher(addresses, 'test', HttpClient(urls=server.urls), [sink], WatchState(path), backfill=True)
+    watcher.run(once=True)
+    assert watcher.polls == 3
+    for address in addresses:
+        assert sorted(alert['hash'] for alert in sink.alerts if alert['address'] == address) == \
+            flagged(chain, address)
+    assert sink.alerts and watcher.alerts == len(sink.alerts)
+
+    # The saved cursors make the next round alert only on new blocks
+    state = WatchState(path)
+    assert state.get(addresses[0]) == max(int(row['blockNumber']) for row in chain.txlist(addresses[0]))
+    again = ListSink()
+    Watcher(addresses, 'test', HttpClient(urls=server.urls), [again], state, backfill=True).run(once=True)
+    assert again.alerts == []
+
+
+def test_new_addresses_start_at_the_latest_block(server):
+    chain = server.source
+    address = chain.address(4)
+    blocks = sorted(int(row['blockNumber']) for row in chain.txlist(address) + chain.internal(address)
+                    + chain.tokens(address))
+    watcher = Watcher([address], 'test', HttpClient(urls=server.urls))
+    assert watcher.poll(address) == (0, [])
+    assert watcher.state.get(address) == blocks[-1]
+
+    # Transfers past the cursor are reported, and only those
+    cursor = blocks[len(blocks) // 2]
+    watcher.state.set(address, cursor)
+    new, alerts = watcher.poll(address)
+    assert new == sum(block > cursor for block in blocks)
+    assert sorted(alert['hash'] for alert in alerts) == flagged(chain, address, cursor)
+    assert watcher.state.get(address) == blocks[-1]
+
+
+def test_interval_stretches_to_the_rate_limit(capsys):
+    http = HttpClient(rates={'etherscan': 2})
+    watcher = Watcher([f'0x{i:040x}' for i in range(20)], 'test', http, interval=10)
+    assert watcher.interval == 20 * len(watcher.actions) / 2
+    assert 'using that interval' in capsys.readouterr().err